@@ -3,6 +3,7 @@
 A beautiful chat interface for demoing the ski trip sales agent.
 """
 
+import os
 import sys
 import logging
 from pathlib import Path
@@ -20,6 +21,8 @@ sys.path.insert(0, str(project_root / "src"))
 
 # Now import the graph
 from agent.graph import graph
+from agent.profiling import get_turn_profiler  # noqa: E402
+from agent.usage import format_usage, get_usage_ledger, summarize_usage, usage_records  # noqa: E402
 
 # Load environment variables
 load_dotenv()
@@ -201,6 +204,10 @@ if "messages" not in st.session_state:
 - 🎉 חופשה עם חברים?"""
     })
 
+if "usage" not in st.session_state:
+    # Token, cost and latency of every model call in this conversation
+    st.session_state.usage = []
+
 if "thread_id" not in st.session_state:
     # Generate a unique thread ID for this conversation
     import uuid
@@ -240,8 +247,18 @@ if prompt := st.chat_input("הקלד את השאלה שלך כאן..."):
                 for msg in st.session_state.messages:
                     all_messages.append({"role": msg["role"], "content": msg["content"]})
                 
-                # Invoke the agent and get final response
-                result = graph.invoke({"messages": all_messages}, config=config)
+                # Invoke the agent and get final response (profiled with
+                # SKIDEAL_PROFILE=1 or ?profile=<SKIDEAL_PROFILE_TOKEN>, see
+                # agent.profiling)
+                profiler = get_turn_profiler()
+                with profiler.profile(
+                    st.session_state.thread_id,
+                    force=profiler.allows_force(st.query_params.get("profile")),
+                ) as turn:
+                    result = graph.invoke({"messages": all_messages}, config=config)
+                    if turn is not None:
+                        turn.finish(result.get("messages", []))
+                st.session_state.usage.extend(usage_records(result.get("messages", [])))
                 
                 # Get the last AI message from the result
                 if "messages" in result and len(result["messages"]) > 0:
@@ -269,6 +286,41 @@ if prompt := st.chat_input("הקלד את השאלה שלך כאן..."):
     st.session_state.messages.append({"role": "assistant", "content": full_response})
     st.rerun()
 
+# Admin panel: token, cost and latency accounting. Only the deployment can
+# turn it on - a query parameter would show every visitor the costliest
+# conversations.
+if os.environ.get("SKIDEAL_ADMIN") == "1":
+    with st.sidebar:
+        st.header("📊 Usage")
+        summary = summarize_usage(st.session_state.usage)
+        total = summary["total"]
+        cached = total["cache_read_tokens"]
+        all_input = total["input_tokens"] + cached + total["cache_write_tokens"]
+        st.metric("Cost (USD)", f"${total['cost_usd']:.4f}")
+        st.metric("Model calls", total["steps"])
+        st.metric("Input / output tokens", f"{all_input} / {total['output_tokens']}")
+        st.metric("Cache hit rate", f"{cached / all_input:.0%}" if all_input else "-")
+        st.metric("Model time", f"{total['model_ms'] / 1000:.1f}s")
+
+        st.subheader("Per turn")
+        st.dataframe(
+            [{"turn": turn, **t} for turn, t in summary["turns"].items()],
+            hide_index=True,
+        )
+        st.subheader("Per action")
+        st.dataframe(
+            [{"action": action, **t} for action, t in summary["actions"].items()],
+            hide_index=True,
+        )
+        st.subheader("Steps")
+        st.dataframe(st.session_state.usage, hide_index=True)
+
+        st.subheader("Costliest conversations")
+        st.dataframe(
+            [{"thread": thread, **t} for thread, t in get_usage_ledger().top(10)],
+            hide_index=True,
+        )
+
 # Footer
 st.markdown("---")
 
@@ -284,6 +336,10 @@ if len(st.session_state.messages) > 1:  # Only show if there's more than welcome
             lines.append("")
             lines.append("-" * 30)
             lines.append("")
+        if st.session_state.usage:
+            lines.append("📊 עלויות וזמני תגובה")
+            lines.append(format_usage(st.session_state.usage))
+            lines.append("")
         return "\n".join(lines)
     
     from datetime import datetime
@@ -0,0 +1,355 @@
+"""SkiDeal Bot - Admission control for model calls.
+
+A process-wide controller that keeps model calls within the Anthropic rate
+limits (requests per minute and tokens per minute, as token buckets) and, when
+saturated, admits queued calls by priority instead of first-come first-served.
+Conversations close to handoff get a higher priority than cold greetings, so
+hot leads keep a low latency during season peaks. Every upstream request is
+admitted on its own, hedged duplicates and fallback calls included, and the
+queue wait of each is exported on ``/metrics`` (`agent.metrics`).
+
+Configuration (environment variables, unset or 0 disables the limit):
+    SKIDEAL_MODEL_RPM: Model requests per minute
+    SKIDEAL_MODEL_TPM: Model tokens per minute (estimated input + reserved output)
+"""
+
+from __future__ import annotations
+
+import asyncio
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Callable, Sequence
+
+from langchain_core.language_models import LanguageModelInput
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.runnables import Runnable, RunnableConfig
+
+# Rough chars-per-token ratio for mixed Hebrew/English text
+CHARS_PER_TOKEN = 3
+# Output tokens reserved per call until the real usage is known
+RESERVED_OUTPUT_TOKENS = 1024
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at ``per_minute / 60`` units per second."""
+
+    def __init__(self, per_minute: float, capacity: float | None = None) -> None:
+        """Allow ``per_minute`` units per minute with bursts up to ``capacity``."""
+        self.rate = per_minute / 60.0
+        self.capacity = capacity or per_minute
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay_for(self, amount: float, now: float) -> float:
+        """Seconds until ``amount`` units are available (0 if available now)."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def take(self, amount: float, now: float) -> None:
+        """Consume ``amount`` units; may go negative to settle an underestimate."""
+        self._refill(now)
+        self.level -= min(amount, self.capacity)
+
+    def give_back(self, amount: float) -> None:
+        """Return units that were reserved but not used."""
+        self.level = min(self.capacity, self.level + amount)
+
+
+@dataclass(order=True)
+class _Waiter:
+    sort_key: tuple[float, int]
+    tokens: float = field(compare=False)
+    wake: Callable[[], object] = field(compare=False)
+
+
+class AdmissionController:
+    """Priority-aware admission controller around rate-limited model calls.
+
+    Callers block in `acquire` / `aacquire` until the request and token
+    buckets allow their call. Waiters are admitted strictly by priority
+    (higher first), FIFO within a priority. Only the head of the queue polls
+    the buckets; everybody else sleeps until the queue moves.
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: float | None = None,
+        tokens_per_minute: float | None = None,
+        *,
+        wait_samples: int = 1000,
+        on_admit: Callable[[float, int], None] | None = None,
+    ) -> None:
+        """Limit calls to the given rates; None leaves a rate unlimited.
+
+        ``on_admit`` is called with the queue wait and the remaining queue
+        depth of every admitted call.
+        """
+        self.on_admit = on_admit
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self._lock = threading.Lock()
+        self._queue: list[_Waiter] = []
+        self._seq = itertools.count()
+        self._waits: deque[float] = deque(maxlen=wait_samples)
+        self._admitted = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    # -- bucket bookkeeping (call with the lock held) -------------------------
+
+    def _delay_for(self, tokens: float, now: float) -> float:
+        delay = 0.0
+        if self.requests:
+            delay = max(delay, self.requests.delay_for(1, now))
+        if self.tokens:
+            delay = max(delay, self.tokens.delay_for(tokens, now))
+        return delay
+
+    def _try_admit(self, waiter: _Waiter) -> float | None:
+        """Admit ``waiter`` if it is at the head and the buckets allow it.
+
+        Returns None on success, otherwise how long to sleep before checking
+        again (``inf`` when not at the head: sleep until woken).
+        """
+        if self._queue[0] is not waiter:
+            return float("inf")
+        now = time.monotonic()
+        delay = self._delay_for(waiter.tokens, now)
+        if delay > 0:
+            return delay
+        heapq.heappop(self._queue)
+        if self.requests:
+            self.requests.take(1, now)
+        if self.tokens:
+            self.tokens.take(waiter.tokens, now)
+        if self._queue:
+            self._queue[0].wake()
+        return None
+
+    def _enqueue(self, tokens: float, priority: float, wake: Callable[[], object]) -> _Waiter:
+        waiter = _Waiter((-priority, next(self._seq)), tokens, wake)
+        with self._lock:
+            heapq.heappush(self._queue, waiter)
+        return waiter
+
+    def _record(self, waited: float) -> float:
+        with self._lock:
+            self._admitted += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+            self._waits.append(waited)
+            depth = len(self._queue)
+        if self.on_admit is not None:
+            self.on_admit(waited, depth)
+        return waited
+
+    # -- public API -------------------------------------------------------------
+
+    def acquire(self, tokens: float, priority: float = 0.0) -> float:
+        """Block until a call of ``tokens`` may run; return the queue wait in seconds."""
+        start = time.monotonic()
+        event = threading.Event()
+        waiter = self._enqueue(tokens, priority, event.set)
+        while True:
+            event.clear()
+            with self._lock:
+                delay = self._try_admit(waiter)
+            if delay is None:
+                return self._record(time.monotonic() - start)
+            event.wait(None if delay == float("inf") else delay)
+
+    async def aacquire(self, tokens: float, priority: float = 0.0) -> float:
+        """Async variant of `acquire`."""
+        start = time.monotonic()
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+        waiter = self._enqueue(
+            tokens, priority, lambda: loop.call_soon_threadsafe(event.set)
+        )
+        try:
+            while True:
+                event.clear()
+                with self._lock:
+                    delay = self._try_admit(waiter)
+                if delay is None:
+                    return self._record(time.monotonic() - start)
+                try:
+                    await asyncio.wait_for(
+                        event.wait(), None if delay == float("inf") else delay
+                    )
+                except asyncio.TimeoutError:
+                    pass
+        except asyncio.CancelledError:
+            self._discard(waiter)
+            raise
+
+    def _discard(self, waiter: _Waiter) -> None:
+        with self._lock:
+            if waiter in self._queue:
+                was_head = self._queue[0] is waiter
+                self._queue.remove(waiter)
+                heapq.heapify(self._queue)
+                if was_head and self._queue:
+                    self._queue[0].wake()
+
+    def settle(self, reserved_tokens: float, used_tokens: float) -> None:
+        """Correct the token bucket once the real usage of a call is known."""
+        if not self.tokens:
+            return
+        with self._lock:
+            if used_tokens < reserved_tokens:
+                self.tokens.give_back(reserved_tokens - used_tokens)
+            else:
+                self.tokens.take(used_tokens - reserved_tokens, time.monotonic())
+            if self._queue:
+                self._queue[0].wake()
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of calls currently waiting for admission."""
+        return len(self._queue)
+
+    def stats(self) -> dict[str, Any]:
+        """Queue wait metrics: depth, admitted calls and wait-time summary."""
+        with self._lock:
+            waits = sorted(self._waits)
+            admitted, total, worst = self._admitted, self._wait_total, self._wait_max
+            depth = len(self._queue)
+
+        def percentile(p: float) -> float:
+            if not waits:
+                return 0.0
+            return waits[min(len(waits) - 1, int(p * len(waits)))]
+
+        return {
+            "queue_depth": depth,
+            "admitted": admitted,
+            "wait_seconds": {
+                "sum": round(total, 6),
+                "max": round(worst, 6),
+                "p50": round(percentile(0.50), 6),
+                "p95": round(percentile(0.95), 6),
+            },
+        }
+
+
+# ============================================================================
+# MODEL WRAPPER
+# ============================================================================
+
+
+def estimate_tokens(messages: Sequence[BaseMessage]) -> int:
+    """Cheap token estimate for a model input."""
+    chars = 0
+    for message in messages:
+        content = message.content
+        if isinstance(content, str):
+            chars += len(content)
+        else:
+            for block in content:
+                text = block.get("text", block) if isinstance(block, dict) else block
+                chars += len(str(text))
+        if isinstance(message, AIMessage) and message.tool_calls:
+            chars += len(str(message.tool_calls))
+    return chars // CHARS_PER_TOKEN
+
+
+def used_tokens(message: BaseMessage) -> int | None:
+    """Tokens counted against the rate limit for a response, if reported."""
+    usage = getattr(message, "usage_metadata", None)
+    if not usage:
+        return None
+    cache_read = usage.get("input_token_details", {}).get("cache_read", 0) or 0
+    return int(usage["input_tokens"] - cache_read + usage["output_tokens"])
+
+
+class AdmittedModel(Runnable[LanguageModelInput, BaseMessage]):
+    """Runs a (tool-bound) chat model after admission by the controller."""
+
+    def __init__(
+        self,
+        bound: Runnable[LanguageModelInput, BaseMessage],
+        controller: AdmissionController,
+        priority: float = 0.0,
+    ) -> None:
+        """Admit calls to ``bound`` through ``controller`` at ``priority``."""
+        self.bound = bound
+        self.controller = controller
+        self.priority = priority
+
+    def _reserve(self, input: LanguageModelInput) -> int:
+        messages = input.to_messages() if hasattr(input, "to_messages") else input
+        if isinstance(messages, str):
+            return len(messages) // CHARS_PER_TOKEN + RESERVED_OUTPUT_TOKENS
+        return estimate_tokens(messages) + RESERVED_OUTPUT_TOKENS  # type: ignore[arg-type]
+
+    def _settle(self, reserved: int, response: BaseMessage) -> None:
+        used = used_tokens(response)
+        if used is not None:
+            self.controller.settle(reserved, used)
+
+    def invoke(
+        self,
+        input: LanguageModelInput,
+        config: RunnableConfig | None = None,
+        **kwargs: Any,
+    ) -> BaseMessage:
+        """Wait for admission, then call the model."""
+        reserved = self._reserve(input)
+        self.controller.acquire(reserved, self.priority)
+        response = self.bound.invoke(input, config, **kwargs)
+        self._settle(reserved, response)
+        return response
+
+    async def ainvoke(
+        self,
+        input: LanguageModelInput,
+        config: RunnableConfig | None = None,
+        **kwargs: Any,
+    ) -> BaseMessage:
+        """Wait for admission, then call the model."""
+        reserved = self._reserve(input)
+        await self.controller.aacquire(reserved, self.priority)
+        response = await self.bound.ainvoke(input, config, **kwargs)
+        self._settle(reserved, response)
+        return response
+
+
+# ============================================================================
+# PROCESS-WIDE CONTROLLER
+# ============================================================================
+
+_controller: AdmissionController | None = None
+_controller_lock = threading.Lock()
+
+
+def get_admission_controller() -> AdmissionController | None:
+    """Get the process-wide controller, or None when no limits are configured."""
+    global _controller
+    rpm = float(os.environ.get("SKIDEAL_MODEL_RPM") or 0)
+    tpm = float(os.environ.get("SKIDEAL_MODEL_TPM") or 0)
+    if not rpm and not tpm:
+        return None
+    with _controller_lock:
+        if _controller is None:
+            # Imported here: agent.metrics depends on this module
+            from agent.metrics import get_metrics_registry
+
+            _controller = AdmissionController(
+                rpm or None,
+                tpm or None,
+                on_admit=get_metrics_registry().observe_admission,
+            )
+    return _controller
@@ -0,0 +1,579 @@
+"""SkiDeal Bot - Offline benchmark suite for the agent graph.
+
+Runs fixed sales scenarios through the graph from `agent.graph` with a
+scripted `FakeChatModel` that emits the tool-call sequences a real model
+produces for those conversations. Nothing touches the network: the model is
+fake, tools run against the local catalog and handoffs go to a throwaway
+outbox.
+
+For every scenario the suite reports:
+
+- graph overhead: wall time minus time spent in the model and in tools,
+- per-tool latency and payload bytes (what a tool adds to the context),
+- estimated input/output tokens over all model calls, including the bound
+  tool schemas.
+
+Results are compared against stored baselines; a metric that grows past the
+regression threshold fails the run. The baselines keep only the gated
+metrics, and ``--update`` leaves the timing baselines alone unless
+``--update-times`` is given, so timing noise doesn't rewrite the file.
+
+Usage:
+    python -m agent.benchmark                 # run and compare to baselines
+    python -m agent.benchmark --update        # accept new sizes and tokens
+    python -m agent.benchmark --update-times  # also accept the current timings
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Iterator, Sequence
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.outputs import LLMResult
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.memory import InMemorySaver
+
+from agent import outbox as outbox_module
+from agent.admission import CHARS_PER_TOKEN, estimate_tokens
+from agent.fakes import FakeChatModel, Responder
+from agent.outbox import HandoffOutbox
+
+DEFAULT_BASELINES = Path("tests/benchmarks/baselines.json")
+
+# Deterministic metrics: any growth past the threshold is a regression
+SIZE_METRICS = (
+    "model_calls",
+    "tool_calls",
+    "tool_payload_bytes",
+    "input_tokens_est",
+    "output_tokens_est",
+)
+# Timing metrics are noisy; they also need to grow by more than
+# ``min_time_delta_ms`` to count
+TIME_METRICS = ("graph_overhead_ms",)
+
+
+# ============================================================================
+# SCENARIOS
+# ============================================================================
+
+ToolCall = tuple[str, dict[str, Any]]
+
+
+@dataclass
+class Turn:
+    """One customer message and the model's scripted reaction to it.
+
+    ``steps`` are the model calls before the final reply; each step is a list
+    of tool calls issued together (more than one runs the tools in parallel).
+    """
+
+    customer: str
+    steps: list[list[ToolCall]]
+    reply: str
+
+
+@dataclass
+class Scenario:
+    """A scripted sales conversation."""
+
+    name: str
+    description: str
+    turns: list[Turn] = field(default_factory=list)
+
+
+SCENARIOS = [
+    Scenario(
+        "family_val_thorens_camps",
+        "Family of four to Val Thorens, asks about camps and a hotel",
+        [
+            Turn(
+                "היי! אנחנו משפחה, 2 מבוגרים ו-2 ילדים בני 6 ו-9, רוצים לואל טורנס בפסח",
+                [[("get_hotels_list", {"resort": "ואל טורנס"})]],
+                "איזה כיף! 🎿 בואל טורנס יש לנו כמה מלונות שמתאימים למשפחה של 4, "
+                "למשל Le fitz roy ו-Les Balcons. ספא חשוב לכם?",
+            ),
+            Turn(
+                "יש שם קייטנות לילדים?",
+                [[("get_camps_info", {"resorts": ["ואל טורנס"], "child_age": 6})]],
+                "בטח! בואל טורנס יש קייטנות סקי לגילאי 6 ו-9 😊 "
+                "רוצים שאפרט על המחירים והשעות?",
+            ),
+            Turn(
+                "ספרי לי עוד על Les Balcons",
+                [[("get_hotel_info", {"hotel_name": "Les Balcons"})]],
+                "Les Balcons הוא מלון 4 כוכבים עם ספא, מתאים למשפחה עד 4. "
+                "מה רמת הסקי שלכם?",
+            ),
+        ],
+    ),
+    Scenario(
+        "couple_spa_austria",
+        "Couple looking for a spa hotel in Austria, compares two hotels",
+        [
+            Turn(
+                "היי, אנחנו זוג ומחפשים מלון עם ספא טוב באוסטריה, במרץ",
+                [
+                    [
+                        (
+                            "search_hotels_by_criteria",
+                            {
+                                "country": "אוסטריה",
+                                "has_spa": True,
+                                "suitable_for": "זוגות",
+                                "min_stars": 4,
+                            },
+                        )
+                    ]
+                ],
+                "יש לנו כמה מלונות ספא מעולים לזוגות באוסטריה 💆 "
+                "למשל NEUE HAUS במאיירהופן ו-Chalet Madlein באישגיל.",
+            ),
+            Turn(
+                "מה ההבדל בין NEUE HAUS ל-Chalet Madlein?",
+                [
+                    [
+                        (
+                            "get_hotel_info",
+                            {"hotel_name": "NEUE HAUS", "sections": ["spa", "location"]},
+                        ),
+                        (
+                            "get_hotel_info",
+                            {"hotel_name": "Chalet Madlein", "sections": ["spa", "location"]},
+                        ),
+                    ]
+                ],
+                "שניהם 5 כוכבים עם ספא. NEUE HAUS קרוב יותר למעליות, "
+                "Chalet Madlein באישגיל עם חיי אפרסקי תוססים יותר.",
+            ),
+        ],
+    ),
+    Scenario(
+        "kosher_inquiry",
+        "Customer keeping kosher asks about SKIPA and destinations",
+        [
+            Turn(
+                "שלום, אנחנו שומרי כשרות. יש לכם חופשות סקי כשרות?",
+                [[("get_kosher_info", {})]],
+                "בהחלט! יש לנו מחלקה ייעודית לחופשות סקי כשרות - סקיפה 🙏🏻",
+            ),
+            Turn(
+                "ואיזה יעדים יש לכם בכלל?",
+                [[("get_available_destinations", {})]],
+                "יש לנו יעדים באוסטריה, צרפת, איטליה, אנדורה, בולגריה וגאורגיה. "
+                "מה מעניין אתכם?",
+            ),
+        ],
+    ),
+    Scenario(
+        "full_handoff",
+        "Family to Bansko from first message to handoff",
+        [
+            Turn(
+                "היי, אנחנו 4, 2 מבוגרים ו-2 ילדים בני 8 ו-11, "
+                "רוצים לבנסקו בפברואר, כולנו מתחילים",
+                [[("get_hotels_list", {"resort": "בנסקו"})]],
+                "בבנסקו יש לנו את Lucky (5 כוכבים) ו-Platinum. "
+                "ל-4 עם ילדים Lucky מתאים יותר 😊",
+            ),
+            Turn(
+                "יש קייטנה בבנסקו לבן 8?",
+                [[("get_resort_camps_info", {"country": "בולגריה", "resort": "בנסקו"})]],
+                "כן! יש קייטנה בבנסקו שמתאימה לבן 8 ⛷️",
+            ),
+            Turn(
+                "מעולה, נלך על Lucky. אני יונתן שלוש, 0501234567, yoni@example.com",
+                [
+                    [
+                        (
+                            "handoff_to_agent",
+                            {"hotel_preference": "Lucky", "needs_ski_school": True},
+                        )
+                    ]
+                ],
+                "העברתי את הפרטים לנציג שיחזור אליכם בהקדם 🙏🏻",
+            ),
+        ],
+    ),
+]
+
+
+class ScriptedResponder:
+    """`FakeChatModel` responder that plays the model side of scenarios.
+
+    The turn is found by the text of the last customer message (the model
+    input may be trimmed, so counting turns is unreliable); the step by the
+    number of model messages since that message. Messages that belong to no
+    scenario go to ``fallback`` (an error without one).
+    """
+
+    def __init__(self, *scenarios: Scenario, fallback: Responder | None = None) -> None:
+        """Index the turns of ``scenarios`` by their customer message."""
+        self.fallback = fallback
+        self._turns = {
+            turn.customer: (scenario, i)
+            for scenario in scenarios
+            for i, turn in enumerate(scenario.turns)
+        }
+
+    def __call__(self, messages: Sequence[BaseMessage]) -> AIMessage:
+        """Answer the latest customer message with its scripted step."""
+        for position in range(len(messages) - 1, -1, -1):
+            if isinstance(messages[position], HumanMessage):
+                break
+        else:
+            raise ValueError("No customer message in model input")
+        text = messages[position].text
+        if text not in self._turns and self.fallback is not None:
+            return self.fallback(messages)
+        scenario, index = self._turns[text]
+        turn = scenario.turns[index]
+        step = sum(1 for m in messages[position + 1 :] if isinstance(m, AIMessage))
+        if step >= len(turn.steps):
+            return AIMessage(content=turn.reply)
+        return AIMessage(
+            content="",
+            tool_calls=[
+                {
+                    "name": name,
+                    "args": args,
+                    "id": f"{scenario.name}-{index}-{step}-{i}",
+                    "type": "tool_call",
+                }
+                for i, (name, args) in enumerate(turn.steps[step])
+            ],
+        )
+
+
+# ============================================================================
+# MEASUREMENT
+# ============================================================================
+
+
+class _Collector(BaseCallbackHandler):
+    """Collects model and tool timings, payload sizes and token estimates."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._started: dict[UUID, tuple[str, float]] = {}
+        self.model_calls = 0
+        self.model_seconds = 0.0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.tool_seconds = 0.0
+        self.tools: dict[str, list[tuple[float, int]]] = {}
+
+    def on_chat_model_start(
+        self,
+        serialized: dict[str, Any],
+        messages: list[list[BaseMessage]],
+        *,
+        run_id: UUID,
+        **kwargs: Any,
+    ) -> None:
+        bound_tools = (kwargs.get("invocation_params") or {}).get("tools") or []
+        schema_chars = len(json.dumps(bound_tools, ensure_ascii=False))
+        with self._lock:
+            self._started[run_id] = ("model", time.perf_counter())
+            self.model_calls += 1
+            self.input_tokens += estimate_tokens(messages[0])
+            self.input_tokens += schema_chars // CHARS_PER_TOKEN
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            _, start = self._started.pop(run_id)
+            self.model_seconds += time.perf_counter() - start
+            for generations in response.generations:
+                for generation in generations:
+                    message = getattr(generation, "message", None)
+                    if message is not None:
+                        self.output_tokens += estimate_tokens([message])
+
+    def on_tool_start(
+        self,
+        serialized: dict[str, Any],
+        input_str: str,
+        *,
+        run_id: UUID,
+        **kwargs: Any,
+    ) -> None:
+        name = serialized.get("name") or kwargs.get("name") or "unknown"
+        with self._lock:
+            self._started[run_id] = (name, time.perf_counter())
+
+    def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        content = getattr(output, "content", output)
+        if not isinstance(content, str):
+            content = json.dumps(content, ensure_ascii=False, default=str)
+        with self._lock:
+            name, start = self._started.pop(run_id)
+            elapsed = time.perf_counter() - start
+            self.tool_seconds += elapsed
+            self.tools.setdefault(name, []).append((elapsed, len(content.encode())))
+
+    def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self.on_tool_end(f"{type(error).__name__}: {error}", run_id=run_id)
+
+
+@contextmanager
+def scratch_outbox() -> Iterator[None]:
+    """Send handoffs to a temporary outbox instead of the real one."""
+    previous = outbox_module._outbox
+    with tempfile.TemporaryDirectory() as tmp:
+        box = HandoffOutbox(Path(tmp) / "outbox.db")
+        outbox_module._outbox = box
+        try:
+            yield
+        finally:
+            outbox_module._outbox = previous
+            box.close()
+
+
+def _run_once(scenario: Scenario, thread_id: str) -> tuple[float, _Collector]:
+    from agent.graph import make_graph
+
+    graph = make_graph(
+        FakeChatModel(responder=ScriptedResponder(scenario)),
+        checkpointer=InMemorySaver(),
+    )
+    collector = _Collector()
+    config: RunnableConfig = {
+        "configurable": {"thread_id": thread_id},
+        "callbacks": [collector],
+    }
+    wall = 0.0
+    for turn in scenario.turns:
+        start = time.perf_counter()
+        result = graph.invoke({"messages": [HumanMessage(content=turn.customer)]}, config)
+        wall += time.perf_counter() - start
+        if result["messages"][-1].text != turn.reply:
+            raise RuntimeError(f"{scenario.name}: turn did not finish with its reply")
+    return wall, collector
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 3)
+
+
+def run_scenario(scenario: Scenario, *, repeats: int = 5) -> dict[str, Any]:
+    """Run a scenario ``repeats`` times (after one warm-up run) and summarize it.
+
+    Counts, sizes and token estimates come from the last run (they are
+    deterministic). Wall, model and tool times are medians over the repeats;
+    graph overhead is the best run, which is far less noisy to gate on.
+    """
+    with scratch_outbox():
+        _run_once(scenario, f"bench:{scenario.name}:warmup")
+        runs = [
+            _run_once(scenario, f"bench:{scenario.name}:{i}") for i in range(repeats)
+        ]
+    wall = statistics.median(w for w, _ in runs)
+    model = statistics.median(c.model_seconds for _, c in runs)
+    tool = statistics.median(c.tool_seconds for _, c in runs)
+    overhead = min(w - c.model_seconds - c.tool_seconds for w, c in runs)
+    last = runs[-1][1]
+
+    tools: dict[str, dict[str, Any]] = {}
+    for name in sorted(last.tools):
+        durations = [d for _, c in runs for d, _ in c.tools.get(name, [])]
+        tools[name] = {
+            "calls": len(last.tools[name]),
+            "payload_bytes": sum(size for _, size in last.tools[name]),
+            "p50_ms": _ms(statistics.median(durations)),
+            "max_ms": _ms(max(durations)),
+        }
+    return {
+        "turns": len(scenario.turns),
+        "model_calls": last.model_calls,
+        "tool_calls": sum(t["calls"] for t in tools.values()),
+        "tool_payload_bytes": sum(t["payload_bytes"] for t in tools.values()),
+        "input_tokens_est": last.input_tokens,
+        "output_tokens_est": last.output_tokens,
+        "wall_ms": _ms(wall),
+        "model_ms": _ms(model),
+        "tool_ms": _ms(tool),
+        "graph_overhead_ms": _ms(overhead),
+        "tools": tools,
+    }
+
+
+def run_all(
+    scenarios: Sequence[Scenario] = SCENARIOS, *, repeats: int = 5
+) -> dict[str, dict[str, Any]]:
+    """Run every scenario; results are keyed by scenario name."""
+    return {s.name: run_scenario(s, repeats=repeats) for s in scenarios}
+
+
+# ============================================================================
+# BASELINES
+# ============================================================================
+
+
+def _grew(current: float, baseline: float, threshold: float) -> bool:
+    return current > baseline * (1 + threshold)
+
+
+def compare(
+    results: dict[str, dict[str, Any]],
+    baselines: dict[str, dict[str, Any]],
+    *,
+    threshold: float = 0.10,
+    time_threshold: float = 0.50,
+    min_time_delta_ms: float = 5.0,
+    times: bool = True,
+) -> list[str]:
+    """Return a description of every metric that regressed past its threshold.
+
+    Improvements never fail; scenarios without a baseline are skipped. With
+    ``times`` off only the deterministic metrics are compared.
+    """
+    regressions = []
+    for name, result in results.items():
+        baseline = baselines.get(name)
+        if baseline is None:
+            continue
+        for metric in SIZE_METRICS:
+            if _grew(result[metric], baseline[metric], threshold):
+                regressions.append(
+                    f"{name}: {metric} {baseline[metric]} -> {result[metric]}"
+                )
+        for tool, stats in result["tools"].items():
+            base_tool = baseline["tools"].get(tool)
+            if base_tool and _grew(
+                stats["payload_bytes"], base_tool["payload_bytes"], threshold
+            ):
+                regressions.append(
+                    f"{name}: {tool} payload_bytes "
+                    f"{base_tool['payload_bytes']} -> {stats['payload_bytes']}"
+                )
+        for metric in TIME_METRICS if times else ():
+            current, base = result[metric], baseline[metric]
+            if _grew(current, base, time_threshold) and current - base > min_time_delta_ms:
+                regressions.append(f"{name}: {metric} {base} -> {current}")
+    return regressions
+
+
+def load_baselines(path: Path = DEFAULT_BASELINES) -> dict[str, dict[str, Any]]:
+    """Load stored baselines ({} when the file does not exist)."""
+    if not path.exists():
+        return {}
+    with open(path, encoding="utf-8") as f:
+        baselines: dict[str, dict[str, Any]] = json.load(f)
+    return baselines
+
+
+def baseline_entry(result: dict[str, Any]) -> dict[str, Any]:
+    """Keep the part of a scenario result that `compare` gates on."""
+    entry = {metric: result[metric] for metric in (*SIZE_METRICS, *TIME_METRICS)}
+    entry["tools"] = {
+        name: {"calls": t["calls"], "payload_bytes": t["payload_bytes"]}
+        for name, t in result["tools"].items()
+    }
+    return entry
+
+
+def update_baselines(
+    baselines: dict[str, dict[str, Any]],
+    results: dict[str, dict[str, Any]],
+    *,
+    times: bool = False,
+) -> dict[str, dict[str, Any]]:
+    """Merge ``results`` into ``baselines``, keeping known timings unless ``times``."""
+    updated = dict(baselines)
+    for name, result in results.items():
+        entry = baseline_entry(result)
+        previous = baselines.get(name)
+        if previous is not None and not times:
+            entry.update((m, previous[m]) for m in TIME_METRICS if m in previous)
+        updated[name] = entry
+    return updated
+
+
+def save_baselines(
+    results: dict[str, dict[str, Any]], path: Path = DEFAULT_BASELINES
+) -> None:
+    """Store ``results`` as the new baselines."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+def format_report(results: dict[str, dict[str, Any]]) -> str:
+    """Render results as a plain-text table per scenario."""
+    lines = []
+    for name, r in results.items():
+        lines.append(
+            f"{name}: {r['turns']} turns, {r['model_calls']} model calls, "
+            f"{r['tool_calls']} tool calls"
+        )
+        lines.append(
+            f"  wall {r['wall_ms']:.1f}ms | model {r['model_ms']:.1f}ms | "
+            f"tools {r['tool_ms']:.1f}ms | graph overhead {r['graph_overhead_ms']:.1f}ms"
+        )
+        lines.append(
+            f"  tokens (est.) in {r['input_tokens_est']} / out {r['output_tokens_est']}"
+            f" | tool payload {r['tool_payload_bytes']} bytes"
+        )
+        for tool, t in r["tools"].items():
+            lines.append(
+                f"    {tool:<28} x{t['calls']:<2} {t['payload_bytes']:>7} B  "
+                f"p50 {t['p50_ms']:.2f}ms  max {t['max_ms']:.2f}ms"
+            )
+    return "\n".join(lines)
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    """Command-line entry point; returns a process exit code."""
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--baselines", type=Path, default=DEFAULT_BASELINES)
+    parser.add_argument("--update", action="store_true", help="accept new sizes and tokens")
+    parser.add_argument(
+        "--update-times", action="store_true", help="also accept the current timings"
+    )
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--threshold", type=float, default=0.10)
+    parser.add_argument("--time-threshold", type=float, default=0.50)
+    parser.add_argument("--scenario", action="append", help="run only these scenarios")
+    args = parser.parse_args(argv)
+
+    scenarios = [s for s in SCENARIOS if not args.scenario or s.name in args.scenario]
+    results = run_all(scenarios, repeats=args.repeats)
+    out = sys.stdout
+    out.write(format_report(results) + "\n")
+
+    if args.update or args.update_times:
+        baselines = update_baselines(
+            load_baselines(args.baselines), results, times=args.update_times
+        )
+        save_baselines(baselines, args.baselines)
+        out.write(f"\nBaselines written to {args.baselines}\n")
+        return 0
+    regressions = compare(
+        results,
+        load_baselines(args.baselines),
+        threshold=args.threshold,
+        time_threshold=args.time_threshold,
+    )
+    if regressions:
+        out.write("\nRegressions:\n")
+        out.write("".join(f"  {r}\n" for r in regressions))
+        return 1
+    out.write("\nNo regressions against baselines\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,228 @@
+"""SkiDeal Bot - Record/replay cassettes for model calls.
+
+`CassetteChatModel` wraps a chat model (the shared `ChatAnthropic` in
+`agent.graph`) and, depending on its mode:
+
+- ``record``: calls the real model and stores request and response in the
+  cassette directory, one JSON file per request, named by a hash of the
+  normalized request,
+- ``replay``: serves responses from the cassette without touching the
+  network; a request that was never recorded raises `CassetteMiss`,
+- ``auto``: replays when the request was recorded, records otherwise.
+
+The request hash covers the model parameters, the bound tool schemas and the
+conversation, but not volatile details (message and tool call ids, response
+metadata, prompt cache markers), so a recorded sales transcript replays
+deterministically. Replay can also sleep for the recorded latency, making
+cassettes usable as performance fixtures.
+
+Configuration (environment variables):
+    SKIDEAL_CASSETTE_MODE: record, replay or auto (default: off)
+    SKIDEAL_CASSETTE_DIR: Cassette directory (default: cassettes)
+    SKIDEAL_CASSETTE_LATENCY: Set to 1 to replay with the recorded latencies
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Literal, Sequence
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import (
+    AIMessage,
+    BaseMessage,
+    message_to_dict,
+    messages_from_dict,
+)
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import Runnable
+
+CassetteMode = Literal["record", "replay", "auto"]
+
+DEFAULT_CASSETTE_DIR = "cassettes"
+
+# Client settings that don't change what the model answers
+_TRANSPORT_PARAMS = {"max_retries", "default_request_timeout", "streaming"}
+# Content block keys that vary between runs or don't change the answer
+_VOLATILE_KEYS = {"id", "cache_control"}
+
+
+class CassetteMiss(KeyError):
+    """A replayed request was never recorded."""
+
+
+def _strip(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: _strip(v) for k, v in value.items() if k not in _VOLATILE_KEYS}
+    if isinstance(value, list):
+        return [_strip(v) for v in value]
+    return value
+
+
+def normalize_message(message: BaseMessage) -> dict[str, Any]:
+    """Keep the parts of a message that determine the model's answer."""
+    normalized: dict[str, Any] = {"type": message.type, "content": _strip(message.content)}
+    tool_calls = getattr(message, "tool_calls", None)
+    if tool_calls:
+        normalized["tool_calls"] = [
+            {"name": call["name"], "args": call["args"]} for call in tool_calls
+        ]
+    if message.type == "tool":
+        normalized["name"] = message.name
+        normalized["status"] = getattr(message, "status", "success")
+    return normalized
+
+
+def request_key(
+    messages: Sequence[BaseMessage], params: dict[str, Any], call_kwargs: dict[str, Any]
+) -> str:
+    """Hash of a normalized model request."""
+    request = {
+        "params": params,
+        "kwargs": _strip(call_kwargs),
+        "messages": [normalize_message(m) for m in messages],
+    }
+    payload = json.dumps(request, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class CassetteChatModel(BaseChatModel):
+    """Chat model wrapper that records model calls to, or replays them from, disk."""
+
+    inner: BaseChatModel
+    cassette_dir: Path
+    mode: CassetteMode = "replay"
+    # Sleep for the recorded latency times this factor on replay (0: don't)
+    latency_scale: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "skideal-cassette"
+
+    @property
+    def _identifying_params(self) -> dict[str, Any]:
+        return {
+            k: v
+            for k, v in self.inner._identifying_params.items()
+            if k not in _TRANSPORT_PARAMS
+        }
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> Runnable[Any, Any]:
+        """Bind tools formatted the way the wrapped model formats them."""
+        binding = self.inner.bind_tools(tools, **kwargs)
+        return self.bind(**getattr(binding, "kwargs", {}))
+
+    # -- storage ----------------------------------------------------------------
+
+    def _path(self, key: str) -> Path:
+        return Path(self.cassette_dir) / f"{key}.json"
+
+    def _load(self, key: str) -> tuple[AIMessage, float] | None:
+        path = self._path(key)
+        if not path.exists():
+            return None
+        with open(path, encoding="utf-8") as f:
+            entry = json.load(f)
+        [message] = messages_from_dict([entry["response"]])
+        return message, entry["latency"]  # type: ignore[return-value]
+
+    def _save(
+        self,
+        key: str,
+        messages: Sequence[BaseMessage],
+        response: BaseMessage,
+        latency: float,
+    ) -> None:
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        entry = {
+            "key": key,
+            "params": self._identifying_params,
+            "request": [normalize_message(m) for m in messages],
+            "response": message_to_dict(response),
+            "latency": round(latency, 4),
+            "recorded_at": time.time(),
+        }
+        # Write a private temporary file then rename it, so concurrent
+        # recorders (threads or processes) never leave a torn file
+        with tempfile.NamedTemporaryFile(
+            "w", encoding="utf-8", dir=path.parent, suffix=".tmp", delete=False
+        ) as f:
+            json.dump(entry, f, ensure_ascii=False, indent=2)
+        Path(f.name).replace(path)
+
+    def _lookup(
+        self, messages: list[BaseMessage], stop: list[str] | None, kwargs: dict[str, Any]
+    ) -> tuple[str, tuple[AIMessage, float] | None]:
+        key = request_key(messages, self._identifying_params, {"stop": stop, **kwargs})
+        hit = self._load(key) if self.mode != "record" else None
+        if hit is None and self.mode == "replay":
+            raise CassetteMiss(f"No recorded response for request {key[:12]} in {self.cassette_dir}")
+        return key, hit
+
+    @staticmethod
+    def _result(message: BaseMessage) -> ChatResult:
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    # -- generation ---------------------------------------------------------------
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        key, hit = self._lookup(messages, stop, kwargs)
+        if hit is not None:
+            message, latency = hit
+            if self.latency_scale:
+                time.sleep(latency * self.latency_scale)
+            return self._result(message)
+        start = time.perf_counter()
+        response = self.inner.invoke(messages, stop=stop, **kwargs)
+        self._save(key, messages, response, time.perf_counter() - start)
+        return self._result(response)
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        key, hit = self._lookup(messages, stop, kwargs)
+        if hit is not None:
+            message, latency = hit
+            if self.latency_scale:
+                await asyncio.sleep(latency * self.latency_scale)
+            return self._result(message)
+        start = time.perf_counter()
+        response = await self.inner.ainvoke(messages, stop=stop, **kwargs)
+        self._save(key, messages, response, time.perf_counter() - start)
+        return self._result(response)
+
+
+def cassette_from_env(model: BaseChatModel) -> BaseChatModel:
+    """Wrap ``model`` in a cassette when ``SKIDEAL_CASSETTE_MODE`` is set."""
+    mode = os.environ.get("SKIDEAL_CASSETTE_MODE", "").strip().lower()
+    if mode in ("", "off"):
+        return model
+    if mode not in ("record", "replay", "auto"):
+        raise ValueError(f"SKIDEAL_CASSETTE_MODE must be record, replay or auto, not {mode!r}")
+    return CassetteChatModel(
+        inner=model,
+        cassette_dir=Path(os.environ.get("SKIDEAL_CASSETTE_DIR", DEFAULT_CASSETTE_DIR)),
+        mode=mode,  # type: ignore[arg-type]
+        latency_scale=1.0 if os.environ.get("SKIDEAL_CASSETTE_LATENCY") == "1" else 0.0,
+    )
@@ -6,11 +6,15 @@ from agent.data.resorts import (
     DATA_SUMMARY,
     get_hotels,
     get_hotel_by_name,
+    get_hotel_names,
     get_hotels_by_country,
     get_hotels_by_resort,
     get_resort_info,
+    get_distance_to_lift,
+    get_hotel_location,
     search_hotels,
     get_countries,
+    get_facet_counts,
     get_resorts_by_country,
 )
 
@@ -19,6 +23,7 @@ from agent.data.camps import (
     CAMPS_SUMMARY,
     get_camps,
     get_camps_by_resort,
+    get_camps_for_resort,
     get_camps_by_country,
     get_camp_countries,
     get_camp_resorts_by_country,
@@ -34,17 +39,22 @@ __all__ = [
     "DATA_SUMMARY",
     "get_hotels",
     "get_hotel_by_name",
+    "get_hotel_names",
     "get_hotels_by_country",
     "get_hotels_by_resort",
     "get_resort_info",
+    "get_distance_to_lift",
+    "get_hotel_location",
     "search_hotels",
     "get_countries",
+    "get_facet_counts",
     "get_resorts_by_country",
     # Camps
     "CAMPS_DATA",
     "CAMPS_SUMMARY",
     "get_camps",
     "get_camps_by_resort",
+    "get_camps_for_resort",
     "get_camps_by_country",
     "get_camp_countries",
     "get_camp_resorts_by_country",
@@ -0,0 +1,123 @@
+"""SkiDeal Bot - Resort alias index.
+
+The sheets name the same resort differently: camps are split into variants
+("בנסקו שבוע", "בנסקו סופש", "בנסקו א-ה" next to "בנסקו"), and spellings
+drift between the hotel, resort and camp sheets ("מאירהופן" / "מאיירהופן",
+"לז ארק" / "לז-ארק", "אבוריאז'" / "אבוריאז"). `ResortAliases` maps every
+name to one canonical resort with its hotel spellings, resort-info records
+and camp variants, so a single lookup by the resort name customers use
+finds all of them.
+
+A camp resort belongs to the resort whose name is its longest word prefix
+("בנסקו סופש" -> "בנסקו"); camp resorts without hotels are their own
+canonical resort.
+"""
+
+from __future__ import annotations
+
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Iterable
+
+from agent.data.catalog import Key, get_catalog
+
+_DROPPED = re.compile(r"[\"'`׳״]")
+_SEPARATORS = re.compile(r"[\s\-–_]+")
+_FINALS = str.maketrans("ךםןףץ", "כמנפצ")
+
+
+def resort_key(name: str) -> str:
+    """Spelling-insensitive key of a resort name."""
+    key = _DROPPED.sub("", name).lower().translate(_FINALS)
+    # Hebrew spelling varies in doubled yod/vav ("מאיירהופן" vs "מאירהופן")
+    key = key.replace("יי", "י").replace("וו", "ו")
+    return _SEPARATORS.sub(" ", key).strip()
+
+
+@dataclass
+class ResortAlias:
+    """One canonical resort and the names the sheets use for it."""
+
+    name: str
+    country: str
+    hotel_resorts: list[str] = field(default_factory=list)
+    info_sections: list[str] = field(default_factory=list)
+    camp_resorts: list[str] = field(default_factory=list)
+
+
+class ResortAliases:
+    """Index from any resort spelling or camp variant to its canonical resort."""
+
+    def __init__(
+        self,
+        hotel_keys: Iterable[Key],
+        section_keys: Iterable[Key],
+        camp_keys: Iterable[Key],
+    ) -> None:
+        """Index the resorts of the hotel, resort info and camp sections."""
+        self.resorts: dict[str, ResortAlias] = {}
+        # Camp variant key -> exact camp resort name
+        self._variants: dict[str, str] = {}
+        for country, resort, _ in hotel_keys:
+            entry = self._entry(country, resort)
+            if resort not in entry.hotel_resorts:
+                entry.hotel_resorts.append(resort)
+        for country, resort, section in section_keys:
+            entry = self._entry(country, resort)
+            if section not in entry.info_sections:
+                entry.info_sections.append(section)
+        camp_resorts = {(country, resort) for country, resort, _ in camp_keys}
+        for country, resort in sorted(camp_resorts, key=lambda cr: len(cr[1])):
+            key = resort_key(resort)
+            self._variants[key] = resort
+            entry = self._base(key) or self._entry(country, resort)
+            entry.camp_resorts.append(resort)
+
+    def _entry(self, country: str, resort: str) -> ResortAlias:
+        key = resort_key(resort)
+        if key not in self.resorts:
+            self.resorts[key] = ResortAlias(name=resort, country=country)
+        return self.resorts[key]
+
+    def _base(self, key: str) -> ResortAlias | None:
+        words = key.split()
+        for size in range(len(words), 0, -1):
+            entry = self.resorts.get(" ".join(words[:size]))
+            if entry is not None:
+                return entry
+        return None
+
+    def resolve(self, name: str) -> ResortAlias | None:
+        """Find the canonical resort for a resort name or camp variant."""
+        return self._base(resort_key(name)) if name.strip() else None
+
+    def camp_variants(self, name: str) -> list[str]:
+        """Camp resort names for ``name``.
+
+        A resort name expands to all of its camp variants; a specific variant
+        ("בנסקו סופש") only matches itself.
+        """
+        key = resort_key(name)
+        entry = self.resorts.get(key)
+        if entry is not None:
+            return list(entry.camp_resorts)
+        variant = self._variants.get(key)
+        return [variant] if variant else []
+
+
+_aliases: ResortAliases | None = None
+_aliases_lock = threading.Lock()
+
+
+def get_resort_aliases() -> ResortAliases:
+    """Get the resort alias index of the catalog (built on first use)."""
+    global _aliases
+    if _aliases is None:
+        with _aliases_lock:
+            if _aliases is None:
+                catalog = get_catalog()
+                _aliases = ResortAliases(
+                    catalog["hotels"].keys, catalog["resort_info"].keys, catalog["camps"].keys
+                )
+    return _aliases
@@ -8,12 +8,15 @@ import json
 from pathlib import Path
 from typing import Any
 
+from agent.data.aliases import get_resort_aliases
+from agent.data.catalog import CatalogRecords, get_catalog
+
 # Path to the JSONL data file (in the same directory as this file)
 CAMPS_FILE = Path(__file__).parent / "camps.jsonl"
 
 
 def load_all_camps() -> list[dict[str, Any]]:
-    """Load all camp records from the JSONL file."""
+    """Load all camp records from the JSONL file (parsed on every call)."""
     records = []
     with open(CAMPS_FILE, "r", encoding="utf-8") as f:
         for line in f:
@@ -23,32 +26,25 @@ def load_all_camps() -> list[dict[str, Any]]:
     return records
 
 
-def get_camps() -> list[dict[str, Any]]:
-    """Get all camp records from the data."""
-    return load_all_camps()
+def get_camps() -> CatalogRecords:
+    """Get all camp records from the data (a read-only catalog view)."""
+    return get_catalog()["camps"]
 
 
 def get_camp_countries() -> list[str]:
     """Get list of all unique countries that have camps."""
-    camps = get_camps()
-    countries = set()
-    for camp in camps:
-        country = camp.get("מדינה", "")
-        if country:
-            countries.add(country)
-    return sorted(list(countries))
+    return sorted({country for country, _, _ in get_camps().keys if country})
 
 
 def get_camp_resorts_by_country(country: str) -> list[str]:
     """Get list of resorts with camps for a specific country."""
-    camps = get_camps()
-    resorts = set()
-    for camp in camps:
-        if camp.get("מדינה", "").lower() == country.lower():
-            resort = camp.get("אתר", "")
-            if resort:
-                resorts.add(resort)
-    return sorted(list(resorts))
+    return sorted(
+        {
+            resort
+            for c, resort, _ in get_camps().keys
+            if resort and c.lower() == country.lower()
+        }
+    )
 
 
 def get_all_camp_resorts() -> dict[str, list[str]]:
@@ -62,14 +58,26 @@ def get_all_camp_resorts() -> dict[str, list[str]]:
 
 def get_camps_by_resort(resort: str) -> list[dict[str, Any]]:
     """Get all camps in a specific resort (exact match)."""
-    camps = get_camps()
-    return [c for c in camps if c.get("אתר", "").lower() == resort.lower()]
+    return get_camps().where(resort=resort)
+
+
+def get_camps_for_resort(resort: str) -> dict[str, list[dict[str, Any]]]:
+    """Get the camps of a resort grouped by camp variant.
+
+    A resort name ("בנסקו", also in other spellings) expands to all of its
+    camp variants ("בנסקו שבוע", "בנסקו סופש", ...); a variant name only
+    returns its own camps.
+    """
+    return {
+        variant: camps
+        for variant in get_resort_aliases().camp_variants(resort)
+        if (camps := get_camps_by_resort(variant))
+    }
 
 
 def get_camps_by_country(country: str) -> list[dict[str, Any]]:
     """Get all camps in a specific country."""
-    camps = get_camps()
-    return [c for c in camps if c.get("מדינה", "").lower() == country.lower()]
+    return get_camps().where(country=country)
 
 
 def search_camps_by_resort_prefix(resort_prefix: str) -> list[dict[str, Any]]:
@@ -80,8 +88,8 @@ def search_camps_by_resort_prefix(resort_prefix: str) -> list[dict[str, Any]]:
     camps = get_camps()
     resort_lower = resort_prefix.lower()
     return [
-        c for c in camps 
-        if resort_lower in c.get("אתר", "").lower()
+        camps[i] for i, (_, resort, _) in enumerate(camps.keys)
+        if resort_lower in resort.lower()
     ]
 
 
@@ -96,7 +104,8 @@ def search_camps(
     
     Args:
         country: Filter by country name (e.g., "צרפת", "בולגריה")
-        resort: Filter by resort name or partial name
+        resort: Filter by resort name (expanded to its camp variants) or
+            partial name
         min_age: Minimum age of child
         max_age: Maximum age of child
         includes_lunch: True to filter for camps that include lunch
@@ -106,14 +115,18 @@ def search_camps(
     """
     camps = get_camps()
     results = []
+    variants = {v.lower() for v in get_resort_aliases().camp_variants(resort or "")}
     
     for camp in camps:
         # Country filter
         if country and camp.get("מדינה", "").lower() != country.lower():
             continue
             
-        # Resort filter (partial match)
-        if resort and resort.lower() not in camp.get("אתר", "").lower():
+        # Resort filter (known resort: its variants, otherwise partial match)
+        camp_resort = camp.get("אתר", "").lower()
+        if variants and camp_resort not in variants:
+            continue
+        if resort and not variants and resort.lower() not in camp_resort:
             continue
         
         # Age filter - check if the age range overlaps
@@ -0,0 +1,295 @@
+"""SkiDeal Bot - Read-only catalog snapshot shared across processes.
+
+The hotel, resort and camp records are serialized once into a compact binary
+snapshot: a JSON header with per-record key columns (country, resort, name),
+precomputed hotel facet bitsets and coordinates, an offset table, and one compact JSON
+blob per record. Processes map the snapshot read-only and decode a record
+only when it is accessed, so:
+
+- worker start skips parsing and categorizing the JSONL files,
+- the records live once in the page cache (on ``/dev/shm`` by default, i.e.
+  shared memory) instead of as a dict-of-dicts copy in every worker,
+- lookups by country, resort or name use the key columns and decode only
+  the matching records.
+
+Without ``SKIDEAL_CATALOG_SNAPSHOT`` each process builds the same snapshot in
+its own memory, so the data functions behave the same in both modes.
+
+To share one snapshot between worker processes, build it in the parent (or
+the container entrypoint) and point the workers at it::
+
+    python -m agent.data.catalog /dev/shm/skideal-catalog.bin
+    SKIDEAL_CATALOG_SNAPSHOT=/dev/shm/skideal-catalog.bin uvicorn ... --workers 4
+
+With ``SKIDEAL_CATALOG_SNAPSHOT=auto`` the first worker builds the snapshot
+under ``/dev/shm`` and the others attach to it. A snapshot whose source
+files changed is rebuilt.
+
+Configuration (environment variables):
+    SKIDEAL_CATALOG_SNAPSHOT: Snapshot path, or "auto" (default: per-process)
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+from array import array
+from pathlib import Path
+from typing import Any, Iterator, Sequence, overload
+
+from agent.data.facets import FacetIndex
+from agent.data.geo import GeoIndex, geo_columns
+
+DATA_DIR = Path(__file__).parent
+SOURCES = {
+    "resorts": DATA_DIR / "resorts" / "super_info_bot_rows.jsonl",
+    "camps": DATA_DIR / "camps" / "camps.jsonl",
+}
+
+MAGIC = b"SKICAT02"
+# Magic, header length
+_PREAMBLE = struct.Struct("<8sQ")
+# Records of section rows rather than hotels in the resorts file
+RESORT_SECTION_NAMES = {"כללי", "הערות כלליות", "הערות כלליות על האתר"}
+
+Key = tuple[str, str, str]
+
+
+def _read_jsonl(path: Path) -> list[dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def source_fingerprint() -> str:
+    """Identify the current source files (by size and modification time)."""
+    digest = hashlib.sha256()
+    for name, path in sorted(SOURCES.items()):
+        stat = path.stat()
+        digest.update(f"{name}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return digest.hexdigest()[:16]
+
+
+def _split_resorts(
+    records: list[dict[str, Any]],
+) -> tuple[list[dict[str, Any]], list[dict[str, Any]]]:
+    """Split the resorts file into hotel records and resort section records."""
+    hotels, sections = [], []
+    for record in records:
+        if record.get("שם מלון באנגלית", "") in RESORT_SECTION_NAMES:
+            sections.append(record)
+        elif "נתונים יבשים" in record:
+            hotels.append(record)
+    return hotels, sections
+
+
+def _key(record: dict[str, Any]) -> Key:
+    name = record.get("שם מלון באנגלית") or record.get("שם קייטנה") or ""
+    return record.get("מדינה", ""), record.get("אתר", ""), name
+
+
+def build_snapshot() -> bytes:
+    """Parse the source files and serialize the catalog snapshot.
+
+    Layout: magic and header length, the JSON header, padding to 8 bytes,
+    the offset tables of all sections (``count + 1`` unsigned 64-bit offsets
+    each, relative to the record area) and the record area.
+    """
+    hotels, resort_sections = _split_resorts(_read_jsonl(SOURCES["resorts"]))
+    sections = {
+        "hotels": hotels,
+        "resort_info": resort_sections,
+        "camps": _read_jsonl(SOURCES["camps"]),
+    }
+    facets = FacetIndex(hotels)
+    layout: dict[str, Any] = {}
+    offsets = array("Q")
+    records = bytearray()
+    for name, section in sections.items():
+        layout[name] = {
+            "table": len(offsets),
+            "keys": [_key(r) for r in section],
+        }
+        for record in section:
+            offsets.append(len(records))
+            records += json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode()
+        offsets.append(len(records))
+    layout["hotels"]["facets"] = [list(facets.bits(h)) for h in hotels]
+    layout["hotels"]["geo"] = geo_columns(hotels)
+
+    header = {"fingerprint": source_fingerprint(), "entries": len(offsets), "sections": layout}
+    header_bytes = json.dumps(header, ensure_ascii=False).encode()
+    header_bytes += b" " * (-(_PREAMBLE.size + len(header_bytes)) % 8)
+    return b"".join(
+        (_PREAMBLE.pack(MAGIC, len(header_bytes)), header_bytes, offsets.tobytes(), records)
+    )
+
+
+class CatalogRecords(Sequence[dict[str, Any]]):
+    """Read-only records of one catalog section, decoded on access.
+
+    Every access returns a fresh dict, so callers can't modify the shared
+    data. ``keys`` holds ``(country, resort, name)`` per record.
+    """
+
+    def __init__(self, offsets: memoryview, records: memoryview, keys: list[Key]) -> None:
+        """Read records ``i`` from ``records[offsets[i]:offsets[i + 1]]``."""
+        self._offsets = offsets
+        self._records = records
+        self.keys = keys
+
+    def __len__(self) -> int:
+        """Return the number of records."""
+        return len(self.keys)
+
+    @overload
+    def __getitem__(self, index: int) -> dict[str, Any]: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> list[dict[str, Any]]: ...
+
+    def __getitem__(self, index: int | slice) -> Any:
+        """Decode the record at ``index`` (a list of records for a slice)."""
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("catalog record index out of range")
+        start, end = self._offsets[index], self._offsets[index + 1]
+        return json.loads(self._records[start:end].tobytes())
+
+    def __iter__(self) -> Iterator[dict[str, Any]]:
+        """Decode the records in order."""
+        for i in range(len(self)):
+            yield self[i]
+
+    def where(
+        self,
+        *,
+        country: str | None = None,
+        resort: str | None = None,
+        name: str | None = None,
+    ) -> list[dict[str, Any]]:
+        """Return the records matching the given keys (case-insensitive, exact)."""
+        wanted = [
+            (i, value.lower())
+            for i, value in enumerate((country, resort, name))
+            if value is not None
+        ]
+        return [
+            self[index]
+            for index, key in enumerate(self.keys)
+            if all(key[i].lower() == value for i, value in wanted)
+        ]
+
+
+class Catalog:
+    """A catalog snapshot: hotel, resort info and camp sections."""
+
+    def __init__(self, data: bytes | mmap.mmap, *, path: Path | None = None) -> None:
+        """Read a snapshot from ``data`` (``path`` is where it was mapped from)."""
+        self.path = path
+        self._data = data
+        buffer = memoryview(data)
+        magic, header_length = _PREAMBLE.unpack_from(buffer)
+        if magic != MAGIC:
+            raise ValueError(f"Not a SkiDeal catalog snapshot: {path}")
+        tables = _PREAMBLE.size + header_length
+        header = json.loads(buffer[_PREAMBLE.size : tables].tobytes())
+        self.fingerprint: str = header["fingerprint"]
+        records = tables + 8 * header["entries"]
+        offsets = buffer[tables:records].cast("Q")
+        layout = header["sections"]
+        self.sections = {}
+        for name, section in layout.items():
+            keys: list[Key] = [tuple(k) for k in section["keys"]]
+            table = section["table"]
+            self.sections[name] = CatalogRecords(
+                offsets[table : table + len(keys) + 1], buffer[records:], keys
+            )
+        hotels = self.sections["hotels"]
+        self.facets = FacetIndex.from_bitsets(
+            (key, yes, no) for key, (yes, no) in zip(hotels.keys, layout["hotels"]["facets"])
+        )
+        self.geo = GeoIndex.from_columns(hotels.keys, layout["hotels"]["geo"])
+
+    @classmethod
+    def attach(cls, path: Path) -> Catalog:
+        """Map a snapshot file read-only."""
+        with open(path, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return cls(data, path=path)
+
+    def __getitem__(self, section: str) -> CatalogRecords:
+        """Return the records of ``section``."""
+        return self.sections[section]
+
+
+def write_snapshot(path: Path) -> Path:
+    """Build the snapshot into ``path`` (atomically, via rename)."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.write_bytes(build_snapshot())
+    tmp.replace(path)
+    return path
+
+
+def default_snapshot_path() -> Path:
+    """Snapshot path for ``auto`` mode, on shared memory when available."""
+    shm = Path("/dev/shm")
+    base = shm if shm.is_dir() else Path(tempfile.gettempdir())
+    return base / f"skideal-catalog-{source_fingerprint()}.bin"
+
+
+def open_catalog(setting: str | None = None) -> Catalog:
+    """Open the catalog as configured by ``SKIDEAL_CATALOG_SNAPSHOT``."""
+    if setting is None:
+        setting = os.environ.get("SKIDEAL_CATALOG_SNAPSHOT", "").strip()
+    if not setting:
+        return Catalog(build_snapshot())
+    path = default_snapshot_path() if setting == "auto" else Path(setting)
+    if path.exists():
+        try:
+            catalog = Catalog.attach(path)
+        except ValueError:
+            # Snapshot of an older format
+            pass
+        else:
+            if catalog.fingerprint == source_fingerprint():
+                return catalog
+    return Catalog.attach(write_snapshot(path))
+
+
+_catalog: Catalog | None = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog() -> Catalog:
+    """Get the process-wide catalog (opened on first use)."""
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = open_catalog()
+    return _catalog
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    """Build a snapshot file for worker processes to attach to."""
+    parser = argparse.ArgumentParser(description="Build the SkiDeal catalog snapshot.")
+    parser.add_argument("path", nargs="?", type=Path, help="output (default: auto path)")
+    args = parser.parse_args(argv)
+    path = write_snapshot(args.path or default_snapshot_path())
+    sys.stdout.write(f"{path} ({path.stat().st_size} bytes)\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,196 @@
+"""SkiDeal Bot - Resort comparison table.
+
+"Which resort is best for us" used to mean fetching and reading every
+resort. `ResortComparison` aggregates the catalog once per process into one
+row per canonical resort (see `agent.data.aliases`): hotel count, star
+distribution, average booking score, spa share, camps and the ages they
+cover, and the holiday credits parsed from the ``זיכויים`` free text, e.g.::
+
+    זיכוי טיסות - 300 יורו ל-2 הכיוונים ו50 יורו לכיוון
+    זיכוי סקיפס - 180 יורו
+    זיכוי נסיעות - 20 יורו
+    הרחבת סקיפס- ללא הרחבה
+"""
+
+from __future__ import annotations
+
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Iterable
+
+from agent.data.aliases import ResortAliases, get_resort_aliases, resort_key
+from agent.data.catalog import Catalog, get_catalog
+
+_AMOUNT = re.compile(r"(\d+(?:\.\d+)?)\s*(?:יורו|אירו|€|eur)", re.IGNORECASE)
+_NO_SPA = {"אין", "אין ספא", ""}
+UNRATED = "ללא דירוג"
+
+
+@dataclass(frozen=True)
+class Credits:
+    """Holiday credits of a resort in euros (None when not stated)."""
+
+    flight_round_trip: float | None = None
+    flight_one_way: float | None = None
+    ski_pass: float | None = None
+    transfers: float | None = None
+    ski_pass_extension: float | None = None
+
+
+def parse_credits(text: str) -> Credits:
+    """Parse the ``סוגי זיכויים בחופשה`` text of a resort."""
+    values: dict[str, float | None] = {}
+    for line in text.splitlines():
+        amounts = [float(a) if "." in a else int(a) for a in _AMOUNT.findall(line)]
+        if "הרחב" in line:
+            values["ski_pass_extension"] = amounts[0] if amounts else 0
+        elif "טיס" in line:
+            # "300 יורו ל-2 הכיוונים ו50 יורו לכיוון"
+            values["flight_round_trip"] = amounts[0] if amounts else None
+            values["flight_one_way"] = amounts[1] if len(amounts) > 1 else None
+        elif "סקיפס" in line:
+            values["ski_pass"] = amounts[0] if amounts else None
+        elif "נסיע" in line or "העבר" in line:
+            values["transfers"] = amounts[0] if amounts else None
+    return Credits(**values)
+
+
+def _stars(value: Any) -> str:
+    if isinstance(value, str) and value.isdigit():
+        value = int(value)
+    return str(value) if isinstance(value, int) and value > 0 else UNRATED
+
+
+def _country_key(country: str) -> str:
+    # Hebrew spellings differ in added yods ("גאורגיה" / "גיאורגיה")
+    return resort_key(country).replace("י", "")
+
+
+@dataclass
+class ResortSummary:
+    """One row of the comparison table."""
+
+    name: str
+    country: str
+    hotels: int = 0
+    stars: dict[str, int] = field(default_factory=dict)
+    avg_booking_score: float | None = None
+    spa_share: float | None = None
+    camps: int = 0
+    camp_ages: tuple[float, float] | None = None
+    credits: Credits | None = None
+
+    def to_dict(self) -> dict[str, Any]:
+        """Return the row with the Hebrew field names the tools use."""
+        row: dict[str, Any] = {
+            "אתר": self.name,
+            "מדינה": self.country,
+            "מלונות": self.hotels,
+            "כוכבים": self.stars,
+            "ציון_בוקינג_ממוצע": self.avg_booking_score,
+            "אחוז_מלונות_עם_ספא": (
+                round(100 * self.spa_share) if self.spa_share is not None else None
+            ),
+            "קייטנות": self.camps,
+        }
+        if self.camp_ages:
+            row["גילאי_קייטנות"] = f"{self.camp_ages[0]:g}-{self.camp_ages[1]:g}"
+        if self.credits:
+            row["זיכויים_ביורו"] = {
+                "טיסות_הלוך_ושוב": self.credits.flight_round_trip,
+                "טיסה_לכיוון": self.credits.flight_one_way,
+                "סקיפס": self.credits.ski_pass,
+                "נסיעות": self.credits.transfers,
+                "הרחבת_סקיפס": self.credits.ski_pass_extension,
+            }
+        return row
+
+
+class ResortComparison:
+    """Per-resort aggregates of the catalog, keyed by canonical resort."""
+
+    def __init__(self, catalog: Catalog, aliases: ResortAliases) -> None:
+        """Aggregate the hotels, camps and resort info of ``catalog``."""
+        self.aliases = aliases
+        self.rows: dict[str, ResortSummary] = {
+            key: ResortSummary(name=entry.name, country=entry.country)
+            for key, entry in aliases.resorts.items()
+        }
+        scores: dict[str, list[float]] = {}
+        spas: dict[str, int] = {}
+        for hotel in catalog["hotels"]:
+            row = self._row(hotel.get("אתר", ""))
+            if row is None:
+                continue
+            dry_data = hotel.get("נתונים יבשים", {})
+            row.hotels += 1
+            stars = _stars(dry_data.get("כוכבים"))
+            row.stars[stars] = row.stars.get(stars, 0) + 1
+            score = dry_data.get("ציון בוקינג")
+            if isinstance(score, (int, float)) and score > 0:
+                scores.setdefault(row.name, []).append(score)
+            if hotel.get("ספא", {}).get("עלות כניסה לספא", "") not in _NO_SPA:
+                spas[row.name] = spas.get(row.name, 0) + 1
+        for row in self.rows.values():
+            if row.hotels:
+                row.spa_share = spas.get(row.name, 0) / row.hotels
+            if row.name in scores:
+                row.avg_booking_score = round(sum(scores[row.name]) / len(scores[row.name]), 1)
+        for camp in catalog["camps"]:
+            row = self._row(camp.get("אתר", ""))
+            if row is None:
+                continue
+            row.camps += 1
+            ages = camp.get("גילאים") or {}
+            low, high = ages.get("מינימום"), ages.get("מקסימום")
+            if isinstance(low, (int, float)) and isinstance(high, (int, float)):
+                if row.camp_ages:
+                    low, high = min(low, row.camp_ages[0]), max(high, row.camp_ages[1])
+                row.camp_ages = (low, high)
+        for record in catalog["resort_info"]:
+            text = record.get("זיכויים", {}).get("סוגי זיכויים בחופשה")
+            row = self._row(record.get("אתר", ""))
+            if row is not None and text:
+                row.credits = parse_credits(text)
+
+    def _row(self, resort: str) -> ResortSummary | None:
+        entry = self.aliases.resolve(resort)
+        return self.rows.get(resort_key(entry.name)) if entry else None
+
+    def compare(
+        self, resorts: Iterable[str] | None = None, country: str | None = None
+    ) -> tuple[list[ResortSummary], list[str]]:
+        """Rows for the named resorts and/or a country, and unknown names."""
+        rows: list[ResortSummary] = []
+        missing: list[str] = []
+        for name in resorts or ():
+            row = self._row(name)
+            if row is None:
+                missing.append(name)
+            elif row not in rows:
+                rows.append(row)
+        if country:
+            wanted = _country_key(country)
+            rows += [
+                row
+                for row in self.rows.values()
+                if _country_key(row.country) == wanted and row not in rows
+            ]
+        elif not resorts:
+            rows = list(self.rows.values())
+        return rows, missing
+
+
+_comparison: ResortComparison | None = None
+_comparison_lock = threading.Lock()
+
+
+def get_resort_comparison() -> ResortComparison:
+    """Get the resort comparison table of the catalog (built on first use)."""
+    global _comparison
+    if _comparison is None:
+        with _comparison_lock:
+            if _comparison is None:
+                _comparison = ResortComparison(get_catalog(), get_resort_aliases())
+    return _comparison
@@ -0,0 +1,156 @@
+"""SkiDeal Bot - Boolean hotel facets.
+
+Many hotel fields are free-text answers from the sales sheets ("יש. ניתן
+לבקש מראש", "אין", "בחלק מהחדרים - לא להתחייב", "27 יורו ליום"). The
+normalizer here maps them to yes / no / unknown facets once, when the
+catalog is loaded, and stores them per hotel as two bitsets (one bit per
+facet for "yes", one for "no"). Filtering hotels by several facets is then a
+couple of integer operations per hotel instead of the model reading every
+hotel's details.
+
+Answers that hedge (on request, only some rooms, can't promise) or conflict
+count as unknown: a filter only matches hotels that definitely have the
+feature.
+"""
+
+import re
+from dataclasses import dataclass
+from typing import Any, Iterable, Literal
+
+FacetValue = Literal["yes", "no", "unknown"]
+
+_NO_WORDS = {"אין", "ללא", "אן", "לא"}
+_YES_WORDS = {"יש", "כן", "בכולם", "בכל"}
+_UNKNOWN_VALUES = {"", "חסר מידע", "אין נתונים", "אין מידע"}
+# Hedged answers: only on request, only some rooms, no commitment. "RQ" may
+# follow a Hebrew prefix letter ("בRQ") but not sit inside a Latin word
+_HEDGES = re.compile(r"בחלק|רקווסט|ריקווסט|(?<![a-z])rq(?![a-z])|תלוי|להבטיח|להתחייב")
+_FIRST_WORD = re.compile(r"\w+")
+
+
+@dataclass(frozen=True)
+class Facet:
+    """A yes/no hotel feature read from a free-text field."""
+
+    name: str
+    label: str
+    section: str
+    field: str
+    # Whether an answer that is neither yes nor no (e.g. a price or a list of
+    # appliances) means the feature exists
+    other_means_yes: bool = False
+
+
+FACETS = (
+    Facet("separate_beds", "מיטות נפרדות", "חדרים", "מיטות נפרדות"),
+    Facet("connecting_rooms", "חדרים עם דלת מקשרת", "חדרים", "חדרים עם דלת מקשרת"),
+    Facet("balcony", "מרפסת", "חדרים", "האם יש מרפסת בחדרים"),
+    Facet("kitchen", "מטבח", "חדרים", "תכולת מטבח", other_means_yes=True),
+    Facet("ski_room", "סקי רום", "שירותי מלון", "סקי רום"),
+    Facet("shuttle", "שאטל מהמלון", "שירותי מלון", "שאטלים מהמלון", other_means_yes=True),
+    Facet("parking", "חניה", "שירותי מלון", "חניה", other_means_yes=True),
+)
+FACET_NAMES = tuple(f.name for f in FACETS)
+_BITS = {f.name: 1 << i for i, f in enumerate(FACETS)}
+
+
+def classify(text: Any, *, other_means_yes: bool = False) -> FacetValue:
+    """Map a free-text answer to yes, no or unknown."""
+    if not isinstance(text, str):
+        return "unknown"
+    text = text.strip().lower()
+    if text in _UNKNOWN_VALUES or _HEDGES.search(text):
+        return "unknown"
+    answers: set[FacetValue] = set()
+    for line in text.splitlines():
+        first = _FIRST_WORD.search(line)
+        if first is None:
+            continue
+        if first.group() in _NO_WORDS:
+            answers.add("no")
+        elif first.group() in _YES_WORDS:
+            answers.add("yes")
+        else:
+            answers.add("yes" if other_means_yes else "unknown")
+    # One answer per line must agree ("יש\nאין" is not an answer)
+    return answers.pop() if len(answers) == 1 else "unknown"
+
+
+def hotel_facets(hotel: dict[str, Any]) -> dict[str, FacetValue]:
+    """Facet values of one hotel record."""
+    return {
+        f.name: classify(
+            hotel.get(f.section, {}).get(f.field), other_means_yes=f.other_means_yes
+        )
+        for f in FACETS
+    }
+
+
+def facet_mask(names: Iterable[str]) -> int:
+    """Bitmask of the named facets (unknown names raise `ValueError`)."""
+    mask = 0
+    for name in names:
+        if name not in _BITS:
+            raise ValueError(f"Unknown facet {name!r}, expected one of {FACET_NAMES}")
+        mask |= _BITS[name]
+    return mask
+
+
+class FacetIndex:
+    """Per-hotel facet bitsets, keyed by English hotel name and resort."""
+
+    def __init__(self, hotels: Iterable[dict[str, Any]] = ()) -> None:
+        """Index the facets of ``hotels``."""
+        self.yes: dict[tuple[str, str], int] = {}
+        self.no: dict[tuple[str, str], int] = {}
+        for hotel in hotels:
+            self.yes[self.key(hotel)], self.no[self.key(hotel)] = self.bits(hotel)
+
+    @classmethod
+    def from_bitsets(
+        cls, entries: Iterable[tuple[tuple[str, str, str], int, int]]
+    ) -> "FacetIndex":
+        """Index from precomputed ``((country, resort, name), yes, no)`` bitsets."""
+        index = cls()
+        for (_, resort, name), yes, no in entries:
+            index.yes[name.lower(), resort], index.no[name.lower(), resort] = yes, no
+        return index
+
+    @staticmethod
+    def key(hotel: dict[str, Any]) -> tuple[str, str]:
+        """Index key of a hotel record."""
+        # English names repeat across resorts (e.g. two "Cristallo" hotels)
+        return hotel.get("שם מלון באנגלית", "").lower(), hotel.get("אתר", "")
+
+    @staticmethod
+    def bits(hotel: dict[str, Any]) -> tuple[int, int]:
+        """Compute the "yes" and "no" bitsets of a hotel record."""
+        yes = no = 0
+        for facet, value in hotel_facets(hotel).items():
+            if value == "yes":
+                yes |= _BITS[facet]
+            elif value == "no":
+                no |= _BITS[facet]
+        return yes, no
+
+    def has_all(self, hotel: dict[str, Any], mask: int) -> bool:
+        """Whether the hotel definitely has every facet in ``mask``."""
+        return self.matches(self.key(hotel), mask)
+
+    def matches(self, key: tuple[str, str], mask: int) -> bool:
+        """`has_all` by index key, without the hotel record."""
+        return self.yes.get(key, 0) & mask == mask
+
+    def counts(
+        self, hotels: Iterable[dict[str, Any]] | None = None
+    ) -> dict[str, dict[str, int]]:
+        """How many hotels (all, or the given ones) have, lack or don't say, per facet."""
+        keys = self.yes.keys() if hotels is None else [self.key(h) for h in hotels]
+        rows = [(self.yes.get(k, 0), self.no.get(k, 0)) for k in keys]
+        counts = {}
+        for facet in FACETS:
+            bit = _BITS[facet.name]
+            yes = sum(1 for y, _ in rows if y & bit)
+            no = sum(1 for _, n in rows if n & bit)
+            counts[facet.name] = {"yes": yes, "no": no, "unknown": len(rows) - yes - no}
+        return counts
@@ -0,0 +1,150 @@
+"""SkiDeal Bot - Hotel coordinates, lift distances and a spatial index.
+
+The hotel sheets hold Google Maps links for the hotel (``מיקום בגוגל``) and,
+for some hotels, the main lift (``מיקום רכבל מרכזי``). The pinned place is
+in the ``!3d<lat>!4d<lon>`` segment of the link (the ``@lat,lon`` part is
+only the map view, used as a fallback).
+
+At ingest every hotel gets its coordinates and the straight-line
+(great-circle) distance in meters to the nearest main lift known in its
+resort, since most hotels don't repeat the resort's lift link. Distances
+over `MAX_LIFT_DISTANCE_M` are treated as data errors (a lift link from
+another resort) and left unknown. `GeoIndex` keeps a grid per resort, so
+"hotels near X" only looks at the cells around X.
+"""
+
+from __future__ import annotations
+
+import math
+import re
+from collections import defaultdict
+from typing import Any, Iterable, Sequence
+
+Point = tuple[float, float]
+HotelKey = tuple[str, str]
+
+_PLACE = re.compile(r"!3d(-?\d+(?:\.\d+)?)!4d(-?\d+(?:\.\d+)?)")
+_VIEW = re.compile(r"@(-?\d+(?:\.\d+)?),(-?\d+(?:\.\d+)?)")
+
+EARTH_RADIUS_M = 6_371_000
+# Further than this from every lift of its resort, a hotel pin or lift link
+# is wrong (copied from another hotel or resort)
+MAX_LIFT_DISTANCE_M = 5_000
+GRID_CELL_M = 500
+NEAR_RADIUS_M = 2_000
+
+
+def parse_maps_coordinates(url: Any) -> Point | None:
+    """Latitude and longitude of the place in a Google Maps link."""
+    if not isinstance(url, str):
+        return None
+    match = _PLACE.search(url) or _VIEW.search(url)
+    if match is None:
+        return None
+    lat, lon = float(match.group(1)), float(match.group(2))
+    if not (-90 <= lat <= 90 and -180 <= lon <= 180):
+        return None
+    return lat, lon
+
+
+def distance_m(a: Point, b: Point) -> float:
+    """Great-circle (haversine) distance in meters."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (*a, *b))
+    h = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(h))
+
+
+def geo_columns(hotels: Sequence[dict[str, Any]]) -> list[list[float] | None]:
+    """Per hotel ``[lat, lon, lift_m]`` (``lift_m`` -1 when unknown), or None."""
+    points = [parse_maps_coordinates(h.get("מיקום", {}).get("מיקום בגוגל")) for h in hotels]
+    lifts: dict[str, set[Point]] = defaultdict(set)
+    for hotel in hotels:
+        lift = parse_maps_coordinates(hotel.get("מיקום", {}).get("מיקום רכבל מרכזי"))
+        if lift is not None:
+            lifts[hotel.get("אתר", "")].add(lift)
+    columns: list[list[float] | None] = []
+    for hotel, point in zip(hotels, points):
+        if point is None:
+            columns.append(None)
+            continue
+        distances = [distance_m(point, lift) for lift in lifts.get(hotel.get("אתר", ""), ())]
+        nearest = min(distances, default=-1.0)
+        if nearest > MAX_LIFT_DISTANCE_M:
+            nearest = -1.0
+        columns.append([point[0], point[1], round(nearest)])
+    return columns
+
+
+class SpatialGrid:
+    """Points bucketed into square cells of about ``cell_m`` meters."""
+
+    def __init__(self, cell_m: float = GRID_CELL_M) -> None:
+        """Create an empty grid with cells of about ``cell_m`` meters."""
+        self.cell_m = cell_m
+        self.cells: dict[tuple[int, int], list[tuple[HotelKey, Point]]] = defaultdict(list)
+        self._lat_step = math.degrees(cell_m / EARTH_RADIUS_M)
+        self._lon_step: float | None = None
+
+    def _cell(self, point: Point) -> tuple[int, int]:
+        if self._lon_step is None:
+            # One resort spans a few km, so one longitude scale fits the grid
+            self._lon_step = self._lat_step / max(math.cos(math.radians(point[0])), 0.01)
+        return math.floor(point[0] / self._lat_step), math.floor(point[1] / self._lon_step)
+
+    def add(self, key: HotelKey, point: Point) -> None:
+        """Add a point."""
+        self.cells[self._cell(point)].append((key, point))
+
+    def near(self, point: Point, radius_m: float) -> list[tuple[HotelKey, float]]:
+        """Keys within ``radius_m`` of ``point``, nearest first."""
+        row, col = self._cell(point)
+        reach = math.ceil(radius_m / self.cell_m)
+        found = []
+        for r in range(row - reach, row + reach + 1):
+            for c in range(col - reach, col + reach + 1):
+                for key, other in self.cells.get((r, c), ()):
+                    distance = distance_m(point, other)
+                    if distance <= radius_m:
+                        found.append((key, distance))
+        return sorted(found, key=lambda item: item[1])
+
+
+class GeoIndex:
+    """Hotel coordinates and lift distances, with a grid per resort."""
+
+    def __init__(self) -> None:
+        """Create an empty index (see `from_columns`)."""
+        self.points: dict[HotelKey, Point] = {}
+        self.lift_m: dict[HotelKey, int] = {}
+        self.grids: dict[str, SpatialGrid] = {}
+
+    @classmethod
+    def from_columns(
+        cls, keys: Iterable[tuple[str, str, str]], columns: Iterable[list[float] | None]
+    ) -> GeoIndex:
+        """Index from catalog keys and `geo_columns` rows."""
+        index = cls()
+        for (_, resort, name), column in zip(keys, columns):
+            if column is None:
+                continue
+            key = (name.lower(), resort)
+            lat, lon, lift = column
+            index.points[key] = (lat, lon)
+            if lift >= 0:
+                index.lift_m[key] = int(lift)
+            index.grids.setdefault(resort, SpatialGrid()).add(key, (lat, lon))
+        return index
+
+    def distance_to_lift(self, key: HotelKey) -> int | None:
+        """Meters from the hotel to the nearest main lift, if known."""
+        return self.lift_m.get(key)
+
+    def near(
+        self, resort: str, point: Point, radius_m: float = NEAR_RADIUS_M
+    ) -> list[tuple[HotelKey, float]]:
+        """Hotels of ``resort`` within ``radius_m`` of ``point``, nearest first."""
+        grid = self.grids.get(resort)
+        return grid.near(point, radius_m) if grid else []
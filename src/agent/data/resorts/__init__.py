@@ -6,14 +6,18 @@ Data sourced from SkiDeal internal sheets.
 
 import json
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterable
+
+from agent.data.catalog import CatalogRecords, get_catalog
+from agent.data.facets import facet_mask
+from agent.data.geo import NEAR_RADIUS_M, Point, distance_m
 
 # Path to the JSONL data file (in the same directory as this file)
 DATA_FILE = Path(__file__).parent / "super_info_bot_rows.jsonl"
 
 
 def load_all_data() -> list[dict[str, Any]]:
-    """Load all records from the JSONL file."""
+    """Load all records from the JSONL file (parsed on every call)."""
     records = []
     with open(DATA_FILE, "r", encoding="utf-8") as f:
         for line in f:
@@ -23,109 +27,106 @@ def load_all_data() -> list[dict[str, Any]]:
     return records
 
 
-def get_hotels() -> list[dict[str, Any]]:
+def get_hotels() -> CatalogRecords:
     """Get all hotel records from the data.
     
-    Returns hotels with record_type 'hotel_or_item' that have hotel details.
+    Returns hotels with record_type 'hotel_or_item' that have hotel details,
+    as a read-only view of the shared catalog (see `agent.data.catalog`).
     """
-    all_data = load_all_data()
-    hotels = []
-    
-    for record in all_data:
-        meta = record.get("_meta", {})
-        record_type = meta.get("record_type", "")
-        hotel_name = record.get("שם מלון באנגלית", "")
-        
-        # Skip section records (כללי, הערות כלליות, etc.)
-        if hotel_name in ["כללי", "הערות כלליות", "הערות כלליות על האתר"]:
-            continue
-            
-        # Only include records that have hotel details (נתונים יבשים)
-        if "נתונים יבשים" in record:
-            hotels.append(record)
-    
-    return hotels
+    return get_catalog()["hotels"]
 
 
-def get_resorts_info() -> list[dict[str, Any]]:
+def get_resorts_info() -> CatalogRecords:
     """Get resort-level information (sections with general info).
     
     Returns section records that contain general resort info, 
     camp info (קייטנות), and credit info (זיכויים).
     """
-    all_data = load_all_data()
-    resorts = []
-    
-    for record in all_data:
-        hotel_name = record.get("שם מלון באנגלית", "")
-        
-        # Include section records (כללי, הערות כלליות, etc.)
-        if hotel_name in ["כללי", "הערות כלליות", "הערות כלליות על האתר"]:
-            resorts.append(record)
-    
-    return resorts
+    return get_catalog()["resort_info"]
+
+
+def get_hotel_names() -> list[str]:
+    """Get the English names of all hotels (without decoding the records)."""
+    return [name for _, _, name in get_hotels().keys]
 
 
 def get_countries() -> list[str]:
     """Get list of all unique countries."""
-    hotels = get_hotels()
-    countries = set()
-    for hotel in hotels:
-        country = hotel.get("מדינה", "")
-        if country:
-            countries.add(country)
-    return sorted(list(countries))
+    return sorted({country for country, _, _ in get_hotels().keys if country})
 
 
 def get_resorts_by_country(country: str) -> list[str]:
     """Get list of resorts for a specific country."""
-    hotels = get_hotels()
-    resorts = set()
-    for hotel in hotels:
-        if hotel.get("מדינה", "").lower() == country.lower():
-            resort = hotel.get("אתר", "")
-            if resort:
-                resorts.add(resort)
-    return sorted(list(resorts))
+    return sorted(
+        {
+            resort
+            for c, resort, _ in get_hotels().keys
+            if resort and c.lower() == country.lower()
+        }
+    )
 
 
 def get_hotels_by_resort(resort: str) -> list[dict[str, Any]]:
     """Get all hotels in a specific resort."""
-    hotels = get_hotels()
-    return [h for h in hotels if h.get("אתר", "").lower() == resort.lower()]
+    return get_hotels().where(resort=resort)
 
 
 def get_hotels_by_country(country: str) -> list[dict[str, Any]]:
     """Get all hotels in a specific country."""
-    hotels = get_hotels()
-    return [h for h in hotels if h.get("מדינה", "").lower() == country.lower()]
+    return get_hotels().where(country=country)
 
 
 def get_hotel_by_name(hotel_name: str) -> dict[str, Any] | None:
     """Get a specific hotel by its English name."""
-    hotels = get_hotels()
-    for hotel in hotels:
-        if hotel.get("שם מלון באנגלית", "").lower() == hotel_name.lower():
-            return hotel
-    return None
+    hotels = get_hotels().where(name=hotel_name)
+    return hotels[0] if hotels else None
 
 
 def get_resort_info(country: str, resort: str) -> dict[str, Any] | None:
     """Get resort-level info including camps and credits."""
-    resorts = get_resorts_info()
-    for r in resorts:
-        if (r.get("מדינה", "").lower() == country.lower() and 
-            r.get("אתר", "").lower() == resort.lower()):
-            return r
+    resorts = get_resorts_info().where(country=country, resort=resort)
+    return resorts[0] if resorts else None
+
+
+def get_hotel_location(
+    hotel_name: str, resort: str | None = None
+) -> tuple[str, Point] | None:
+    """Get the resort and coordinates of a hotel by its English name."""
+    geo = get_catalog().geo
+    for _, hotel_resort, name in get_hotels().keys:
+        if name.lower() != hotel_name.lower():
+            continue
+        if resort and hotel_resort.lower() != resort.lower():
+            continue
+        point = geo.points.get((name.lower(), hotel_resort))
+        if point is not None:
+            return hotel_resort, point
     return None
 
 
+def get_distance_to_lift(hotel: dict[str, Any]) -> int | None:
+    """Meters from a hotel to the nearest main lift of its resort, if known."""
+    key = (hotel.get("שם מלון באנגלית", "").lower(), hotel.get("אתר", ""))
+    return get_catalog().geo.distance_to_lift(key)
+
+
+def get_distance_between(hotel: dict[str, Any], point: Point) -> int | None:
+    """Meters from a hotel to a point, if the hotel's location is known."""
+    key = (hotel.get("שם מלון באנגלית", "").lower(), hotel.get("אתר", ""))
+    location = get_catalog().geo.points.get(key)
+    return round(distance_m(location, point)) if location else None
+
+
 def search_hotels(
     country: str | None = None,
     resort: str | None = None,
     min_stars: int | None = None,
     has_spa: bool | None = None,
     suitable_for: str | None = None,
+    facets: Iterable[str] | None = None,
+    max_distance_to_lift_m: float | None = None,
+    near_hotel: str | None = None,
+    radius_m: float = NEAR_RADIUS_M,
 ) -> list[dict[str, Any]]:
     """Search hotels by various criteria.
     
@@ -135,22 +136,63 @@ def search_hotels(
         min_stars: Minimum star rating (3, 4, or 5)
         has_spa: True to filter for hotels with spa
         suitable_for: Filter by target audience (e.g., "זוגות", "משפחה")
+        facets: Facet names the hotel must definitely have
+            (e.g., ["connecting_rooms", "kitchen"], see `agent.data.facets`)
+        max_distance_to_lift_m: Only hotels with a known distance to the
+            main lift of at most this many meters, nearest first
+        near_hotel: Only other hotels within ``radius_m`` of this hotel
+            (English name), nearest first
+        radius_m: Search radius around ``near_hotel``
     
     Returns:
         List of matching hotels.
     """
     hotels = get_hotels()
+    catalog = get_catalog()
+    facet_index = catalog.facets
     results = []
+    required = facet_mask(facets or ())
+    
+    # Distance to the anchor hotel of the candidates around it (spatial grid)
+    nearby: dict[tuple[str, str], float] | None = None
+    if near_hotel:
+        location = get_hotel_location(near_hotel, resort)
+        if location is None:
+            return []
+        anchor_resort, point = location
+        nearby = {
+            key: distance
+            for key, distance in catalog.geo.near(anchor_resort, point, radius_m)
+            if key[0] != near_hotel.lower()
+        }
     
-    for hotel in hotels:
+    # Country, resort, facet and distance filters only need the catalog keys
+    # and columns, so only the remaining candidates are decoded
+    for index, (hotel_country, hotel_resort, name) in enumerate(hotels.keys):
+        key = (name.lower(), hotel_resort)
+        
         # Country filter
-        if country and hotel.get("מדינה", "").lower() != country.lower():
+        if country and hotel_country.lower() != country.lower():
             continue
             
         # Resort filter
-        if resort and hotel.get("אתר", "").lower() != resort.lower():
+        if resort and hotel_resort.lower() != resort.lower():
+            continue
+        
+        # Facet filter (precomputed bitsets)
+        if required and not facet_index.matches(key, required):
             continue
         
+        # Distance filters (precomputed at ingest)
+        if nearby is not None and key not in nearby:
+            continue
+        if max_distance_to_lift_m is not None:
+            lift_m = catalog.geo.distance_to_lift(key)
+            if lift_m is None or lift_m > max_distance_to_lift_m:
+                continue
+        
+        hotel = hotels[index]
+        
         # Star rating filter
         if min_stars:
             dry_data = hotel.get("נתונים יבשים", {})
@@ -178,6 +220,10 @@ def search_hotels(
         
         results.append(hotel)
     
+    if nearby is not None:
+        results.sort(key=lambda h: nearby[(h["שם מלון באנגלית"].lower(), h["אתר"])])
+    elif max_distance_to_lift_m is not None:
+        results.sort(key=lambda h: get_distance_to_lift(h) or 0)
     return results
 
 
@@ -204,3 +250,8 @@ HOTELS_DATA = get_hotels()
 RESORTS_INFO = get_resorts_info()
 DATA_SUMMARY = get_data_summary()
 
+
+def get_facet_counts(hotels: Iterable[dict[str, Any]] | None = None) -> dict[str, dict[str, int]]:
+    """Get how many hotels (all, or the given ones) have, lack or don't state each facet."""
+    return get_catalog().facets.counts(hotels)
+
@@ -0,0 +1,170 @@
+"""SkiDeal Bot - Offline fakes for tests, benchmarks and load tests.
+
+`FakeChatModel` stands in for `ChatAnthropic` in the agent graph: it accepts
+bound tools, answers from a script or a responder function, and can simulate
+model latency without touching the network. `StubPricingServer` serves the
+pricing API of `agent.pricing` on localhost with deterministic quotes.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Sequence
+from urllib.parse import parse_qsl, urlparse
+
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.runnables import Runnable
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import PrivateAttr
+
+Responder = Callable[[Sequence[BaseMessage]], AIMessage]
+
+
+def echo_responder(messages: Sequence[BaseMessage]) -> AIMessage:
+    """Reply with the text of the last customer message."""
+    last_human = next(
+        (m for m in reversed(messages) if isinstance(m, HumanMessage)), None
+    )
+    return AIMessage(content=f"קיבלתי: {last_human.text if last_human else ''}")
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model returning scripted replies with optional simulated latency.
+
+    Replies come from ``responses`` in order (cycling when exhausted) or, when
+    no responses are given, from ``responder`` called with the model input.
+    ``latency`` is either a fixed number of seconds or a callable returning
+    one per call, e.g. ``lambda: random.lognormvariate(0, 0.5)``.
+    """
+
+    responses: list[AIMessage] = []
+    responder: Responder = echo_responder
+    latency: float | Callable[[], float] = 0.0
+
+    _index: int = PrivateAttr(default=0)
+
+    @property
+    def _llm_type(self) -> str:
+        return "skideal-fake"
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> Runnable[Any, Any]:
+        """Bind tool schemas like a real model; scripts name tools directly.
+
+        The schemas only show up in the invocation params (and so in callbacks
+        and token estimates); replies are not affected.
+        """
+        return self.bind(tools=[convert_to_openai_tool(t) for t in tools], **kwargs)
+
+    def _delay(self) -> float:
+        return self.latency() if callable(self.latency) else self.latency
+
+    def _reply(self, messages: Sequence[BaseMessage]) -> ChatResult:
+        if self.responses:
+            cycle, index = divmod(self._index, len(self.responses))
+            message = self.responses[index]
+            self._index += 1
+            if cycle and message.tool_calls:
+                # Tool call ids are unique per conversation, like a real model's
+                calls = [{**c, "id": f"{c['id']}-{cycle}"} for c in message.tool_calls]
+                message = message.model_copy(update={"tool_calls": calls})
+        else:
+            message = self.responder(messages)
+        return ChatResult(generations=[ChatGeneration(message=message.model_copy())])
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        delay = self._delay()
+        if delay:
+            time.sleep(delay)
+        return self._reply(messages)
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        delay = self._delay()
+        if delay:
+            await asyncio.sleep(delay)
+        return self._reply(messages)
+
+
+class StubPricingServer:
+    """Local pricing API answering ``GET /quote`` with deterministic quotes.
+
+    The nightly price per person is derived from the hotel name, children pay
+    half. Hotels in ``sold_out`` are unavailable. ``latency`` delays every
+    answer, and ``requests`` records the query parameters of each request.
+    """
+
+    def __init__(self, *, latency: float = 0.0, sold_out: Sequence[str] = ()) -> None:
+        """Start serving on a free local port (see ``url``)."""
+        self.latency = latency
+        self.sold_out = {name.lower() for name in sold_out}
+        self.requests: list[dict[str, str]] = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self) -> None:
+                url = urlparse(self.path)
+                params = dict(parse_qsl(url.query))
+                stub.requests.append(params)
+                if stub.latency:
+                    time.sleep(stub.latency)
+                if url.path != "/quote":
+                    self.send_error(404)
+                    return
+                body = json.dumps(stub.quote(params), ensure_ascii=False).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def quote(self, params: dict[str, str]) -> dict[str, Any]:
+        """Answer the quote for the query ``params``."""
+        hotel = params.get("hotel", "")
+        if hotel.lower() in self.sold_out:
+            return {"available": False}
+        check_in, check_out = (date.fromisoformat(params[k]) for k in ("check_in", "check_out"))
+        nights = (check_out - check_in).days
+        per_night = 80 + int(hashlib.sha256(hotel.lower().encode()).hexdigest(), 16) % 160
+        people = int(params.get("adults", 1)) + 0.5 * int(params.get("children", 0))
+        return {
+            "available": True,
+            "total": round(per_night * nights * people),
+            "currency": "EUR",
+            "board": "חצי פנסיון",
+            "room": "חדר זוגי",
+        }
+
+    def close(self) -> None:
+        """Stop the server."""
+        self.server.shutdown()
+        self.server.server_close()
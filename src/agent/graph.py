@@ -6,12 +6,63 @@ Uses Claude Sonnet 4.5 and LangGraph.
 
 from __future__ import annotations
 
+import functools
+import os
+from typing import Any, Callable
+
 from dotenv import load_dotenv
 from langchain_anthropic import ChatAnthropic
-from langgraph.prebuilt import create_react_agent
+from langchain_core.language_models import BaseChatModel, LanguageModelInput
+from langchain_core.messages import BaseMessage, SystemMessage
+from langchain_core.runnables import Runnable
+from langgraph.graph.state import CompiledStateGraph
+from langgraph.prebuilt import ToolNode, create_react_agent
+from langgraph.prebuilt.tool_node import ToolCallRequest
+from langgraph.runtime import Runtime
+from langgraph.types import Checkpointer
+
+# Import admission control
+from agent.admission import AdmissionController, AdmittedModel, get_admission_controller
+
+# Import record/replay cassettes
+from agent.cassette import cassette_from_env
 
 # Import system prompt
-from agent.prompt import SYSTEM_PROMPT
+from agent.prompt import CORE_PROMPT, stage_prompt
+
+# Import latency policy
+from agent.latency import (
+    DEFAULT_FALLBACK_MODEL,
+    LatencyGuard,
+    LatencyPolicy,
+    ResilientModel,
+    track_turn,
+)
+
+# Import tool instrumentation
+from agent.metrics import ToolInstrumentation, get_tool_instrumentation
+
+# Import usage accounting
+from agent.usage import TimedModel
+
+# Import per-turn profiling
+from agent.profiling import instrument_checkpointer
+
+# Import the tool-loop guard and the tool result memo
+from agent.loop_guard import LoopGuard
+from agent.tool_memo import ToolMemo, collapse_duplicate_results
+
+# Import lead state
+from agent.lead_state import (
+    SkiDealState,
+    lead_completion,
+    merge_lead,
+    render_lead_block,
+    update_lead_state,
+)
+
+# Import conversation stages
+from agent.stages import STAGE_TOOLS, detect_stage
 
 # Import tools
 from agent.tools import (
@@ -19,10 +70,13 @@ from agent.tools import (
     get_hotels_list,
     get_hotel_info,
     search_hotels_by_criteria,
+    search_knowledge,
+    compare_resorts,
     get_resort_camps_info,
     get_camp_resorts,
     get_camps_info,
     get_kosher_info,
+    get_live_quote,
     handoff_to_agent,
 )
 
@@ -40,19 +94,149 @@ tools = [
     get_hotels_list,
     get_hotel_info,
     search_hotels_by_criteria,
+    search_knowledge,
+    compare_resorts,
     get_resort_camps_info,
     get_camp_resorts,
     get_camps_info,
     get_kosher_info,
+    get_live_quote,
     handoff_to_agent,
 ]
 
-# Create the model
-model = ChatAnthropic(model="claude-sonnet-4-20250514")
+# Create the model (recorded to / replayed from cassettes when configured)
+model = cassette_from_env(ChatAnthropic(model="claude-sonnet-4-20250514"))
 
-# Create the agent using LangGraph's create_react_agent
-graph = create_react_agent(
-    model=model,
-    tools=tools,
-    prompt=SYSTEM_PROMPT,
+# Faster tier used when the primary model times out or is overloaded
+fallback_model = cassette_from_env(
+    ChatAnthropic(model=os.environ.get("SKIDEAL_FALLBACK_MODEL", DEFAULT_FALLBACK_MODEL))
 )
+
+
+def build_prompt(state: SkiDealState) -> list[BaseMessage]:
+    """Build the model input: cached core prompt + stage modules + lead status + history.
+
+    The core prompt is byte-identical between calls and marked for prompt
+    caching; the stage modules and the lead block follow as separate blocks.
+    """
+    system = SystemMessage(
+        content=[
+            {"type": "text", "text": CORE_PROMPT, "cache_control": {"type": "ephemeral"}},
+            {"type": "text", "text": stage_prompt(state.get("stage"))},
+            {"type": "text", "text": render_lead_block(state.get("lead"))},
+        ]
+    )
+    return [system, *state["messages"]]
+
+
+def prepare_model_input(state: SkiDealState) -> dict[str, Any]:
+    """Pre-model hook: update the lead, trim and dedupe history, track the turn and its stage."""
+    update = update_lead_state(state)
+    update["llm_input_messages"] = collapse_duplicate_results(update["llm_input_messages"])
+    lead = merge_lead(state.get("lead"), update["lead"])
+    return {**update, **track_turn(state), "stage": detect_stage(state["messages"], lead)}
+
+
+def tools_for_stage(stage: str | None) -> list[Any]:
+    """Tools to bind for a conversation stage (all tools for an unknown stage)."""
+    names = STAGE_TOOLS.get(stage)  # type: ignore[call-overload]
+    if names is None:
+        return tools
+    return [t for t in tools if t.name in names]
+
+
+def make_graph(
+    chat_model: BaseChatModel | None = None,
+    *,
+    checkpointer: Checkpointer | None = None,
+    admission: AdmissionController | None = None,
+    fallback: BaseChatModel | None = None,
+    latency: LatencyGuard | None = None,
+    instrumentation: ToolInstrumentation | None = None,
+    loop_guard: LoopGuard | None = None,
+    tool_memo: ToolMemo | None = None,
+) -> CompiledStateGraph[Any, Any, Any, Any]:
+    """Create the agent graph.
+
+    Args:
+        chat_model: Model to use instead of the shared Anthropic model
+            (e.g. a fake model in tests and load tests).
+        checkpointer: Checkpointer for services that keep per-thread state
+            themselves (the LangGraph server provides its own).
+        admission: Admission controller for model calls; defaults to the
+            process-wide controller configured from the environment.
+        fallback: Model used when the primary times out or is overloaded;
+            defaults to the fallback Anthropic tier unless ``chat_model`` is given.
+        latency: Deadlines, hedging and circuit breaker for the primary model;
+            defaults to a policy configured from the environment.
+        instrumentation: Wrapper recording every tool call; defaults to the
+            process-wide tool metrics configured from the environment.
+        loop_guard: Per-turn limits of the tool loop; defaults to limits
+            configured from the environment.
+        tool_memo: Per-thread memo answering repeated tool calls with a
+            reference to the earlier result; defaults to a new memo.
+    """
+    # Bind each stage's tool subset once; the tool node runs every tool
+    stages = [*STAGE_TOOLS, None]
+    bound_models = {s: (chat_model or model).bind_tools(tools_for_stage(s)) for s in stages}
+    if fallback is None and chat_model is None:
+        fallback = fallback_model
+    bound_fallbacks = {
+        s: fallback.bind_tools(tools_for_stage(s)) if fallback is not None else None
+        for s in stages
+    }
+    admission = admission or get_admission_controller()
+    latency = latency or LatencyGuard(LatencyPolicy.from_env())
+    instrumentation = instrumentation or get_tool_instrumentation()
+    # Metrics outermost, so memo hits are recorded with their short payload
+    wrappers = [w for w in (instrumentation, tool_memo or ToolMemo()) if w is not None]
+
+    def wrap_tool_call(request: ToolCallRequest, execute: Callable[..., Any]) -> Any:
+        for wrapper in reversed(wrappers):
+            execute = functools.partial(wrapper.wrap, execute=execute)
+        return execute(request)
+
+    async def awrap_tool_call(request: ToolCallRequest, execute: Callable[..., Any]) -> Any:
+        for wrapper in reversed(wrappers):
+            execute = functools.partial(wrapper.awrap, execute=execute)
+        return await execute(request)
+
+    tool_node = ToolNode(tools, wrap_tool_call=wrap_tool_call, awrap_tool_call=awrap_tool_call)
+
+    def select_model(
+        state: SkiDealState, runtime: Runtime
+    ) -> Runnable[LanguageModelInput, BaseMessage]:
+        """Bind the stage's tools; add admission control, latency policy and timing."""
+        stage = state.get("stage")
+        if stage not in bound_models:
+            stage = None
+        primary: Runnable[LanguageModelInput, BaseMessage] = bound_models[stage]
+        fallback: Runnable[LanguageModelInput, BaseMessage] | None = bound_fallbacks[stage]
+        if admission is not None:
+            # Every upstream call - hedged duplicates and fallbacks included - is
+            # admitted on its own, queued by how close the lead is to handoff
+            priority = lead_completion(state.get("lead"))
+            primary = AdmittedModel(primary, admission, priority=priority)
+            if fallback is not None:
+                fallback = AdmittedModel(fallback, admission, priority=priority)
+        runnable = ResilientModel(
+            primary,
+            latency,
+            fallback=fallback,
+            deadline=latency.turn_deadline(state.get("turn_started_at")),
+        )
+        return TimedModel.for_state(runnable, state)
+
+    # Create the agent using LangGraph's create_react_agent
+    return create_react_agent(
+        model=select_model,
+        tools=tool_node,
+        prompt=build_prompt,
+        state_schema=SkiDealState,
+        pre_model_hook=prepare_model_input,
+        post_model_hook=loop_guard or LoopGuard(),
+        checkpointer=instrument_checkpointer(checkpointer),
+    )
+
+
+graph = make_graph()
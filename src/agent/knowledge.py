@@ -0,0 +1,282 @@
+"""SkiDeal Bot - Full-text search over the free-text catalog fields.
+
+Much of what the sales team knows lives in free text: agent notes on hotels
+(``חדרים.הערות חשובות``), room specs, spa contents, shuttle details and the
+resort-level section records (apres-ski, credits, lessons). `KnowledgeIndex`
+is an in-memory inverted index over those fields, one document per field,
+ranked with BM25.
+
+Hebrew tokenization normalizes final letters, geresh and gershayim (so
+``צ'ק`` and ``צק`` match), and strips the attached prefix letters
+(ו, ה, ב, ל, מ, ש, כ): ``ובמלון`` is indexed as ``ובמלון``, ``במלון`` and
+``מלון``. Query words also match longer indexed words they are a prefix of
+(``מקשר`` finds ``מקשרת``, ``דלת`` finds ``דלתות``), at a lower weight than
+exact matches; three-letter words only match two more letters, so ``אין``
+doesn't find ``אינטריור``.
+"""
+
+from __future__ import annotations
+
+import bisect
+import math
+import re
+import threading
+from dataclasses import dataclass
+from typing import Any, Iterable
+
+from agent.data.resorts import get_hotels, get_resorts_info
+
+# Free-text hotel fields worth searching: (section, field)
+HOTEL_FIELDS = (
+    ("חדרים", "הערות חשובות"),
+    ("חדרים", "מפרט חדרים"),
+    ("חדרים", "שם החדרים בעברית"),
+    ("ספא", "תכולת ספא"),
+    ("ספא", "שרותי ספא בתשלום"),
+    ("שירותי מלון", "שאטלים מהמלון"),
+    ("שירותי מלון", "מתקנים נוספים במלון"),
+    ("מיקום", "תיאור מיקום המלון"),
+    ("מיקום", "מסלול הליכה לרכבל"),
+    ("מיקום", "מסלול הליכה למרכז העיירה"),
+)
+# Records holding resort-level sections rather than a hotel
+SECTION_NAMES = {"כללי", "הערות כלליות", "הערות כלליות על האתר"}
+
+# Prefix letters that attach to Hebrew words (and, the, in, to, from, that, as)
+HEBREW_PREFIXES = frozenset("והבלמשכ")
+_FINALS = str.maketrans("ךםןףץ", "כמנפצ")
+_DROPPED = re.compile(r"[֑-ׇ'\"`׳״]")
+_WORD = re.compile(r"\w+")
+# Links in the notes (maps, spa pages) would index "https", "www", "com"...
+_URL = re.compile(r"https?://\S+|www\.\S+")
+# Query words that carry no meaning on their own
+STOPWORDS = frozenset(
+    "של את על עם גם או לא זה זו כי מה איפה איזה איזו אם הוא היא עד כל יותר "
+    "מלון מלונות".translate(_FINALS).split()
+)
+
+K1 = 1.5
+B = 0.75
+# Weights of a query word's variants: as typed, prefix letters stripped, and
+# indexed words it is a prefix of
+EXACT_WEIGHT = 1.0
+STRIPPED_WEIGHT = 0.8
+COMPLETION_WEIGHT = 0.5
+MAX_COMPLETIONS = 30
+# Shorter words only match inflections (e.g. ים, ות), not any longer word
+MIN_COMPLETION_PREFIX = 4
+SHORT_WORD_SUFFIX = 2
+SNIPPET_CHARS = 240
+
+
+def normalize(text: str) -> str:
+    """Lowercase, drop niqqud and quote marks, and map final letters."""
+    return _DROPPED.sub("", text).lower().translate(_FINALS)
+
+
+def word_variants(word: str) -> list[str]:
+    """Return the word and its forms without one or two prefix letters."""
+    variants = [word]
+    for _ in range(2):
+        if len(word) >= 4 and word[0] in HEBREW_PREFIXES:
+            word = word[1:]
+            variants.append(word)
+        else:
+            break
+    return variants
+
+
+def tokenize(text: str) -> list[str]:
+    """Split ``text`` into normalized words (single characters dropped)."""
+    return [w for w in _WORD.findall(normalize(text)) if len(w) > 1]
+
+
+def index_terms(text: str) -> list[str]:
+    """Terms to index for ``text``: every word with its prefix-stripped forms.
+
+    Links are skipped; they stay in the text (and so in snippets).
+    """
+    return [v for word in tokenize(_URL.sub(" ", text)) for v in word_variants(word)]
+
+
+@dataclass(frozen=True)
+class KnowledgeDoc:
+    """One searchable free-text field."""
+
+    country: str
+    resort: str
+    # English hotel name, or the section record name (e.g. "כללי")
+    hotel: str
+    field: str
+    text: str
+
+
+@dataclass
+class KnowledgeHit:
+    """A ranked search result."""
+
+    doc: KnowledgeDoc
+    score: float
+    snippet: str
+
+
+def catalog_documents(records: Iterable[dict[str, Any]]) -> list[KnowledgeDoc]:
+    """Documents for the free-text fields of hotel and section records."""
+    docs = []
+    for record in records:
+        name = record.get("שם מלון באנגלית", "")
+        base = {"country": record.get("מדינה", ""), "resort": record.get("אתר", "")}
+        if name in SECTION_NAMES:
+            fields = [
+                (section, field, value)
+                for section, values in record.items()
+                if section != "_meta" and isinstance(values, dict)
+                for field, value in values.items()
+            ]
+        elif "נתונים יבשים" in record:
+            fields = [
+                (section, field, record.get(section, {}).get(field))
+                for section, field in HOTEL_FIELDS
+            ]
+        else:
+            continue
+        for section, field, value in fields:
+            if isinstance(value, str) and value.strip() and value.strip() != "חסר מידע":
+                docs.append(
+                    KnowledgeDoc(
+                        hotel=name, field=f"{section} - {field}", text=value.strip(), **base
+                    )
+                )
+    return docs
+
+
+class KnowledgeIndex:
+    """Inverted index with BM25 ranking over `KnowledgeDoc` texts."""
+
+    def __init__(self, docs: Iterable[KnowledgeDoc]) -> None:
+        """Index the texts of ``docs``."""
+        self.docs = list(docs)
+        self.postings: dict[str, dict[int, int]] = {}
+        self.doc_lengths: list[int] = []
+        for doc_id, doc in enumerate(self.docs):
+            terms = index_terms(doc.text)
+            self.doc_lengths.append(len(terms))
+            for term in terms:
+                postings = self.postings.setdefault(term, {})
+                postings[doc_id] = postings.get(doc_id, 0) + 1
+        self.avg_length = sum(self.doc_lengths) / len(self.docs) if self.docs else 0.0
+        self.vocabulary = sorted(self.postings)
+
+    def idf(self, term: str) -> float:
+        """BM25 inverse document frequency (always positive)."""
+        n = len(self.postings.get(term, ()))
+        return math.log(1 + (len(self.docs) - n + 0.5) / (n + 0.5))
+
+    def _completions(self, prefix: str) -> list[str]:
+        max_length = None
+        if len(prefix) < MIN_COMPLETION_PREFIX:
+            max_length = len(prefix) + SHORT_WORD_SUFFIX
+        start = bisect.bisect_left(self.vocabulary, prefix)
+        found: list[str] = []
+        for term in self.vocabulary[start:]:
+            if not term.startswith(prefix) or len(found) >= MAX_COMPLETIONS:
+                break
+            if term != prefix and (max_length is None or len(term) <= max_length):
+                found.append(term)
+        return found
+
+    def query_terms(self, query: str) -> list[dict[str, float]]:
+        """Per query word, the indexed terms it matches and their weights."""
+        expanded = []
+        for word in tokenize(query):
+            if word in STOPWORDS:
+                continue
+            weights: dict[str, float] = {}
+            for i, variant in enumerate(word_variants(word)):
+                weight = EXACT_WEIGHT if i == 0 else STRIPPED_WEIGHT
+                if variant in self.postings:
+                    weights[variant] = max(weights.get(variant, 0.0), weight)
+                if len(variant) > 2:
+                    for term in self._completions(variant):
+                        weights.setdefault(term, COMPLETION_WEIGHT)
+            if weights:
+                expanded.append(weights)
+        return expanded
+
+    def search(
+        self,
+        query: str,
+        *,
+        country: str | None = None,
+        resort: str | None = None,
+        limit: int = 5,
+    ) -> list[KnowledgeHit]:
+        """Rank documents for ``query``, optionally within a country or resort.
+
+        Each query word contributes its best-scoring matching term, so a word
+        that matches both exactly and by prefix is not counted twice.
+        """
+        country = country.lower() if country else None
+        resort = resort.lower() if resort else None
+        scores: dict[int, float] = {}
+        matched: dict[int, set[str]] = {}
+        for weights in self.query_terms(query):
+            best: dict[int, tuple[float, str]] = {}
+            for term, weight in weights.items():
+                idf = self.idf(term)
+                for doc_id, tf in self.postings[term].items():
+                    doc = self.docs[doc_id]
+                    if (country and doc.country.lower() != country) or (
+                        resort and doc.resort.lower() != resort
+                    ):
+                        continue
+                    norm = K1 * (1 - B + B * self.doc_lengths[doc_id] / self.avg_length)
+                    score = weight * idf * tf * (K1 + 1) / (tf + norm)
+                    if score > best.get(doc_id, (0.0, ""))[0]:
+                        best[doc_id] = (score, term)
+            for doc_id, (score, term) in best.items():
+                scores[doc_id] = scores.get(doc_id, 0.0) + score
+                matched.setdefault(doc_id, set()).add(term)
+        ranked = sorted(scores.items(), key=lambda item: -item[1])[:limit]
+        return [
+            KnowledgeHit(
+                doc=self.docs[doc_id],
+                score=round(score, 3),
+                snippet=snippet(self.docs[doc_id].text, matched[doc_id]),
+            )
+            for doc_id, score in ranked
+        ]
+
+
+def snippet(text: str, terms: set[str], max_chars: int = SNIPPET_CHARS) -> str:
+    """Pick the lines of ``text`` that match the most ``terms``, in order."""
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    if len(lines) <= 1 and len(text) <= max_chars:
+        return text.strip()
+    hits = [len(terms.intersection(index_terms(line))) for line in lines]
+    best = sorted(range(len(lines)), key=lambda i: -hits[i])
+    chosen: list[int] = []
+    size = 0
+    for i in best:
+        if chosen and (not hits[i] or size + len(lines[i]) > max_chars):
+            break
+        chosen.append(i)
+        size += len(lines[i])
+    result = " … ".join(lines[i] for i in sorted(chosen))
+    return result if len(result) <= max_chars else result[: max_chars - 1] + "…"
+
+
+_index: KnowledgeIndex | None = None
+_index_lock = threading.Lock()
+
+
+def get_knowledge_index() -> KnowledgeIndex:
+    """Get the catalog knowledge index (built on first use)."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = KnowledgeIndex(
+                    catalog_documents([*get_resorts_info(), *get_hotels()])
+                )
+    return _index
@@ -0,0 +1,387 @@
+"""SkiDeal Bot - Tail-latency policy for model calls.
+
+Keeps one slow Anthropic response from stalling a customer:
+
+- every model call gets a deadline (``call_timeout``), capped by what is left
+  of the customer turn (``turn_deadline``),
+- when the primary model has not answered after the hedge delay (the observed
+  p95 latency, or a fixed value) a second identical request is sent and the
+  first answer wins,
+- timeouts and overload errors trip a circuit breaker and fall back to a
+  cheaper/faster model tier; while the breaker is open calls go straight to
+  the fallback.
+
+Configuration (environment variables):
+    SKIDEAL_CALL_TIMEOUT: Seconds per model call (default: 30)
+    SKIDEAL_TURN_DEADLINE: Seconds per customer turn (default: 60)
+    SKIDEAL_HEDGE_AFTER: Fixed hedge delay in seconds (default: observed p95)
+    SKIDEAL_FALLBACK_MODEL: Fallback Anthropic model (default: Claude Haiku)
+"""
+
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import logging
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Mapping
+
+import anthropic
+import httpx
+from langchain_core.language_models import LanguageModelInput
+from langchain_core.messages import BaseMessage, HumanMessage
+from langchain_core.runnables import Runnable, RunnableConfig
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FALLBACK_MODEL = "claude-3-5-haiku-20241022"
+
+# Status codes worth retrying on another model: rate limited / overloaded
+_OVERLOAD_STATUS = {429, 500, 502, 503, 504, 529}
+
+
+class ModelDeadlineExceeded(TimeoutError):
+    """Neither the primary nor the fallback model answered within the deadline."""
+
+
+def is_overload(error: BaseException) -> bool:
+    """Return True for timeouts and overload errors that a fallback can absorb."""
+    if isinstance(
+        error,
+        (
+            TimeoutError,
+            asyncio.TimeoutError,
+            concurrent.futures.TimeoutError,
+            anthropic.APITimeoutError,
+            anthropic.APIConnectionError,
+            httpx.TimeoutException,
+        ),
+    ):
+        return True
+    return getattr(error, "status_code", None) in _OVERLOAD_STATUS
+
+
+@dataclass
+class LatencyPolicy:
+    """Deadlines and hedging settings for model calls."""
+
+    call_timeout: float = 30.0
+    turn_deadline: float = 60.0
+    # Fixed hedge delay; None hedges after the observed ``hedge_percentile``
+    hedge_after: float | None = None
+    hedge_percentile: float = 0.95
+    # Latency samples needed before the observed percentile is trusted
+    min_samples: int = 20
+    breaker_failures: int = 5
+    breaker_reset: float = 30.0
+
+    @classmethod
+    def from_env(cls) -> LatencyPolicy:
+        """Build a policy from ``SKIDEAL_*`` environment variables."""
+        hedge_after = os.environ.get("SKIDEAL_HEDGE_AFTER")
+        return cls(
+            call_timeout=float(os.environ.get("SKIDEAL_CALL_TIMEOUT", "30")),
+            turn_deadline=float(os.environ.get("SKIDEAL_TURN_DEADLINE", "60")),
+            hedge_after=float(hedge_after) if hedge_after else None,
+        )
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies."""
+
+    def __init__(self, window: int = 200) -> None:
+        """Keep the latencies of the last ``window`` successful calls."""
+        self._samples: deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float) -> None:
+        """Record the latency of a successful call."""
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, p: float) -> float | None:
+        """Return the ``p`` percentile, or None without samples."""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(p * len(samples)))]
+
+    def __len__(self) -> int:
+        """Return the number of samples in the window."""
+        return len(self._samples)
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures; lets one probe through after ``reset_after``."""
+
+    def __init__(self, failure_threshold: int = 5, reset_after: float = 30.0) -> None:
+        """Open after ``failure_threshold`` failures; probe again after ``reset_after`` seconds."""
+        self.failure_threshold = failure_threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at: float | None = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """``closed``, ``open`` or ``half-open``."""
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_after:
+            return "half-open"
+        return "open"
+
+    def admit(self) -> str | None:
+        """Admit a call to the primary model.
+
+        Returns ``"closed"`` for a regular call, ``"probe"`` for the single
+        trial call of a half-open breaker, or None when the call must skip
+        the primary. A probe ends with `record_success`, `record_failure` or,
+        when it settles nothing (cancelled, non-overload error), `end_probe`.
+        """
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return state
+            if state == "half-open" and not self._probing:
+                self._probing = True
+                return "probe"
+            return None
+
+    def allow(self) -> bool:
+        """Whether a call may go to the primary model (see `admit`)."""
+        return self.admit() is not None
+
+    def end_probe(self) -> None:
+        """Free the probe slot so the next call probes again."""
+        with self._lock:
+            self._probing = False
+
+    def record_success(self) -> None:
+        """Close the breaker."""
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self) -> None:
+        """Count a failure; open (or re-open) the breaker at the threshold."""
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.failures >= self.failure_threshold or self.opened_at is not None:
+                if self.opened_at is None:
+                    logger.warning("Primary model circuit breaker opened")
+                self.opened_at = time.monotonic()
+
+
+class LatencyGuard:
+    """Policy plus the shared state (latency window, breaker) of one model tier."""
+
+    def __init__(self, policy: LatencyPolicy | None = None) -> None:
+        """Apply ``policy`` (default: `LatencyPolicy` defaults)."""
+        self.policy = policy or LatencyPolicy()
+        self.tracker = LatencyTracker()
+        self.breaker = CircuitBreaker(
+            self.policy.breaker_failures, self.policy.breaker_reset
+        )
+
+    def hedge_delay(self) -> float | None:
+        """Seconds to wait before sending a hedged request (None: don't hedge)."""
+        if self.policy.hedge_after is not None:
+            return self.policy.hedge_after
+        if len(self.tracker) < self.policy.min_samples:
+            return None
+        return self.tracker.percentile(self.policy.hedge_percentile)
+
+    def turn_deadline(self, turn_started_at: float | None) -> float | None:
+        """Wall-clock deadline for a turn that started at ``turn_started_at``."""
+        if turn_started_at is None:
+            return None
+        return turn_started_at + self.policy.turn_deadline
+
+
+_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=32, thread_name_prefix="model-hedge"
+)
+
+
+class ResilientModel(Runnable[LanguageModelInput, BaseMessage]):
+    """Runs the primary model with deadlines and hedging, falling back on overload."""
+
+    def __init__(
+        self,
+        primary: Runnable[LanguageModelInput, BaseMessage],
+        guard: LatencyGuard,
+        *,
+        fallback: Runnable[LanguageModelInput, BaseMessage] | None = None,
+        deadline: float | None = None,
+    ) -> None:
+        """Call ``primary`` under ``guard``; ``deadline`` is a wall-clock cap."""
+        self.primary = primary
+        self.guard = guard
+        self.fallback = fallback
+        self.deadline = deadline
+
+    def _budget(self) -> float:
+        budget = self.guard.policy.call_timeout
+        if self.deadline is not None:
+            budget = min(budget, self.deadline - time.time())
+        if budget <= 0:
+            raise ModelDeadlineExceeded("Turn deadline exceeded before model call")
+        return budget
+
+    def _remaining(self) -> float:
+        if self.deadline is None:
+            return self.guard.policy.call_timeout
+        return self.deadline - time.time()
+
+    def _on_primary_error(self, error: BaseException) -> None:
+        if not is_overload(error):
+            raise error
+        self.guard.breaker.record_failure()
+        if self.fallback is None:
+            raise ModelDeadlineExceeded(str(error) or type(error).__name__) from error
+        logger.warning("Primary model failed (%s); using fallback", type(error).__name__)
+
+    # -- async ------------------------------------------------------------------
+
+    async def _ahedged(
+        self, input: LanguageModelInput, config: RunnableConfig | None, **kwargs: Any
+    ) -> BaseMessage:
+        budget = self._budget()
+        start = time.monotonic()
+        tasks = {asyncio.ensure_future(self.primary.ainvoke(input, config, **kwargs))}
+        hedge = self.guard.hedge_delay()
+        try:
+            if hedge is not None and hedge < budget:
+                done, _ = await asyncio.wait(tasks, timeout=hedge)
+                if not done:
+                    logger.info("Hedging model call after %.2fs", hedge)
+                    tasks.add(
+                        asyncio.ensure_future(self.primary.ainvoke(input, config, **kwargs))
+                    )
+            error: BaseException | None = None
+            while tasks:
+                remaining = budget - (time.monotonic() - start)
+                if remaining <= 0:
+                    break
+                done, tasks = await asyncio.wait(
+                    tasks, timeout=remaining, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    if task.exception() is None:
+                        self.guard.tracker.observe(time.monotonic() - start)
+                        return task.result()
+                    error = task.exception()
+            if error is not None and not tasks:
+                raise error
+            raise asyncio.TimeoutError(f"Model call exceeded {budget:.1f}s")
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def ainvoke(
+        self,
+        input: LanguageModelInput,
+        config: RunnableConfig | None = None,
+        **kwargs: Any,
+    ) -> BaseMessage:
+        """Call the primary model (hedged, with deadline) or the fallback."""
+        admitted = self.guard.breaker.admit()
+        if admitted is not None:
+            try:
+                response = await self._ahedged(input, config, **kwargs)
+                self.guard.breaker.record_success()
+                return response
+            except Exception as e:
+                self._on_primary_error(e)
+            finally:
+                # A cancelled (superseded) probe must not hold the slot forever
+                if admitted == "probe":
+                    self.guard.breaker.end_probe()
+        if self.fallback is None:
+            raise ModelDeadlineExceeded("Primary model unavailable (circuit open)")
+        try:
+            return await asyncio.wait_for(
+                self.fallback.ainvoke(input, config, **kwargs), self._remaining()
+            )
+        except asyncio.TimeoutError as e:
+            raise ModelDeadlineExceeded("Fallback model exceeded the turn deadline") from e
+
+    # -- sync -------------------------------------------------------------------
+
+    def _hedged(
+        self, input: LanguageModelInput, config: RunnableConfig | None, **kwargs: Any
+    ) -> BaseMessage:
+        budget = self._budget()
+        start = time.monotonic()
+        futures = {_executor.submit(self.primary.invoke, input, config, **kwargs)}
+        hedge = self.guard.hedge_delay()
+        if hedge is not None and hedge < budget:
+            done, _ = concurrent.futures.wait(futures, timeout=hedge)
+            if not done:
+                logger.info("Hedging model call after %.2fs", hedge)
+                futures.add(_executor.submit(self.primary.invoke, input, config, **kwargs))
+        error: BaseException | None = None
+        while futures:
+            remaining = budget - (time.monotonic() - start)
+            if remaining <= 0:
+                break
+            done, futures = concurrent.futures.wait(
+                futures, timeout=remaining, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                if future.exception() is None:
+                    self.guard.tracker.observe(time.monotonic() - start)
+                    return future.result()
+                error = future.exception()
+        # Losing or timed-out calls cannot be interrupted; their results are dropped
+        if error is not None and not futures:
+            raise error
+        raise TimeoutError(f"Model call exceeded {budget:.1f}s")
+
+    def invoke(
+        self,
+        input: LanguageModelInput,
+        config: RunnableConfig | None = None,
+        **kwargs: Any,
+    ) -> BaseMessage:
+        """Call the primary model (hedged, with deadline) or the fallback."""
+        admitted = self.guard.breaker.admit()
+        if admitted is not None:
+            try:
+                response = self._hedged(input, config, **kwargs)
+                self.guard.breaker.record_success()
+                return response
+            except Exception as e:
+                self._on_primary_error(e)
+            finally:
+                if admitted == "probe":
+                    self.guard.breaker.end_probe()
+        if self.fallback is None:
+            raise ModelDeadlineExceeded("Primary model unavailable (circuit open)")
+        future = _executor.submit(self.fallback.invoke, input, config, **kwargs)
+        try:
+            return future.result(timeout=max(0.0, self._remaining()))
+        except concurrent.futures.TimeoutError as e:
+            raise ModelDeadlineExceeded("Fallback model exceeded the turn deadline") from e
+
+
+# ============================================================================
+# TURN TRACKING
+# ============================================================================
+
+
+def track_turn(state: Mapping[str, Any]) -> dict[str, Any]:
+    """Pre-model step: number customer turns and stamp when the current one began."""
+    turns = sum(1 for m in state["messages"] if isinstance(m, HumanMessage))
+    if turns != state.get("turn") or "turn_started_at" not in state:
+        return {"turn": turns, "turn_started_at": time.time()}
+    return {}
@@ -0,0 +1,405 @@
+"""SkiDeal Bot - Structured lead state.
+
+Keeps a typed lead record in the graph state that is filled incrementally by a
+cheap, rule-based extraction step over each new customer message. The model
+gets a compact "collected / missing" block in its system prompt instead of
+re-deriving the lead from the whole transcript, which lets the history be
+trimmed aggressively and lets `handoff_to_agent` fill in the validated contact
+details. Questions ("יש ספא?") are not read as preferences, and negated
+levels or preferences ("אני לא מתחיל", "בלי ספא") are not read as stated.
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Annotated, Any, Sequence, cast
+
+from langchain_core.messages import BaseMessage, HumanMessage
+from langgraph.graph.message import add_messages
+from langgraph.managed import RemainingSteps
+from typing_extensions import NotRequired, TypedDict
+
+from agent.data.resorts import DATA_SUMMARY, get_hotel_names
+from agent.tools.handoff_to_agent import validate_email, validate_name, validate_phone
+
+
+class LeadRecord(TypedDict, total=False):
+    """Lead details collected so far; keys match `handoff_to_agent` arguments."""
+
+    customer_name: str
+    phone: str
+    email: str
+    destination: str
+    dates: str
+    num_people: int
+    ages: str
+    ski_level: str
+    needs_ski_school: bool
+    needs_equipment: bool
+    hotel_preference: str
+    budget: str
+    spa_preference: bool
+    insurance_interest: bool
+
+
+# The 11 qualification questions, in the order the prompt asks for them
+QUALIFICATION_FIELDS = (
+    "destination",
+    "num_people",
+    "ages",
+    "ski_level",
+    "needs_ski_school",
+    "spa_preference",
+    "hotel_preference",
+    "budget",
+    "dates",
+    "needs_equipment",
+    "insurance_interest",
+)
+
+# Required lead fields
+CONTACT_FIELDS = ("customer_name", "phone", "email")
+
+LEAD_FIELDS = QUALIFICATION_FIELDS + CONTACT_FIELDS
+
+FIELD_LABELS = {
+    "destination": "יעד",
+    "num_people": "מספר אנשים",
+    "ages": "גילאים",
+    "ski_level": "רמת סקי",
+    "needs_ski_school": "בית ספר לסקי",
+    "spa_preference": "ספא",
+    "hotel_preference": "העדפת מלון",
+    "budget": "תקציב",
+    "dates": "תאריכים",
+    "needs_equipment": "ציוד",
+    "insurance_interest": "ביטוח",
+    "customer_name": "שם מלא",
+    "phone": "טלפון",
+    "email": "אימייל",
+}
+
+
+def merge_lead(left: LeadRecord | None, right: LeadRecord | None) -> LeadRecord:
+    """Reducer for the lead record: newer non-empty values win."""
+    merged: dict[str, Any] = dict(left or {})
+    for key, value in (right or {}).items():
+        if value is not None and value != "":
+            merged[key] = value
+    return cast(LeadRecord, merged)
+
+
+class SkiDealState(TypedDict):
+    """Graph state: the ReAct agent state plus the structured lead record."""
+
+    messages: Annotated[Sequence[BaseMessage], add_messages]
+    remaining_steps: NotRequired[RemainingSteps]
+    lead: NotRequired[Annotated[LeadRecord, merge_lead]]
+    # Number of messages already scanned by the lead extractor
+    lead_cursor: NotRequired[int]
+    # Customer turn number and when it started (epoch seconds)
+    turn: NotRequired[int]
+    turn_started_at: NotRequired[float]
+    # Conversation stage of the current turn (see `agent.stages`)
+    stage: NotRequired[str]
+
+
+# ============================================================================
+# EXTRACTION
+# ============================================================================
+
+_NEGATION = re.compile(
+    r"(בלי|לא\s+צריכ\w*|לא\s+רוצ\w*|לא\s+מעוניינ\w*|לא\s+חשוב|אין\s+צורך|ללא|no|without|don'?t)\s*\S*\s*$",
+    re.IGNORECASE,
+)
+
+_PHONE = re.compile(r"(?<![\d+])(?:\+972|0)[\d\- ]{8,13}\d")
+_EMAIL = re.compile(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}")
+_NAME = re.compile(
+    r"(?:קוראים\s+לי|שמי|השם\s+שלי(?:\s+הוא)?|השם\s+המלא\s+שלי(?:\s+הוא)?|my\s+name\s+is)\s*:?\s+"
+    r"([^\s,.!?\d]+\s+[^\s,.!?\d]+)",
+    re.IGNORECASE,
+)
+_PEOPLE_PARTS = re.compile(
+    r"(\d+)\s*(?:מבוגרים|ילדים|ילדות|אנשים|נפשות|נוסעים|חברים|adults|kids|children|people)",
+    re.IGNORECASE,
+)
+_PEOPLE_WE = re.compile(r"אנחנו\s+(\d+)")
+_COUPLE = re.compile(r"(?:^|\s)(?:זוג|אני\s+ו(?:אשתי|בעלי|בן\s+הזוג|בת\s+הזוג))(?:\s|$|[,.!])")
+_AGES = re.compile(
+    r"(?:בני|בנות|בן|בת|גילאי|גילאים|בגילאי|בגיל|גיל|ages?)\s*:?\s*"
+    r"(\d{1,2}(?:\.\d)?(?:\s*(?:,|ו-?|-|ו|and|&)\s*\d{1,2}(?:\.\d)?)*)",
+    re.IGNORECASE,
+)
+_DATES = re.compile(
+    r"(?:(?:תחילת|אמצע|סוף|בסוף|בתחילת|באמצע)\s+)?"
+    r"(?:ב)?(ינואר|פברואר|מרץ|מרס|אפריל|דצמבר|נובמבר|חנוכה|פסח|פורים|"
+    r"january|february|march|april|december)",
+    re.IGNORECASE,
+)
+# "12.1", "12/1/25", "12.1-19.1"; "2.5" or a child aged "8.5" look the same,
+# so a bare day.month only counts after a date preposition ("ב-12.1")
+_NUMERIC_DATE = re.compile(
+    r"(?P<context>(?:בתאריכים|בתאריך|מתאריך|תאריכים|תאריך|בין|עד|on|from|between|until)\s+"
+    r"|(?<!\S)(?:ב|מ|מה|עד|ל)-?)?"
+    r"(?<![\d.,/])(?P<date>(?P<day>\d{1,2})[./](?P<month>\d{1,2})(?:[./](?P<year>\d{2,4}))?"
+    r"(?P<range>\s*-\s*\d{1,2}(?:[./]\d{1,2}(?:[./]\d{2,4})?)?)?)(?![\d.,/]?\d)",
+    re.IGNORECASE,
+)
+_CURRENCY = r"(?:₪|ש\"ח|ש''ח|שח|שקל\w*|יורו|€|\$|דולר\w*|eur|euro)"
+# The amount after "תקציב" (currency optional), or any amount with a currency
+_BUDGET = re.compile(
+    rf"תקציב\w*[^\d.?!\n]{{0,20}}?(\d[\d,.]*(?:\s*(?:אלף|K))?(?:\s*{_CURRENCY})?)"
+    rf"|(\d[\d,.]*\s*(?:אלף|K)?\s*{_CURRENCY})",
+    re.IGNORECASE,
+)
+_STARS = re.compile(r"(\d)\s*כוכבים")
+
+# Whole words only (an optional "ו"/"ה"/"כ" prefix): "מתחילה" is also "starts"
+_SKI_LEVELS = (
+    (
+        "beginner",
+        re.compile(
+            r"(?<!\w)[וכה]?(?:מתחיל|מתחילים|מתחילות)(?!\w)|פעם ראשונה|אף פעם לא|בחיים לא"
+            r"|\bbeginners?\b",
+            re.I,
+        ),
+    ),
+    (
+        "intermediate",
+        re.compile(r"(?<!\w)[וכה]?(?:בינוני\w*|ביניים)(?!\w)|\bintermediate\b", re.I),
+    ),
+    (
+        "advanced",
+        re.compile(
+            r"(?<!\w)[וכה]?(?:מתקדם|מתקדמ\w+|מנוס\w*|מקצוען|מקצוענ\w+)(?!\w)"
+            r"|\b(?:advanced|expert)\b",
+            re.I,
+        ),
+    ),
+)
+# "לא" right before a level word negates it ("אני לא מתחיל", "לא ממש מתקדמים")
+_LEVEL_NEGATION = re.compile(r"(?:לא|not)\s+(?:\S+\s+)?$", re.I)
+
+_SENTENCE = re.compile(r"[^.!?\n]+[.!?]*")
+_QUESTION_WORDS = re.compile(
+    r"^\s*(?:האם|כמה|מתי|איך|איפה|למה|מה|יש\s+לכם|is|are|do|does|how|what)\b", re.I
+)
+
+_PREFERENCE_KEYWORDS = {
+    "needs_ski_school": re.compile(
+        r"בית\s*ספר\s*(?:ל)?סקי|סקי\s*סקול|שיעור\w*|מדריכ\w*|ski\s*school|lessons?", re.I
+    ),
+    "needs_equipment": re.compile(r"ציוד|השכר\w*|equipment|rental", re.I),
+    "spa_preference": re.compile(r"ספא|spa", re.I),
+    "insurance_interest": re.compile(r"ביטוח|trip\s*guaranty|insurance", re.I),
+}
+
+
+def _destinations_pattern() -> re.Pattern[str]:
+    names = set(DATA_SUMMARY.get("countries", []))
+    for resorts in DATA_SUMMARY.get("resorts_by_country", {}).values():
+        names.update(resorts)
+    # Longest first so "פאס דה לה קאסה" wins over shorter overlapping names;
+    # allow attached Hebrew prefixes ("לואל טורנס", "באוסטריה") but not
+    # matches inside a longer word.
+    alternation = "|".join(
+        re.escape(name) for name in sorted(names, key=len, reverse=True)
+    )
+    return re.compile(rf"(?<![^\W\d_])[ובלהמש]{{0,2}}({alternation})(?![^\W\d_])")
+
+
+_DESTINATIONS = _destinations_pattern()
+_HOTEL_NAMES = sorted(set(get_hotel_names()) - {""}, key=len, reverse=True)
+
+
+def _is_negated(text: str, start: int) -> bool:
+    return bool(_NEGATION.search(text[max(0, start - 20) : start]))
+
+
+def _numeric_dates(text: str) -> list[tuple[int, str]]:
+    dates = []
+    for match in _NUMERIC_DATE.finditer(text):
+        if not (1 <= int(match["day"]) <= 31 and 1 <= int(match["month"]) <= 12):
+            continue
+        if match["context"] or match["year"] or match["range"]:
+            dates.append((match.start("date"), match["date"].strip()))
+    return dates
+
+
+def _statements(text: str) -> list[str]:
+    """Sentences of a message that are not questions."""
+    sentences = (m.group(0) for m in _SENTENCE.finditer(text))
+    return [
+        sentence
+        for sentence in sentences
+        if not sentence.rstrip().endswith("?") and not _QUESTION_WORDS.search(sentence)
+    ]
+
+
+def _flag(sentences: list[str], pattern: re.Pattern[str]) -> bool | None:
+    value = None
+    for sentence in sentences:
+        match = pattern.search(sentence)
+        if match:
+            value = not _is_negated(sentence, match.start())
+    return value
+
+
+def _ski_level(sentences: list[str]) -> str | None:
+    # The last level stated wins ("לא מתחיל, מתקדם" -> advanced)
+    mentions = []
+    for i, sentence in enumerate(sentences):
+        for level, pattern in _SKI_LEVELS:
+            for match in pattern.finditer(sentence):
+                if not _LEVEL_NEGATION.search(sentence[: match.start()]):
+                    mentions.append(((i, match.start()), level))
+    return max(mentions)[1] if mentions else None
+
+
+def extract_lead_fields(text: str) -> LeadRecord:
+    """Extract lead fields mentioned in a single customer message.
+
+    Only values that pass the `handoff_to_agent` validators are kept, so a
+    first name alone or a malformed phone number stays "missing".
+    """
+    found: dict[str, Any] = {}
+    if not text:
+        return LeadRecord()
+
+    for candidate in _PHONE.findall(text):
+        cleaned = candidate.replace(" ", "").replace("-", "")
+        if validate_phone(cleaned)[0]:
+            found["phone"] = cleaned
+            break
+
+    email = _EMAIL.search(text)
+    if email and validate_email(email.group(0))[0]:
+        found["email"] = email.group(0)
+
+    name = _NAME.search(text)
+    if name and validate_name(name.group(1))[0]:
+        found["customer_name"] = " ".join(name.group(1).split())
+
+    parts = [int(n) for n in _PEOPLE_PARTS.findall(text)]
+    we = _PEOPLE_WE.search(text)
+    if parts:
+        found["num_people"] = sum(parts)
+    elif we:
+        found["num_people"] = int(we.group(1))
+    elif _COUPLE.search(text):
+        found["num_people"] = 2
+
+    ages = [
+        age
+        for match in _AGES.finditer(text)
+        for age in re.findall(r"\d{1,2}(?:\.\d)?", match.group(1))
+    ]
+    if ages:
+        found["ages"] = ", ".join(ages)
+
+    destination = _DESTINATIONS.search(text)
+    if destination:
+        found["destination"] = destination.group(1)
+
+    dates = [(m.start(), m.group(0).strip().removeprefix("ב")) for m in _DATES.finditer(text)]
+    dates += _numeric_dates(text)
+    if dates:
+        found["dates"] = ", ".join(date for _, date in sorted(dates))
+
+    budget = _BUDGET.search(text)
+    if budget:
+        found["budget"] = (budget.group(1) or budget.group(2)).strip().rstrip(",.")
+
+    statements = _statements(text)
+    level = _ski_level(statements)
+    if level:
+        found["ski_level"] = level
+
+    for field, pattern in _PREFERENCE_KEYWORDS.items():
+        value = _flag(statements, pattern)
+        if value is not None:
+            found[field] = value
+
+    for hotel_name in _HOTEL_NAMES:
+        if re.search(rf"\b{re.escape(hotel_name)}\b", text, re.IGNORECASE):
+            found["hotel_preference"] = hotel_name
+            break
+    else:
+        stars = _STARS.search(text)
+        if stars:
+            found["hotel_preference"] = f"{stars.group(1)} כוכבים"
+        elif re.search(r"דיר(?:ה|ות)|apartment", text, re.IGNORECASE):
+            found["hotel_preference"] = "דירה"
+
+    return cast(LeadRecord, found)
+
+
+# ============================================================================
+# GRAPH HOOKS
+# ============================================================================
+
+# Full customer turns kept in the model context; older facts live in the lead
+MAX_HISTORY_TURNS = 6
+
+
+def trim_history(
+    messages: Sequence[BaseMessage], max_turns: int = MAX_HISTORY_TURNS
+) -> list[BaseMessage]:
+    """Keep the last ``max_turns`` customer turns, always starting on a human message."""
+    human_indexes = [i for i, m in enumerate(messages) if isinstance(m, HumanMessage)]
+    if len(human_indexes) <= max_turns:
+        return list(messages)
+    return list(messages[human_indexes[-max_turns] :])
+
+
+def update_lead_state(state: SkiDealState) -> dict[str, Any]:
+    """Pre-model hook: extract lead fields from new customer messages and trim history."""
+    messages = state["messages"]
+    cursor = state.get("lead_cursor", 0)
+    if cursor > len(messages):
+        cursor = 0
+
+    found: LeadRecord = LeadRecord()
+    for message in messages[cursor:]:
+        if isinstance(message, HumanMessage):
+            found = merge_lead(found, extract_lead_fields(message.text))
+
+    return {
+        "lead": found,
+        "lead_cursor": len(messages),
+        "llm_input_messages": trim_history(messages),
+    }
+
+
+def format_lead_value(value: Any) -> str:
+    """Format a lead value for display."""
+    if isinstance(value, bool):
+        return "כן" if value else "לא"
+    return str(value)
+
+
+def render_lead_block(lead: LeadRecord | None) -> str:
+    """Render the compact "collected / missing" block for the system prompt."""
+    lead = lead or LeadRecord()
+    collected = [
+        f"{FIELD_LABELS[f]}: {format_lead_value(lead[f])}"  # type: ignore[literal-required]
+        for f in LEAD_FIELDS
+        if f in lead
+    ]
+    missing_qualification = [FIELD_LABELS[f] for f in QUALIFICATION_FIELDS if f not in lead]
+    missing_contact = [FIELD_LABELS[f] for f in CONTACT_FIELDS if f not in lead]
+    return "\n".join(
+        [
+            "📌 מצב איסוף פרטים (מתעדכן אוטומטית מהודעות הלקוח)",
+            "נאסף: " + (" | ".join(collected) if collected else "עדיין כלום"),
+            "חסר (סינון): " + (", ".join(missing_qualification) or "הכל נאסף"),
+            "חסר (פרטי ליד): " + (", ".join(missing_contact) or "הכל נאסף"),
+        ]
+    )
+
+
+def lead_completion(lead: LeadRecord | None) -> float:
+    """Return the share of lead fields collected (0.0 - 1.0)."""
+    lead = lead or LeadRecord()
+    return sum(1 for f in LEAD_FIELDS if f in lead) / len(LEAD_FIELDS)
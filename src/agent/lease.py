@@ -0,0 +1,519 @@
+"""SkiDeal Bot - Per-thread leases for horizontally scaled workers.
+
+`ConversationDispatcher` keeps the messages of a thread in order within one
+process. With several workers behind the same WhatsApp number, two messages
+of one customer can land on different workers, which would run the agent
+twice in parallel on the same thread, or answer the second message first.
+The lease store is shared by the workers and keeps, per thread:
+
+- a sequence number handed out as each webhook message is accepted
+  (`LeaseManager.enqueue`), next to the WhatsApp message ids already seen,
+  so a redelivery that lands on another worker is dropped too,
+- the highest sequence number answered so far.
+
+Before running the graph a worker takes the thread's lease:
+
+- only for the next message of the thread: a worker with message 3 waits
+  while message 2 is unanswered, even if the lease is free. If message 2
+  never comes (its worker crashed before taking the lease), the thread moves
+  on once nothing was answered for ``ttl``; should message 2 turn up after
+  all, the dispatcher drops it (it compares it with `Lease.answered`) rather
+  than answer it out of order,
+- a lease expires ``ttl`` seconds after it was last renewed, so a crashed
+  worker blocks the thread for at most ``ttl``; the holder renews it every
+  ``ttl / 3`` while the run is in flight,
+- every acquisition gets a new, higher fencing token. A holder whose lease
+  expired and was taken over is stale: `LeaseManager.is_current` fails and
+  the dispatcher drops its reply instead of sending it after the new
+  holder's,
+- a holder that fails to renew cancels its run (`LeaseHandle.run`), so it
+  stops writing to the thread as soon as it notices,
+- a release wakes the waiters of the same process right away; other
+  processes poll with a short backoff (5-100 ms).
+
+Checkpoint writes themselves are not fenced: a worker stalled for longer
+than ``ttl`` (a GC pause, a frozen VM) only notices the lost lease at its
+next renewal, up to ``ttl / 3`` later, and checkpoints it writes meanwhile
+land next to the new holder's. Keep ``ttl`` well above the longest stall
+expected.
+
+Messages submitted to the dispatcher directly, without a sequence number,
+are only ordered within their process.
+
+`InProcessLeases` serves a single worker (and the tests); `SQLiteLeases`
+shares the leases between the processes of one host through a SQLite file.
+
+Configuration (environment variables):
+    SKIDEAL_LEASE_PATH: SQLite file shared by the workers (default: in-process)
+    SKIDEAL_LEASE_TTL: Lease lifetime in seconds without renewal (default: 30)
+"""
+
+from __future__ import annotations
+
+import abc
+import asyncio
+import contextlib
+import itertools
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Callable, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+MIN_POLL = 0.005
+MAX_POLL = 0.1
+# WhatsApp retries an unacknowledged webhook for up to 7 days
+DEDUP_WINDOW = 7 * 24 * 3600.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS leases (
+    thread_id TEXT PRIMARY KEY,
+    owner TEXT,
+    token INTEGER NOT NULL,
+    expires_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS threads (
+    thread_id TEXT PRIMARY KEY,
+    next_seq INTEGER NOT NULL,
+    answered_seq INTEGER NOT NULL,
+    progress_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS seen (
+    message_id TEXT PRIMARY KEY,
+    seen_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS seen_by_age ON seen (seen_at);
+"""
+
+
+@dataclass(frozen=True)
+class Lease:
+    """Exclusive right to run a thread until ``expires_at``."""
+
+    thread_id: str
+    owner: str
+    token: int
+    expires_at: float
+    # Highest sequence number of the thread answered when the lease was taken
+    answered: int = 0
+
+
+@dataclass
+class _Sequence:
+    next_seq: int = 0
+    answered_seq: int = 0
+    # When the thread last moved on (or became busy again)
+    progress_at: float = 0.0
+
+    def waits_for_earlier(self, seq: int, now: float, ttl: float) -> bool:
+        # An earlier message is unanswered and the thread moved recently
+        return seq > self.answered_seq + 1 and now - self.progress_at < ttl
+
+
+class LeaseLost(Exception):
+    """The lease of a thread was lost while running it."""
+
+
+@dataclass
+class LeaseHandle:
+    """A held lease, renewed in the background; ``lost`` once it can't be."""
+
+    lease: Lease
+    # Set when a renewal failed: another worker may hold the thread now
+    lost: asyncio.Event = field(default_factory=asyncio.Event)
+    # Highest sequence number answered under the lease, recorded on release
+    answered: int | None = None
+
+    @property
+    def token(self) -> int:
+        """Fencing token of the lease."""
+        return self.lease.token
+
+    async def run(self, work: Awaitable[T]) -> T:
+        """Await ``work``, cancelling it and raising `LeaseLost` if the lease is lost."""
+        task = asyncio.ensure_future(work)
+        lost = asyncio.create_task(self.lost.wait())
+        try:
+            await asyncio.wait({task, lost}, return_when=asyncio.FIRST_COMPLETED)
+        except asyncio.CancelledError:
+            # Don't leave the work running (and writing) behind the caller
+            task.cancel()
+            await asyncio.wait({task})
+            raise
+        finally:
+            lost.cancel()
+        if task.done():
+            return task.result()
+        task.cancel()
+        await asyncio.wait({task})
+        raise LeaseLost(f"Lost the lease of thread {self.lease.thread_id}")
+
+
+class LeaseManager(abc.ABC):
+    """Acquire, renew and release per-thread leases.
+
+    Backends implement the synchronous `admit`, `forget`, `try_acquire`,
+    `renew`, `release` and `current_token`; `_call` decides where they run.
+    """
+
+    def __init__(self, *, ttl: float = 30.0, owner: str | None = None) -> None:
+        """Hand out leases lasting ``ttl`` seconds, held as ``owner`` (default: unique)."""
+        self.ttl = ttl
+        self.owner = owner or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._released: dict[str, asyncio.Event] = {}
+
+    @abc.abstractmethod
+    def admit(self, thread_id: str, message_id: str) -> int | None:
+        """Sequence number of a new message of the thread (None when already seen)."""
+
+    @abc.abstractmethod
+    def forget(self, thread_id: str, message_id: str, seq: int) -> None:
+        """Undo `admit` for a message that was not accepted after all."""
+
+    @abc.abstractmethod
+    def try_acquire(self, thread_id: str, seq: int | None = None) -> Lease | None:
+        """Take the lease if it is free or expired and ``seq`` is next in line."""
+
+    @abc.abstractmethod
+    def renew(self, lease: Lease) -> Lease | None:
+        """Extend a lease still held (None when it was lost)."""
+
+    @abc.abstractmethod
+    def release(self, lease: Lease, answered: int | None = None) -> None:
+        """Give up a lease, recording messages up to ``answered`` as answered.
+
+        A no-op when the lease was already taken over.
+        """
+
+    @abc.abstractmethod
+    def current_token(self, thread_id: str) -> int | None:
+        """Token of the unexpired lease of a thread, if any."""
+
+    async def _call(self, fn: Callable[..., Any], *args: Any) -> Any:
+        return fn(*args)
+
+    async def enqueue(self, thread_id: str, message_id: str) -> int | None:
+        """Sequence number of an accepted message (None for a redelivery)."""
+        seq: int | None = await self._call(self.admit, thread_id, message_id)
+        return seq
+
+    async def withdraw(self, thread_id: str, message_id: str, seq: int) -> None:
+        """Undo `enqueue` for a message that was shed, so its redelivery is taken."""
+        await self._call(self.forget, thread_id, message_id, seq)
+
+    async def acquire(self, thread_id: str, seq: int | None = None) -> Lease:
+        """Wait until the lease of ``thread_id`` is ours to answer message ``seq``."""
+        delay = MIN_POLL
+        while True:
+            lease: Lease | None = await self._call(self.try_acquire, thread_id, seq)
+            if lease is not None:
+                return lease
+            released = self._released.setdefault(thread_id, asyncio.Event())
+            with contextlib.suppress(asyncio.TimeoutError):
+                await asyncio.wait_for(released.wait(), delay)
+            delay = min(delay * 2, MAX_POLL)
+
+    async def is_current(self, handle: LeaseHandle) -> bool:
+        """Whether the lease is still ours (fencing check before side effects)."""
+        if handle.lost.is_set():
+            return False
+        token = await self._call(self.current_token, handle.lease.thread_id)
+        return bool(token == handle.token)
+
+    async def _keep_alive(self, handle: LeaseHandle) -> None:
+        while True:
+            await asyncio.sleep(self.ttl / 3)
+            lease = await self._call(self.renew, handle.lease)
+            if lease is None:
+                handle.lost.set()
+                logger.warning("Lost the lease of thread %s", handle.lease.thread_id)
+                return
+            handle.lease = lease
+
+    @asynccontextmanager
+    async def hold(self, thread_id: str, seq: int | None = None) -> AsyncIterator[LeaseHandle]:
+        """Hold the lease of ``thread_id`` to answer message ``seq`` (and on)."""
+        handle = LeaseHandle(await self.acquire(thread_id, seq))
+        renewer = asyncio.create_task(self._keep_alive(handle))
+        try:
+            yield handle
+        finally:
+            renewer.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await renewer
+            if not handle.lost.is_set():
+                await self._call(self.release, handle.lease, handle.answered)
+            released = self._released.pop(thread_id, None)
+            if released is not None:
+                released.set()
+
+
+class InProcessLeases(LeaseManager):
+    """Leases of a single process."""
+
+    def __init__(self, *, ttl: float = 30.0, owner: str | None = None) -> None:
+        """Hand out leases lasting ``ttl`` seconds, held as ``owner``."""
+        super().__init__(ttl=ttl, owner=owner)
+        self._lock = threading.Lock()
+        self._leases: dict[str, Lease] = {}
+        # One sequence for all threads keeps tokens increasing per thread
+        self._tokens = itertools.count(1)
+        self._sequences: dict[str, _Sequence] = {}
+        self._seen: OrderedDict[str, None] = OrderedDict()
+
+    def admit(self, thread_id: str, message_id: str) -> int | None:
+        """Sequence number of a new message of the thread (None when already seen)."""
+        with self._lock:
+            if message_id:
+                if message_id in self._seen:
+                    return None
+                self._seen[message_id] = None
+                if len(self._seen) > 10_000:
+                    self._seen.popitem(last=False)
+            sequence = self._sequences.setdefault(thread_id, _Sequence())
+            if sequence.next_seq <= sequence.answered_seq:
+                sequence.progress_at = time.time()
+            sequence.next_seq += 1
+            return sequence.next_seq
+
+    def forget(self, thread_id: str, message_id: str, seq: int) -> None:
+        """Undo `admit` for a message that was not accepted after all."""
+        with self._lock:
+            self._seen.pop(message_id, None)
+            sequence = self._sequences.get(thread_id)
+            if sequence is not None and sequence.next_seq == seq:
+                sequence.next_seq -= 1
+
+    def try_acquire(self, thread_id: str, seq: int | None = None) -> Lease | None:
+        """Take the lease if it is free or expired and ``seq`` is next in line."""
+        now = time.time()
+        with self._lock:
+            current = self._leases.get(thread_id)
+            if current is not None and current.expires_at > now:
+                return None
+            sequence = self._sequences.get(thread_id, _Sequence())
+            if seq is not None and sequence.waits_for_earlier(seq, now, self.ttl):
+                return None
+            lease = Lease(
+                thread_id,
+                self.owner,
+                next(self._tokens),
+                now + self.ttl,
+                sequence.answered_seq,
+            )
+            self._leases[thread_id] = lease
+            return lease
+
+    def renew(self, lease: Lease) -> Lease | None:
+        """Extend a lease still held (None when it was lost)."""
+        now = time.time()
+        with self._lock:
+            current = self._leases.get(lease.thread_id)
+            if current != lease or current.expires_at <= now:
+                return None
+            renewed = replace(lease, expires_at=now + self.ttl)
+            self._leases[lease.thread_id] = renewed
+            return renewed
+
+    def release(self, lease: Lease, answered: int | None = None) -> None:
+        """Give up a lease, recording messages up to ``answered`` as answered."""
+        with self._lock:
+            current = self._leases.get(lease.thread_id)
+            if current is None or current.token != lease.token:
+                return
+            del self._leases[lease.thread_id]
+            sequence = self._sequences.get(lease.thread_id)
+            if answered is not None and sequence is not None:
+                sequence.answered_seq = max(sequence.answered_seq, answered)
+                sequence.progress_at = time.time()
+
+    def current_token(self, thread_id: str) -> int | None:
+        """Token of the unexpired lease of a thread, if any."""
+        with self._lock:
+            current = self._leases.get(thread_id)
+        if current is None or current.expires_at <= time.time():
+            return None
+        return current.token
+
+
+class SQLiteLeases(LeaseManager):
+    """Leases shared by the processes of one host through a SQLite file.
+
+    Acquisition is a ``BEGIN IMMEDIATE`` transaction, so exactly one process
+    wins a free lease. Rows stay after release, which keeps the fencing
+    token of a thread increasing across owners. Seen message ids are kept
+    for `DEDUP_WINDOW`.
+    """
+
+    def __init__(
+        self, path: str | Path, *, ttl: float = 30.0, owner: str | None = None
+    ) -> None:
+        """Share the leases through the SQLite file at ``path``."""
+        super().__init__(ttl=ttl, owner=owner)
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            self.path, check_same_thread=False, isolation_level=None, timeout=5.0
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    async def _call(self, fn: Callable[..., Any], *args: Any) -> Any:
+        return await asyncio.to_thread(fn, *args)
+
+    def admit(self, thread_id: str, message_id: str) -> int | None:
+        """Sequence number of a new message of the thread (None when already seen)."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if message_id:
+                    self._conn.execute(
+                        "DELETE FROM seen WHERE seen_at < ?", (now - DEDUP_WINDOW,)
+                    )
+                    inserted = self._conn.execute(
+                        "INSERT OR IGNORE INTO seen (message_id, seen_at) VALUES (?, ?)",
+                        (message_id, now),
+                    ).rowcount
+                    if not inserted:
+                        self._conn.execute("ROLLBACK")
+                        return None
+                # The clock of an idle thread starts with its new message
+                self._conn.execute(
+                    "INSERT INTO threads (thread_id, next_seq, answered_seq, progress_at) "
+                    "VALUES (?, 1, 0, ?) ON CONFLICT (thread_id) DO UPDATE SET "
+                    "next_seq = next_seq + 1, progress_at = CASE "
+                    "WHEN next_seq <= answered_seq THEN excluded.progress_at "
+                    "ELSE progress_at END",
+                    (thread_id, now),
+                )
+                seq: int = self._conn.execute(
+                    "SELECT next_seq FROM threads WHERE thread_id = ?", (thread_id,)
+                ).fetchone()[0]
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return seq
+
+    def forget(self, thread_id: str, message_id: str, seq: int) -> None:
+        """Undo `admit` for a message that was not accepted after all."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM seen WHERE message_id = ?", (message_id,))
+                self._conn.execute(
+                    "UPDATE threads SET next_seq = next_seq - 1 "
+                    "WHERE thread_id = ? AND next_seq = ?",
+                    (thread_id, seq),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def try_acquire(self, thread_id: str, seq: int | None = None) -> Lease | None:
+        """Take the lease if it is free or expired and ``seq`` is next in line."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = self._conn.execute(
+                    "SELECT owner, token, expires_at FROM leases WHERE thread_id = ?",
+                    (thread_id,),
+                ).fetchone()
+                if row is not None and row[0] is not None and row[2] > now:
+                    self._conn.execute("ROLLBACK")
+                    return None
+                progress = self._conn.execute(
+                    "SELECT next_seq, answered_seq, progress_at FROM threads "
+                    "WHERE thread_id = ?",
+                    (thread_id,),
+                ).fetchone()
+                sequence = _Sequence(*progress) if progress else _Sequence()
+                if seq is not None and sequence.waits_for_earlier(seq, now, self.ttl):
+                    self._conn.execute("ROLLBACK")
+                    return None
+                token = row[1] + 1 if row is not None else 1
+                self._conn.execute(
+                    "INSERT INTO leases (thread_id, owner, token, expires_at) "
+                    "VALUES (?, ?, ?, ?) ON CONFLICT (thread_id) DO UPDATE SET "
+                    "owner = excluded.owner, token = excluded.token, "
+                    "expires_at = excluded.expires_at",
+                    (thread_id, self.owner, token, now + self.ttl),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return Lease(thread_id, self.owner, token, now + self.ttl, sequence.answered_seq)
+
+    def renew(self, lease: Lease) -> Lease | None:
+        """Extend a lease still held (None when it was lost)."""
+        now = time.time()
+        with self._lock:
+            updated = self._conn.execute(
+                "UPDATE leases SET expires_at = ? WHERE thread_id = ? AND owner = ? "
+                "AND token = ? AND expires_at > ?",
+                (now + self.ttl, lease.thread_id, lease.owner, lease.token, now),
+            ).rowcount
+        if not updated:
+            return None
+        return replace(lease, expires_at=now + self.ttl)
+
+    def release(self, lease: Lease, answered: int | None = None) -> None:
+        """Give up a lease, recording messages up to ``answered`` as answered."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                released = self._conn.execute(
+                    "UPDATE leases SET owner = NULL, expires_at = 0 "
+                    "WHERE thread_id = ? AND owner = ? AND token = ?",
+                    (lease.thread_id, lease.owner, lease.token),
+                ).rowcount
+                if released and answered is not None:
+                    self._conn.execute(
+                        "UPDATE threads SET answered_seq = MAX(answered_seq, ?), "
+                        "progress_at = ? WHERE thread_id = ?",
+                        (answered, time.time(), lease.thread_id),
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def current_token(self, thread_id: str) -> int | None:
+        """Token of the unexpired lease of a thread, if any."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT token FROM leases WHERE thread_id = ? AND owner IS NOT NULL "
+                "AND expires_at > ?",
+                (thread_id, time.time()),
+            ).fetchone()
+        return row[0] if row else None
+
+    def close(self) -> None:
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
+
+
+def lease_manager_from_env() -> LeaseManager:
+    """Lease manager configured by ``SKIDEAL_LEASE_PATH``/``SKIDEAL_LEASE_TTL``."""
+    ttl = float(os.environ.get("SKIDEAL_LEASE_TTL", "30"))
+    path = os.environ.get("SKIDEAL_LEASE_PATH", "").strip()
+    if path:
+        return SQLiteLeases(path, ttl=ttl)
+    return InProcessLeases(ttl=ttl)
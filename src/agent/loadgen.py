@@ -0,0 +1,348 @@
+"""SkiDeal Bot - Load generator simulating concurrent WhatsApp customers.
+
+Drives the production path - `ConversationDispatcher` around the agent graph -
+with N simulated customers. Each customer replays a multi-turn conversation
+(the benchmark scenarios by default, or recorded ones from a JSONL file),
+pausing for a random think time between messages. The model is a local
+`FakeChatModel` with log-normally distributed latency, so a run costs nothing
+and needs no network; tools run for real against the local catalog.
+
+The report answers "how many simultaneous conversations can one worker
+hold": throughput, p50/p95/p99 turn latency, queueing before a run gets a
+concurrency slot, and memory growth per conversation thread (resident set
+size by default; ``--trace-memory`` measures the Python heap with
+tracemalloc instead, which is exact but slows the run down about 3x).
+Handoffs go to a throwaway outbox.
+
+Usage:
+    python -m agent.loadgen --customers 200 --concurrency 32 --model-latency 1.5
+    python -m agent.loadgen --conversations recorded.jsonl --think-time 8
+
+Recorded conversations are JSONL, one conversation per line: either a list of
+customer messages or ``{"messages": [...]}``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Sequence
+
+from langgraph.checkpoint.memory import InMemorySaver
+
+from agent.benchmark import SCENARIOS, ScriptedResponder, scratch_outbox
+from agent.fakes import FakeChatModel, echo_responder
+from agent.server import FALLBACK_REPLY, ConversationDispatcher, InboundMessage
+
+
+@dataclass
+class LoadProfile:
+    """Shape of a load test run."""
+
+    customers: int = 50
+    # Customers start evenly spread over this many seconds
+    ramp_up: float = 5.0
+    # Mean seconds a customer waits before each message (exponential)
+    think_time: float = 3.0
+    # Median seconds per fake model call (log-normal) and its spread
+    model_latency: float = 1.0
+    model_latency_sigma: float = 0.5
+    max_concurrency: int = 32
+    max_pending: int = 1000
+    # Measure the Python heap with tracemalloc instead of the resident set size
+    trace_memory: bool = False
+    seed: int | None = None
+
+
+@dataclass
+class LoadReport:
+    """Results of a load test run."""
+
+    customers: int
+    turns: int
+    errors: int
+    # Messages refused by a saturated dispatcher (retried by the customer)
+    rejected: int
+    duration: float
+    throughput: float
+    latency: dict[str, float]
+    queue_wait: dict[str, float]
+    max_pending: int
+    max_running: int
+    memory: dict[str, float] = field(default_factory=dict)
+
+    def format(self) -> str:
+        """Render the report as plain text."""
+
+        def dist(d: dict[str, float]) -> str:
+            return " ".join(f"{k} {v * 1000:.0f}ms" for k, v in d.items())
+
+        lines = [
+            f"customers {self.customers} | turns {self.turns} | errors {self.errors}"
+            f" | rejected {self.rejected}",
+            f"duration {self.duration:.1f}s | throughput {self.throughput:.2f} turns/s",
+            f"turn latency: {dist(self.latency)}",
+            f"queue wait:   {dist(self.queue_wait)}",
+            f"max pending {self.max_pending} | max concurrent runs {self.max_running}",
+        ]
+        if self.memory:
+            m = self.memory
+            line = (
+                f"memory ({'heap' if 'peak_kb' in m else 'rss'}): "
+                f"+{m['growth_kb']:.0f}KB, {m['per_thread_kb']:.1f}KB per thread"
+            )
+            if "peak_kb" in m:
+                line += (
+                    f", peak +{m['peak_kb']:.0f}KB "
+                    f"({m['peak_per_active_thread_kb']:.1f}KB per active thread)"
+                )
+            lines.append(line)
+        return "\n".join(lines)
+
+
+def _distribution(samples: list[float]) -> dict[str, float]:
+    samples = sorted(samples)
+
+    def percentile(p: float) -> float:
+        if not samples:
+            return 0.0
+        return samples[min(len(samples) - 1, int(p * len(samples)))]
+
+    return {
+        "p50": round(percentile(0.50), 4),
+        "p95": round(percentile(0.95), 4),
+        "p99": round(percentile(0.99), 4),
+        "max": round(samples[-1], 4) if samples else 0.0,
+    }
+
+
+def _rss_kb() -> float:
+    """Measure the resident set size in KB (peak RSS where /proc is unavailable)."""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * (os.sysconf("SC_PAGE_SIZE") / 1024)
+    except (OSError, ValueError, IndexError):
+        import resource
+
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 1024 if sys.platform == "darwin" else float(peak)
+
+
+def default_conversations() -> list[list[str]]:
+    """Return the customer messages of the benchmark scenarios."""
+    return [[turn.customer for turn in s.turns] for s in SCENARIOS]
+
+
+def load_conversations(path: Path) -> list[list[str]]:
+    """Load recorded conversations from JSONL."""
+    conversations = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            messages = record["messages"] if isinstance(record, dict) else record
+            conversations.append([str(m) for m in messages])
+    return conversations
+
+
+class _Inbox:
+    """WhatsApp sender that hands replies back to the simulated customers."""
+
+    def __init__(self) -> None:
+        self._queues: dict[str, asyncio.Queue[str]] = {}
+
+    def queue(self, customer: str) -> asyncio.Queue[str]:
+        return self._queues.setdefault(customer, asyncio.Queue())
+
+    async def send(self, to: str, text: str) -> None:
+        self.queue(to).put_nowait(text)
+
+
+class _TimedGraph:
+    """Graph proxy recording when each thread's run got a concurrency slot."""
+
+    def __init__(self, graph: Any) -> None:
+        self.graph = graph
+        self.started: dict[str, float] = {}
+        self.running = 0
+
+    async def ainvoke(self, input: Any, config: dict[str, Any]) -> Any:
+        self.started[config["configurable"]["thread_id"]] = time.monotonic()
+        self.running += 1
+        try:
+            return await self.graph.ainvoke(input, config)
+        finally:
+            self.running -= 1
+
+
+def make_load_graph(profile: LoadProfile, rng: random.Random) -> Any:
+    """Agent graph with a scripted fake model of the profile's latency."""
+    from agent.graph import make_graph
+
+    mu = math.log(profile.model_latency) if profile.model_latency > 0 else None
+
+    def latency() -> float:
+        return rng.lognormvariate(mu, profile.model_latency_sigma) if mu is not None else 0.0
+
+    model = FakeChatModel(
+        responder=ScriptedResponder(*SCENARIOS, fallback=echo_responder),
+        latency=latency,
+    )
+    return make_graph(model, checkpointer=InMemorySaver())
+
+
+async def run_load(
+    profile: LoadProfile,
+    conversations: Sequence[Sequence[str]] | None = None,
+    *,
+    graph: Any = None,
+) -> LoadReport:
+    """Run ``profile.customers`` simulated customers against the dispatcher."""
+    rng = random.Random(profile.seed)
+    conversations = conversations or default_conversations()
+    timed = _TimedGraph(graph or make_load_graph(profile, rng))
+    inbox = _Inbox()
+    dispatcher = ConversationDispatcher(
+        timed,  # type: ignore[arg-type]
+        inbox,
+        max_concurrency=profile.max_concurrency,
+        max_pending=profile.max_pending,
+    )
+    latencies: list[float] = []
+    waits: list[float] = []
+    counts = {"errors": 0, "rejected": 0, "max_pending": 0, "max_running": 0}
+
+    async def customer(index: int, conversation: Sequence[str]) -> None:
+        await asyncio.sleep(profile.ramp_up * index / max(1, profile.customers))
+        sender = f"load-{index:05d}"
+        thread_id = f"whatsapp:{sender}"
+        replies = inbox.queue(sender)
+        for text in conversation:
+            if profile.think_time > 0:
+                await asyncio.sleep(rng.expovariate(1 / profile.think_time))
+            submitted = time.monotonic()
+            while not dispatcher.submit(InboundMessage(thread_id, sender, text)):
+                counts["rejected"] += 1
+                await asyncio.sleep(0.5)
+            reply = await replies.get()
+            latencies.append(time.monotonic() - submitted)
+            waits.append(max(0.0, timed.started.get(thread_id, submitted) - submitted))
+            if reply == FALLBACK_REPLY:
+                counts["errors"] += 1
+
+    async def sample() -> None:
+        while True:
+            counts["max_pending"] = max(counts["max_pending"], dispatcher.pending)
+            counts["max_running"] = max(counts["max_running"], timed.running)
+            await asyncio.sleep(0.05)
+
+    tracing = profile.trace_memory and not tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.start()
+    if profile.trace_memory:
+        tracemalloc.reset_peak()
+        memory_start = tracemalloc.get_traced_memory()[0] / 1024
+    else:
+        memory_start = _rss_kb()
+
+    start = time.monotonic()
+    sampler = asyncio.create_task(sample())
+    try:
+        with scratch_outbox():
+            await asyncio.gather(
+                *(
+                    customer(i, conversations[i % len(conversations)])
+                    for i in range(profile.customers)
+                )
+            )
+            await dispatcher.join()
+    finally:
+        sampler.cancel()
+    duration = time.monotonic() - start
+
+    # Conversation state stays in the checkpointer, so growth is what the
+    # threads still hold after the run
+    threads = max(1, profile.customers)
+    if profile.trace_memory:
+        current, peak = (v / 1024 for v in tracemalloc.get_traced_memory())
+        if tracing:
+            tracemalloc.stop()
+        active = max(1, min(profile.customers, profile.max_concurrency))
+        memory = {
+            "growth_kb": current - memory_start,
+            "per_thread_kb": (current - memory_start) / threads,
+            "peak_kb": peak - memory_start,
+            "peak_per_active_thread_kb": (peak - memory_start) / active,
+        }
+    else:
+        growth = _rss_kb() - memory_start
+        memory = {"growth_kb": growth, "per_thread_kb": growth / threads}
+
+    return LoadReport(
+        customers=profile.customers,
+        turns=len(latencies),
+        errors=counts["errors"],
+        rejected=counts["rejected"],
+        duration=round(duration, 3),
+        throughput=round(len(latencies) / duration, 3) if duration else 0.0,
+        latency=_distribution(latencies),
+        queue_wait=_distribution(waits),
+        max_pending=counts["max_pending"],
+        max_running=counts["max_running"],
+        memory={k: round(v, 1) for k, v in memory.items()},
+    )
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    """Command-line entry point."""
+    defaults = LoadProfile()
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--customers", type=int, default=defaults.customers)
+    parser.add_argument("--ramp-up", type=float, default=defaults.ramp_up)
+    parser.add_argument("--think-time", type=float, default=defaults.think_time)
+    parser.add_argument("--model-latency", type=float, default=defaults.model_latency)
+    parser.add_argument(
+        "--model-latency-sigma", type=float, default=defaults.model_latency_sigma
+    )
+    parser.add_argument("--concurrency", type=int, default=defaults.max_concurrency)
+    parser.add_argument("--max-pending", type=int, default=defaults.max_pending)
+    parser.add_argument("--conversations", type=Path, help="recorded conversations (JSONL)")
+    parser.add_argument(
+        "--trace-memory", action="store_true", help="measure the heap with tracemalloc"
+    )
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    profile = LoadProfile(
+        customers=args.customers,
+        ramp_up=args.ramp_up,
+        think_time=args.think_time,
+        model_latency=args.model_latency,
+        model_latency_sigma=args.model_latency_sigma,
+        max_concurrency=args.concurrency,
+        max_pending=args.max_pending,
+        trace_memory=args.trace_memory,
+        seed=args.seed,
+    )
+    conversations = load_conversations(args.conversations) if args.conversations else None
+    report = asyncio.run(run_load(profile, conversations))
+    sys.stdout.write(
+        (json.dumps(asdict(report), indent=2) if args.json else report.format()) + "\n"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
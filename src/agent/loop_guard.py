@@ -0,0 +1,172 @@
+"""SkiDeal Bot - Tool-loop guard.
+
+Every ReAct iteration is a full model round trip, and nothing in the agent
+loop itself stops the model from asking for the same hotel under a bad name
+again and again, or from cycling between two tools. `LoopGuard` runs as the
+graph's post-model hook, after each model call and before any tool runs, and
+looks at the current turn (everything since the last customer message):
+
+- a call identical to one already answered in this turn (same tool and
+  normalized arguments) is not run again; it gets a short tool result
+  pointing to the earlier answer,
+- when the turn is over its tool-step budget, repeats a call that failed
+  ("לא נמצא...", "שגיאה: ..."), or calls a tool that already failed
+  ``max_failures`` times, the model's tool calls are dropped and the turn
+  ends with a graceful answer that offers a handoff to an agent.
+
+Configuration (environment variables):
+    SKIDEAL_MAX_TOOL_STEPS: Model calls with tool calls per turn (default: 5)
+    SKIDEAL_MAX_TOOL_FAILURES: Failed results per tool and turn (default: 2)
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Sequence
+
+from langchain_core.messages import (
+    AIMessage,
+    AnyMessage,
+    HumanMessage,
+    ToolCall,
+    ToolMessage,
+)
+
+logger = logging.getLogger(__name__)
+
+FINAL_REPLY = (
+    "מצטערת, לא הצלחתי למצוא את המידע הזה במערכת כרגע 🙏🏻 "
+    "אפשר לנסח את השאלה אחרת, או שאעביר אותה לנציג שיחזור אליך עם תשובה מדויקת - "
+    "רק צריך שם ומספר טלפון."
+)
+REPEATED_RESULT = "הקריאה הזו כבר בוצעה בתור הזה - התשובה שלה מופיעה למעלה."
+# Result prefixes of the tools for "nothing found" and bad arguments
+_FAILURE_PREFIXES = ("לא נמצא", "שגיאה")
+
+
+@dataclass(frozen=True)
+class LoopLimits:
+    """Per-turn limits of the tool loop."""
+
+    max_tool_steps: int = 5
+    max_failures: int = 2
+
+    @classmethod
+    def from_env(cls) -> LoopLimits:
+        """Limits configured by ``SKIDEAL_MAX_TOOL_STEPS``/``SKIDEAL_MAX_TOOL_FAILURES``."""
+        return cls(
+            max_tool_steps=int(os.environ.get("SKIDEAL_MAX_TOOL_STEPS", "5")),
+            max_failures=int(os.environ.get("SKIDEAL_MAX_TOOL_FAILURES", "2")),
+        )
+
+
+def call_key(name: str, args: dict[str, Any]) -> str:
+    """Identify a tool call by tool and normalized arguments.
+
+    Strings are compared trimmed and case-insensitively and unset (None)
+    arguments are ignored, so ``{"hotel_name": "Alaska "}`` and
+    ``{"hotel_name": "alaska", "resort": None}`` are the same call.
+    """
+
+    def normalize(value: Any) -> Any:
+        if isinstance(value, str):
+            return value.strip().lower()
+        if isinstance(value, list):
+            return [normalize(v) for v in value]
+        if isinstance(value, dict):
+            return {k: normalize(v) for k, v in value.items() if v is not None}
+        return value
+
+    return f"{name}:{json.dumps(normalize(args), sort_keys=True, ensure_ascii=False)}"
+
+
+def is_failed_result(message: ToolMessage) -> bool:
+    """Whether a tool result is an error or a "nothing found" answer."""
+    return message.status == "error" or message.text.lstrip().startswith(_FAILURE_PREFIXES)
+
+
+def current_turn(messages: Sequence[AnyMessage]) -> Sequence[AnyMessage]:
+    """Messages after the last customer message."""
+    for index in range(len(messages) - 1, -1, -1):
+        if isinstance(messages[index], HumanMessage):
+            return messages[index + 1 :]
+    return messages
+
+
+class LoopGuard:
+    """Post-model hook enforcing `LoopLimits` on the current turn."""
+
+    def __init__(self, limits: LoopLimits | None = None) -> None:
+        """Enforce ``limits`` (default: from the environment)."""
+        self.limits = limits or LoopLimits.from_env()
+        self.trips: Counter[str] = Counter()
+
+    def check(self, messages: Sequence[AnyMessage]) -> tuple[str | None, list[ToolCall]]:
+        """Why the last model call must end the turn (or None), and its repeated calls."""
+        turn = current_turn(messages)
+        last = turn[-1] if turn else None
+        if not isinstance(last, AIMessage) or not last.tool_calls:
+            return None, []
+        steps = sum(isinstance(m, AIMessage) and bool(m.tool_calls) for m in turn)
+        if steps > self.limits.max_tool_steps:
+            return "step_budget", []
+
+        calls: dict[str, str] = {}
+        for message in turn[:-1]:
+            if isinstance(message, AIMessage):
+                calls.update(
+                    (c["id"], call_key(c["name"], c["args"]))
+                    for c in message.tool_calls
+                    # A call without an id can't be matched to its result
+                    if c["id"] is not None
+                )
+        answered: dict[str, bool] = {}
+        failures: Counter[str] = Counter()
+        for message in turn:
+            if isinstance(message, ToolMessage) and message.tool_call_id in calls:
+                failed = is_failed_result(message)
+                answered[calls[message.tool_call_id]] = failed
+                if failed:
+                    failures[message.name or ""] += 1
+
+        repeated: list[ToolCall] = []
+        for call in last.tool_calls:
+            key = call_key(call["name"], call["args"])
+            if answered.get(key):
+                return "repeated_failure", []
+            if failures[call["name"]] >= self.limits.max_failures:
+                return "failing_tool", []
+            if key in answered and call["id"] is not None:
+                repeated.append(call)
+        return None, repeated
+
+    def __call__(self, state: dict[str, Any]) -> dict[str, Any]:
+        """Post-model hook: answer repeated calls or finalize the turn."""
+        messages = state["messages"]
+        reason, repeated = self.check(messages)
+        if reason is not None:
+            self.trips[reason] += 1
+            logger.warning("Tool loop guard ended a turn: %s", reason)
+            last = messages[-1]
+            final = last.model_copy(
+                update={
+                    "content": FINAL_REPLY,
+                    "tool_calls": [],
+                    "invalid_tool_calls": [],
+                    "response_metadata": {**last.response_metadata, "loop_guard": reason},
+                }
+            )
+            return {"messages": [final]}
+        if repeated:
+            self.trips["repeated_call"] += len(repeated)
+            return {
+                "messages": [
+                    ToolMessage(REPEATED_RESULT, tool_call_id=call["id"], name=call["name"])
+                    for call in repeated
+                ]
+            }
+        return {}
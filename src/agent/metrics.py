@@ -0,0 +1,374 @@
+"""SkiDeal Bot - Tool call instrumentation.
+
+Every tool the agent runs goes through `ToolInstrumentation`, installed as the
+`ToolNode` call wrapper in `agent.graph`. Each call becomes a `ToolCallEvent`
+(tool, thread, latency, error, argument shape, output bytes and estimated
+tokens) that is handed to the configured sinks:
+
+- `MetricsRegistry`: in-process counters and latency histograms per tool and
+  per thread, rendered as Prometheus text on the server's ``/metrics``,
+- `JsonLogSink`: one JSON log line per call, for log-based pipelines.
+
+Recording is a couple of dict updates under a lock, cheap enough to leave on
+in production. Per-thread stats are kept for the most recent threads only.
+The registry also exports the queue wait of model calls admitted by
+`agent.admission`.
+
+Configuration (environment variables):
+    SKIDEAL_TOOL_METRICS: Set to 0 to disable tool instrumentation
+    SKIDEAL_TOOL_METRICS_LOG: Set to 1 to also log every tool call as JSON
+"""
+
+from __future__ import annotations
+
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import Any, Awaitable, Callable, Protocol, Sequence
+
+from langchain_core.messages import ToolMessage
+from langgraph.prebuilt.tool_node import ToolCallRequest
+from langgraph.types import Command
+
+from agent.admission import CHARS_PER_TOKEN
+from agent.profiling import record_phase
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds for tool latency, in seconds
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Histogram bucket upper bounds for the model admission queue wait, in seconds
+ADMISSION_WAIT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+ToolResult = ToolMessage | Command[Any]
+
+
+@dataclass
+class ToolCallEvent:
+    """One finished tool call."""
+
+    tool: str
+    thread_id: str
+    duration: float
+    error: bool
+    # Argument names and value types, e.g. "child_age:float,resorts:list"
+    arg_shape: str
+    output_bytes: int
+    output_tokens: int
+
+
+class MetricsSink(Protocol):
+    """Receives tool call events."""
+
+    def record(self, event: ToolCallEvent) -> None:
+        """Record one tool call."""
+        ...
+
+
+def arg_shape(args: dict[str, Any]) -> str:
+    """Describe tool arguments by name and type, never by value."""
+    return ",".join(f"{k}:{type(v).__name__}" for k, v in sorted(args.items()))
+
+
+class Histogram:
+    """Fixed-bucket histogram (Prometheus style)."""
+
+    def __init__(self, bounds: Sequence[float] = LATENCY_BUCKETS) -> None:
+        """Create an empty histogram with the given bucket upper bounds."""
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        """Add one observation."""
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> list[tuple[str, int]]:
+        """``(le, count)`` pairs including ``+Inf``."""
+        pairs, running = [], 0
+        for bound, count in zip((*map(str, self.bounds), "+Inf"), self.counts):
+            running += count
+            pairs.append((bound, running))
+        return pairs
+
+    def quantile(self, q: float) -> float | None:
+        """Upper bound of the bucket holding the ``q`` quantile."""
+        if not self.count:
+            return None
+        target, running = q * self.count, 0
+        for bound, count in zip(self.bounds, self.counts):
+            running += count
+            if running >= target:
+                return bound
+        return float("inf")
+
+
+@dataclass
+class ToolStats:
+    """Aggregated calls of one tool."""
+
+    calls: int = 0
+    errors: int = 0
+    output_bytes: int = 0
+    output_tokens: int = 0
+    latency: Histogram = field(default_factory=Histogram)
+    arg_shapes: dict[str, int] = field(default_factory=dict)
+
+    def add(self, event: ToolCallEvent) -> None:
+        """Add one tool call."""
+        self.calls += 1
+        self.errors += event.error
+        self.output_bytes += event.output_bytes
+        self.output_tokens += event.output_tokens
+        self.latency.observe(event.duration)
+        self.arg_shapes[event.arg_shape] = self.arg_shapes.get(event.arg_shape, 0) + 1
+
+    def summary(self) -> dict[str, Any]:
+        """Summarize calls, errors, output size and latency percentiles."""
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "output_bytes": self.output_bytes,
+            "output_tokens": self.output_tokens,
+            "latency_seconds": {
+                "sum": round(self.latency.sum, 6),
+                "p50": self.latency.quantile(0.50),
+                "p95": self.latency.quantile(0.95),
+            },
+            "arg_shapes": dict(self.arg_shapes),
+        }
+
+
+class MetricsRegistry:
+    """In-process tool metrics, per tool and per (recent) thread."""
+
+    def __init__(self, max_threads: int = 1000) -> None:
+        """Keep per-thread stats for the ``max_threads`` most recent threads."""
+        self.max_threads = max_threads
+        self._lock = threading.Lock()
+        self._tools: dict[str, ToolStats] = {}
+        self._threads: OrderedDict[str, dict[str, ToolStats]] = OrderedDict()
+        self._admission_wait = Histogram(ADMISSION_WAIT_BUCKETS)
+        self._admission_depth = 0
+
+    def record(self, event: ToolCallEvent) -> None:
+        """Add a tool call to the tool and thread aggregates."""
+        with self._lock:
+            stats = self._tools.get(event.tool)
+            if stats is None:
+                stats = self._tools[event.tool] = ToolStats()
+            stats.add(event)
+
+            thread = self._threads.get(event.thread_id)
+            if thread is None:
+                thread = self._threads[event.thread_id] = {}
+                if len(self._threads) > self.max_threads:
+                    self._threads.popitem(last=False)
+            else:
+                self._threads.move_to_end(event.thread_id)
+            thread_stats = thread.get(event.tool)
+            if thread_stats is None:
+                thread_stats = thread[event.tool] = ToolStats()
+            thread_stats.add(event)
+
+    def observe_admission(self, waited: float, queue_depth: int) -> None:
+        """Record the queue wait of an admitted model call and the queue left behind."""
+        with self._lock:
+            self._admission_wait.observe(waited)
+            self._admission_depth = queue_depth
+
+    def snapshot(self) -> dict[str, dict[str, Any]]:
+        """Per-tool summaries."""
+        with self._lock:
+            return {name: s.summary() for name, s in sorted(self._tools.items())}
+
+    def thread_snapshot(self, thread_id: str) -> dict[str, dict[str, Any]]:
+        """Per-tool summaries for one thread ({} if unknown or evicted)."""
+        with self._lock:
+            thread = self._threads.get(thread_id, {})
+            return {name: s.summary() for name, s in sorted(thread.items())}
+
+    def render_prometheus(self) -> str:
+        """Render per-tool metrics in the Prometheus text exposition format.
+
+        Per-thread stats are left out to keep label cardinality bounded.
+        """
+        with self._lock:
+            tools = sorted(self._tools.items())
+            lines = [
+                "# HELP skideal_tool_calls_total Tool calls.",
+                "# TYPE skideal_tool_calls_total counter",
+                *(f'skideal_tool_calls_total{{tool="{n}"}} {s.calls}' for n, s in tools),
+                "# HELP skideal_tool_errors_total Tool calls that failed.",
+                "# TYPE skideal_tool_errors_total counter",
+                *(f'skideal_tool_errors_total{{tool="{n}"}} {s.errors}' for n, s in tools),
+                "# HELP skideal_tool_output_bytes_total Bytes of tool output added to the context.",
+                "# TYPE skideal_tool_output_bytes_total counter",
+                *(
+                    f'skideal_tool_output_bytes_total{{tool="{n}"}} {s.output_bytes}'
+                    for n, s in tools
+                ),
+                "# HELP skideal_tool_output_tokens_total Estimated tokens of tool output.",
+                "# TYPE skideal_tool_output_tokens_total counter",
+                *(
+                    f'skideal_tool_output_tokens_total{{tool="{n}"}} {s.output_tokens}'
+                    for n, s in tools
+                ),
+                "# HELP skideal_tool_arg_shapes_total Tool calls by argument shape.",
+                "# TYPE skideal_tool_arg_shapes_total counter",
+            ]
+            for name, stats in tools:
+                for shape, count in sorted(stats.arg_shapes.items()):
+                    lines.append(
+                        f'skideal_tool_arg_shapes_total{{tool="{name}",shape="{shape}"}} {count}'
+                    )
+            lines += [
+                "# HELP skideal_tool_latency_seconds Tool call latency.",
+                "# TYPE skideal_tool_latency_seconds histogram",
+            ]
+            for name, stats in tools:
+                for le, count in stats.latency.cumulative():
+                    lines.append(
+                        f'skideal_tool_latency_seconds_bucket{{tool="{name}",le="{le}"}} {count}'
+                    )
+                lines.append(
+                    f'skideal_tool_latency_seconds_sum{{tool="{name}"}} {stats.latency.sum:.6f}'
+                )
+                lines.append(
+                    f'skideal_tool_latency_seconds_count{{tool="{name}"}} {stats.latency.count}'
+                )
+            wait = self._admission_wait
+            if wait.count:
+                lines += [
+                    "# HELP skideal_model_admission_wait_seconds Queue wait of admitted model calls.",
+                    "# TYPE skideal_model_admission_wait_seconds histogram",
+                    *(
+                        f'skideal_model_admission_wait_seconds_bucket{{le="{le}"}} {count}'
+                        for le, count in wait.cumulative()
+                    ),
+                    f"skideal_model_admission_wait_seconds_sum {wait.sum:.6f}",
+                    f"skideal_model_admission_wait_seconds_count {wait.count}",
+                    "# HELP skideal_model_admission_queue_depth Model calls waiting for admission.",
+                    "# TYPE skideal_model_admission_queue_depth gauge",
+                    f"skideal_model_admission_queue_depth {self._admission_depth}",
+                ]
+        return "\n".join(lines) + "\n"
+
+
+class JsonLogSink:
+    """Logs every tool call as one JSON line."""
+
+    def __init__(self, log: logging.Logger | None = None) -> None:
+        """Log to ``log`` (default: the ``agent.metrics.tools`` logger)."""
+        self.log = log or logging.getLogger("agent.metrics.tools")
+
+    def record(self, event: ToolCallEvent) -> None:
+        """Log the event."""
+        if self.log.isEnabledFor(logging.INFO):
+            self.log.info(json.dumps(asdict(event), ensure_ascii=False))
+
+
+# ============================================================================
+# TOOL WRAPPER
+# ============================================================================
+
+
+def _output_size(result: ToolResult) -> tuple[int, int, bool]:
+    """Output bytes, estimated tokens and error flag of a tool result."""
+    if not isinstance(result, ToolMessage):
+        return 0, 0, False
+    content = result.content
+    if not isinstance(content, str):
+        content = json.dumps(content, ensure_ascii=False, default=str)
+    return len(content.encode()), len(content) // CHARS_PER_TOKEN, result.status == "error"
+
+
+class ToolInstrumentation:
+    """`ToolNode` wrapper that reports every tool call to the sinks."""
+
+    def __init__(self, sinks: Sequence[MetricsSink]) -> None:
+        """Report to every sink in ``sinks``."""
+        self.sinks = list(sinks)
+
+    def _emit(
+        self, request: ToolCallRequest, start: float, result: ToolResult | None
+    ) -> None:
+        duration = time.perf_counter() - start
+        record_phase("tools", duration)
+        output_bytes, output_tokens, error = (
+            _output_size(result) if result is not None else (0, 0, True)
+        )
+        config = getattr(request.runtime, "config", None) or {}
+        event = ToolCallEvent(
+            tool=request.tool_call["name"],
+            thread_id=str(config.get("configurable", {}).get("thread_id", "")),
+            duration=duration,
+            error=error,
+            arg_shape=arg_shape(request.tool_call.get("args") or {}),
+            output_bytes=output_bytes,
+            output_tokens=output_tokens,
+        )
+        for sink in self.sinks:
+            try:
+                sink.record(event)
+            except Exception:
+                logger.exception("Tool metrics sink %r failed", sink)
+
+    def wrap(
+        self,
+        request: ToolCallRequest,
+        execute: Callable[[ToolCallRequest], ToolResult],
+    ) -> ToolResult:
+        """Run a tool call and record it (``wrap_tool_call``)."""
+        start = time.perf_counter()
+        result: ToolResult | None = None
+        try:
+            result = execute(request)
+            return result
+        finally:
+            self._emit(request, start, result)
+
+    async def awrap(
+        self,
+        request: ToolCallRequest,
+        execute: Callable[[ToolCallRequest], Awaitable[ToolResult]],
+    ) -> ToolResult:
+        """Async variant of `wrap` (``awrap_tool_call``)."""
+        start = time.perf_counter()
+        result: ToolResult | None = None
+        try:
+            result = await execute(request)
+            return result
+        finally:
+            self._emit(request, start, result)
+
+
+# ============================================================================
+# PROCESS-WIDE REGISTRY
+# ============================================================================
+
+_registry = MetricsRegistry()
+
+
+def get_metrics_registry() -> MetricsRegistry:
+    """Get the process-wide tool metrics registry."""
+    return _registry
+
+
+def get_tool_instrumentation() -> ToolInstrumentation | None:
+    """Build the tool wrapper configured by the environment (None when disabled)."""
+    if os.environ.get("SKIDEAL_TOOL_METRICS", "1") == "0":
+        return None
+    sinks: list[MetricsSink] = [_registry]
+    if os.environ.get("SKIDEAL_TOOL_METRICS_LOG") == "1":
+        sinks.append(JsonLogSink())
+    return ToolInstrumentation(sinks)
@@ -0,0 +1,383 @@
+"""SkiDeal Bot - Durable handoff outbox.
+
+Leads handed off to a human agent are appended to a local SQLite queue (WAL
+mode) and the tool returns immediately. A background dispatcher delivers
+pending leads in batches to the CRM webhook, retrying with exponential backoff
+and dead-lettering leads the CRM keeps rejecting.
+
+Configuration (environment variables):
+    SKIDEAL_OUTBOX_PATH: Path of the SQLite file (default: handoff_outbox.db)
+    SKIDEAL_CRM_WEBHOOK_URL: CRM endpoint; the dispatcher only runs when set
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import random
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_OUTBOX_PATH = "handoff_outbox.db"
+
+STATUS_PENDING = "pending"
+STATUS_DELIVERED = "delivered"
+STATUS_DEAD = "dead"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    last_error TEXT,
+    created_at REAL NOT NULL,
+    delivered_at REAL
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at);
+"""
+
+
+def make_idempotency_key(lead: dict[str, Any]) -> str:
+    """Build a stable key for a lead so repeated handoffs are delivered once."""
+    canonical = json.dumps(lead, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class OutboxEntry:
+    """A lead waiting in (or already processed by) the outbox."""
+
+    id: int
+    idempotency_key: str
+    lead: dict[str, Any]
+    status: str
+    attempts: int
+    last_error: str | None
+
+
+class HandoffOutbox:
+    """Append-only SQLite queue of leads waiting for CRM delivery.
+
+    A single connection guarded by a lock is shared between the tool threads
+    and the dispatcher. With WAL and ``synchronous=NORMAL`` an enqueue is a
+    single small transaction without an fsync, which keeps it well under a
+    millisecond while still surviving an application crash.
+    """
+
+    def __init__(self, path: str | Path) -> None:
+        """Open (or create) the outbox database at ``path``."""
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            self.path, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self.new_entry = threading.Event()
+
+    def enqueue(self, lead: dict[str, Any]) -> str:
+        """Store a lead for delivery and return its idempotency key.
+
+        Enqueuing the same lead twice is a no-op; the existing key is returned.
+        """
+        key = make_idempotency_key(lead)
+        payload = json.dumps(lead, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO outbox "
+                "(idempotency_key, payload, next_attempt_at, created_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, payload, now, now),
+            )
+        self.new_entry.set()
+        return key
+
+    def claim_due(self, limit: int, claim_for: float = 60.0) -> list[OutboxEntry]:
+        """Claim up to ``limit`` pending entries whose retry time has come.
+
+        Claimed entries are not due again for ``claim_for`` seconds, so other
+        dispatchers on the same file skip them; `mark_delivered` or
+        `mark_failed` settles them before that, and the claim of a dispatcher
+        that crashed mid-delivery simply runs out.
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    "SELECT id, idempotency_key, payload, status, attempts, last_error "
+                    "FROM outbox WHERE status = ? AND next_attempt_at <= ? "
+                    "ORDER BY id LIMIT ?",
+                    (STATUS_PENDING, now, limit),
+                ).fetchall()
+                self._conn.executemany(
+                    "UPDATE outbox SET next_attempt_at = ? WHERE id = ?",
+                    [(now + claim_for, row[0]) for row in rows],
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return [self._to_entry(row) for row in rows]
+
+    def next_due_in(self) -> float | None:
+        """Seconds until the next pending entry is due, or None if none pending."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(next_attempt_at) FROM outbox WHERE status = ?",
+                (STATUS_PENDING,),
+            ).fetchone()
+        due: float | None = row[0]
+        if due is None:
+            return None
+        return max(0.0, due - time.time())
+
+    def mark_delivered(self, ids: list[int]) -> None:
+        """Mark entries as delivered to the CRM."""
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE outbox SET status = ?, attempts = attempts + 1, "
+                "delivered_at = ?, last_error = NULL WHERE id = ?",
+                [(STATUS_DELIVERED, now, i) for i in ids],
+            )
+
+    def mark_failed(
+        self, entries: list[OutboxEntry], error: str, retry_at: float | None
+    ) -> None:
+        """Record a failed attempt; dead-letter the entries when ``retry_at`` is None."""
+        with self._lock:
+            for entry in entries:
+                if retry_at is None:
+                    self._conn.execute(
+                        "UPDATE outbox SET status = ?, attempts = attempts + 1, "
+                        "last_error = ? WHERE id = ?",
+                        (STATUS_DEAD, error, entry.id),
+                    )
+                else:
+                    self._conn.execute(
+                        "UPDATE outbox SET attempts = attempts + 1, last_error = ?, "
+                        "next_attempt_at = ? WHERE id = ?",
+                        (error, retry_at, entry.id),
+                    )
+
+    def entries(self, status: str | None = None) -> list[OutboxEntry]:
+        """List entries, optionally filtered by status (e.g. dead letters)."""
+        query = (
+            "SELECT id, idempotency_key, payload, status, attempts, last_error "
+            "FROM outbox"
+        )
+        params: tuple[Any, ...] = ()
+        if status:
+            query += " WHERE status = ?"
+            params = (status,)
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY id", params).fetchall()
+        return [self._to_entry(row) for row in rows]
+
+    def requeue_dead(self) -> int:
+        """Move dead-lettered entries back to pending and return how many moved."""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE outbox SET status = ?, attempts = 0, next_attempt_at = ? "
+                "WHERE status = ?",
+                (STATUS_PENDING, time.time(), STATUS_DEAD),
+            )
+        self.new_entry.set()
+        return cursor.rowcount
+
+    def close(self) -> None:
+        """Close the underlying connection."""
+        with self._lock:
+            self._conn.close()
+
+    @staticmethod
+    def _to_entry(row: tuple[Any, ...]) -> OutboxEntry:
+        return OutboxEntry(
+            id=row[0],
+            idempotency_key=row[1],
+            lead=json.loads(row[2]),
+            status=row[3],
+            attempts=row[4],
+            last_error=row[5],
+        )
+
+
+class OutboxDispatcher:
+    """Background thread delivering outbox batches to the CRM webhook.
+
+    Each batch is POSTed as ``{"leads": [{"idempotency_key", "lead"}, ...]}``
+    with an ``Idempotency-Key`` header derived from the keys in the batch, so
+    the CRM can safely deduplicate a batch that is retried after a timeout.
+
+    - 2xx: the batch is marked delivered.
+    - 408/429/5xx or a network error: retried with exponential backoff.
+    - Any other status: the leads are sent again one by one, so a single
+      malformed lead does not take the rest of the batch down with it; a
+      lead rejected on its own is dead-lettered immediately.
+    - Entries reaching ``max_attempts`` are dead-lettered.
+
+    Batches are claimed (`HandoffOutbox.claim_due`) before they are sent, so
+    several dispatchers can share one outbox file without double delivery.
+    """
+
+    def __init__(
+        self,
+        outbox: HandoffOutbox,
+        webhook_url: str,
+        *,
+        batch_size: int = 20,
+        max_attempts: int = 8,
+        base_backoff: float = 1.0,
+        max_backoff: float = 300.0,
+        timeout: float = 10.0,
+        client: httpx.Client | None = None,
+    ) -> None:
+        """Deliver ``outbox`` to ``webhook_url`` (see the class docstring)."""
+        self.outbox = outbox
+        self.webhook_url = webhook_url
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        # Longer than a delivery can take, so a claim never runs out mid-send
+        self.claim_for = 6 * timeout
+        self._client = client or httpx.Client(timeout=timeout)
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        """Start the dispatcher thread (idempotent)."""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="handoff-outbox-dispatcher", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop the dispatcher thread and wait for it to exit."""
+        self._stop.set()
+        self.outbox.new_entry.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def dispatch_once(self) -> int:
+        """Deliver a single batch of due entries and return its size."""
+        batch = self.outbox.claim_due(self.batch_size, self.claim_for)
+        if batch:
+            self._deliver(batch)
+        return len(batch)
+
+    def _deliver(self, batch: list[OutboxEntry]) -> None:
+        body = {
+            "leads": [
+                {"idempotency_key": e.idempotency_key, "lead": e.lead} for e in batch
+            ]
+        }
+        batch_key = make_idempotency_key(
+            {"keys": [e.idempotency_key for e in batch]}
+        )
+        try:
+            response = self._client.post(
+                self.webhook_url,
+                json=body,
+                headers={"Idempotency-Key": batch_key},
+            )
+        except httpx.HTTPError as e:
+            self._retry_or_dead_letter(batch, f"{type(e).__name__}: {e}")
+            return
+
+        if response.is_success:
+            self.outbox.mark_delivered([e.id for e in batch])
+        elif response.status_code in (408, 429) or response.status_code >= 500:
+            self._retry_or_dead_letter(batch, f"HTTP {response.status_code}")
+        elif len(batch) > 1:
+            logger.warning(
+                "CRM rejected a batch of %d leads with HTTP %d; sending them one by one",
+                len(batch),
+                response.status_code,
+            )
+            for entry in batch:
+                self._deliver([entry])
+        else:
+            logger.error(
+                "CRM rejected lead %d with HTTP %d; dead-lettering",
+                batch[0].id,
+                response.status_code,
+            )
+            self.outbox.mark_failed(
+                batch, f"HTTP {response.status_code}: {response.text[:200]}", None
+            )
+
+    def _retry_or_dead_letter(self, batch: list[OutboxEntry], error: str) -> None:
+        retry = [e for e in batch if e.attempts + 1 < self.max_attempts]
+        dead = [e for e in batch if e.attempts + 1 >= self.max_attempts]
+        if dead:
+            logger.error("Dead-lettering %d lead(s): %s", len(dead), error)
+            self.outbox.mark_failed(dead, error, None)
+        for entry in retry:
+            delay = min(self.max_backoff, self.base_backoff * 2**entry.attempts)
+            delay *= random.uniform(0.8, 1.2)
+            self.outbox.mark_failed([entry], error, time.time() + delay)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                while self.dispatch_once():
+                    if self._stop.is_set():
+                        return
+            except Exception:
+                logger.exception("Outbox dispatch failed")
+            wait = self.outbox.next_due_in()
+            self.outbox.new_entry.wait(timeout=wait if wait is not None else 60.0)
+            self.outbox.new_entry.clear()
+
+
+# ============================================================================
+# PROCESS-WIDE OUTBOX
+# ============================================================================
+
+_outbox: HandoffOutbox | None = None
+_dispatcher: OutboxDispatcher | None = None
+_init_lock = threading.Lock()
+
+
+def get_outbox() -> HandoffOutbox:
+    """Get the process-wide outbox, starting the dispatcher if a CRM is configured."""
+    global _outbox, _dispatcher
+    if _outbox is not None:
+        return _outbox
+    with _init_lock:
+        if _outbox is None:
+            outbox = HandoffOutbox(
+                os.environ.get("SKIDEAL_OUTBOX_PATH", DEFAULT_OUTBOX_PATH)
+            )
+            webhook_url = os.environ.get("SKIDEAL_CRM_WEBHOOK_URL")
+            if webhook_url:
+                _dispatcher = OutboxDispatcher(outbox, webhook_url)
+                _dispatcher.start()
+            else:
+                logger.warning(
+                    "SKIDEAL_CRM_WEBHOOK_URL is not set; handoffs are only "
+                    "stored in %s",
+                    outbox.path,
+                )
+            _outbox = outbox
+    return _outbox
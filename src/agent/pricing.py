@@ -0,0 +1,206 @@
+"""SkiDeal Bot - Live availability and pricing client.
+
+The prompt forbids quoting prices that don't come from a source of truth, so
+without a pricing source every price question ends in a handoff. This client
+asks the booking system for a live quote instead, without hammering it at
+peak time:
+
+- one pooled `httpx.AsyncClient` per process,
+- a TTL cache per (hotel, resort, dates, pax),
+- singleflight: concurrent identical queries share one upstream request.
+
+The client runs on its own event loop thread, so the sync tools (run from
+worker threads and from ``graph.invoke``) and async callers share the same
+pool, cache and in-flight requests.
+
+Upstream API: ``GET {SKIDEAL_PRICING_URL}/quote`` with the query parameters
+``hotel``, ``resort``, ``check_in``, ``check_out`` (ISO dates), ``adults`` and
+``children``, answering JSON like ``{"available": true, "total": 2480,
+"currency": "EUR", "board": "...", "room": "..."}``.
+`agent.fakes.StubPricingServer` implements it for tests.
+
+Configuration (environment variables):
+    SKIDEAL_PRICING_URL: Base URL of the pricing API; live quotes are off when unset
+    SKIDEAL_PRICING_TOKEN: Bearer token for the pricing API (optional)
+    SKIDEAL_PRICING_TTL: Seconds a quote is served from the cache (default: 300)
+    SKIDEAL_PRICING_TIMEOUT: Seconds per upstream request (default: 5)
+"""
+
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any
+
+import httpx
+
+DEFAULT_TTL = 300.0
+DEFAULT_TIMEOUT = 5.0
+
+
+class PricingError(Exception):
+    """The pricing API failed or returned an unusable answer."""
+
+
+@dataclass(frozen=True)
+class QuoteRequest:
+    """A quote query; also the cache and singleflight key."""
+
+    hotel: str
+    resort: str
+    check_in: str
+    check_out: str
+    adults: int
+    children: int = 0
+
+    def params(self) -> dict[str, str | int]:
+        """Query parameters of the upstream request."""
+        return {
+            "hotel": self.hotel,
+            "resort": self.resort,
+            "check_in": self.check_in,
+            "check_out": self.check_out,
+            "adults": self.adults,
+            "children": self.children,
+        }
+
+
+class PricingClient:
+    """Cached, coalescing client for the pricing API.
+
+    Errors are not cached; every waiter of a failed request gets the error.
+    A caller that gives up (e.g. a superseded run) doesn't cancel the
+    upstream request the other waiters share.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        *,
+        ttl: float = DEFAULT_TTL,
+        timeout: float = DEFAULT_TIMEOUT,
+        token: str | None = None,
+        max_connections: int = 20,
+        max_entries: int = 4096,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ) -> None:
+        """Quote from ``base_url`` through a pool of ``max_connections``."""
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._client = httpx.AsyncClient(
+            base_url=base_url.rstrip("/"),
+            timeout=timeout,
+            headers={"Authorization": f"Bearer {token}"} if token else None,
+            limits=httpx.Limits(
+                max_connections=max_connections, max_keepalive_connections=max_connections
+            ),
+            transport=transport,
+        )
+        self._cache: OrderedDict[QuoteRequest, tuple[float, dict[str, Any]]] = OrderedDict()
+        self._inflight: dict[QuoteRequest, asyncio.Task[dict[str, Any]]] = {}
+        self.upstream_calls = 0
+        self.cache_hits = 0
+        self.coalesced = 0
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name="pricing-client", daemon=True
+        )
+        self._thread.start()
+
+    def _submit(self, request: QuoteRequest) -> concurrent.futures.Future[dict[str, Any]]:
+        return asyncio.run_coroutine_threadsafe(self._get(request), self._loop)
+
+    def quote(self, request: QuoteRequest) -> dict[str, Any]:
+        """Get a quote, blocking the calling thread."""
+        return self._submit(request).result()
+
+    async def aquote(self, request: QuoteRequest) -> dict[str, Any]:
+        """Get a quote from any event loop."""
+        return await asyncio.wrap_future(self._submit(request))
+
+    async def _get(self, request: QuoteRequest) -> dict[str, Any]:
+        # Runs on the client loop, so the cache and in-flight table need no lock
+        cached = self._cache.get(request)
+        if cached is not None and cached[0] > time.monotonic():
+            self.cache_hits += 1
+            return cached[1]
+        task = self._inflight.get(request)
+        if task is None:
+            task = self._loop.create_task(self._fetch(request))
+            self._inflight[request] = task
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    async def _fetch(self, request: QuoteRequest) -> dict[str, Any]:
+        self.upstream_calls += 1
+        try:
+            response = await self._client.get("/quote", params=request.params())
+            response.raise_for_status()
+            try:
+                quote = response.json()
+            except ValueError as e:
+                # A 200 that isn't JSON, e.g. a proxy's HTML error page
+                raise PricingError(f"Pricing response is not JSON: {response.text[:200]}") from e
+            if not isinstance(quote, dict) or "available" not in quote:
+                raise PricingError(f"Unexpected pricing response: {response.text[:200]}")
+        except httpx.HTTPError as e:
+            raise PricingError(f"{type(e).__name__}: {e}") from e
+        finally:
+            self._inflight.pop(request, None)
+        self._store(request, quote)
+        return quote
+
+    def _store(self, request: QuoteRequest, quote: dict[str, Any]) -> None:
+        self._cache[request] = (time.monotonic() + self.ttl, quote)
+        self._cache.move_to_end(request)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    def stats(self) -> dict[str, int]:
+        """Upstream calls, cache hits, coalesced waiters and cached quotes."""
+        return {
+            "upstream_calls": self.upstream_calls,
+            "cache_hits": self.cache_hits,
+            "coalesced": self.coalesced,
+            "cached": len(self._cache),
+        }
+
+    def close(self) -> None:
+        """Close the HTTP client and stop the client loop."""
+        asyncio.run_coroutine_threadsafe(self._client.aclose(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+
+# ============================================================================
+# PROCESS-WIDE CLIENT
+# ============================================================================
+
+_client: PricingClient | None = None
+_init_lock = threading.Lock()
+
+
+def get_pricing_client() -> PricingClient | None:
+    """Get the process-wide pricing client (None when no pricing API is configured)."""
+    global _client
+    if _client is not None:
+        return _client
+    base_url = os.environ.get("SKIDEAL_PRICING_URL")
+    if not base_url:
+        return None
+    with _init_lock:
+        if _client is None:
+            _client = PricingClient(
+                base_url,
+                ttl=float(os.environ.get("SKIDEAL_PRICING_TTL", DEFAULT_TTL)),
+                timeout=float(os.environ.get("SKIDEAL_PRICING_TIMEOUT", DEFAULT_TIMEOUT)),
+                token=os.environ.get("SKIDEAL_PRICING_TOKEN"),
+            )
+    return _client
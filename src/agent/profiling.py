@@ -0,0 +1,309 @@
+"""SkiDeal Bot - Opt-in per-turn profiling.
+
+A profiled turn records two things:
+
+- stack samples of every thread in the process, taken every
+  ``SKIDEAL_PROFILE_INTERVAL_MS`` by a background thread, written as
+  collapsed stacks (``<thread>-turn<N>.folded``) that flamegraph.pl,
+  inferno or speedscope render directly;
+- the turn's wall time split into model wait (`agent.usage.TimedModel`),
+  tool execution (`agent.metrics.ToolInstrumentation`), checkpoint
+  serialization (`instrument_checkpointer`) and the rest, the framework
+  overhead, written next to the stacks as ``<thread>-turn<N>.json``.
+
+``<thread>`` is a digest of the thread id, which holds the customer's phone
+number; the JSON summary carries the id itself.
+
+The sampler thread only runs while a profiled turn is in flight. The
+samples cover the whole process, so concurrent turns show up in each
+other's stacks; the phase split is exact per turn. Tool time is summed over
+calls, so parallel tool calls can exceed the wall time.
+
+Turns are profiled when ``SKIDEAL_PROFILE=1``, or single turns when the
+request asks for it with the ``SKIDEAL_PROFILE_TOKEN`` secret: the
+``X-SkiDeal-Profile: <token>`` header on the webhook (`agent.server`) or
+``?profile=<token>`` in the Streamlit app. Without the secret configured
+requests can't force profiling, so outsiders can't fill the disk with
+traces. With ``SKIDEAL_PROFILE_MIN_MS`` only turns slower than that are
+written (forced ones too), so slow production turns can be caught without a
+redeploy.
+
+Configuration (environment variables):
+    SKIDEAL_PROFILE: Set to 1 to profile every turn (default: 0)
+    SKIDEAL_PROFILE_DIR: Output directory (default: profiles)
+    SKIDEAL_PROFILE_MIN_MS: Only write turns at least this slow (default: 0)
+    SKIDEAL_PROFILE_TOKEN: Secret that lets a request profile its turns
+        (default: unset, requests can't)
+    SKIDEAL_PROFILE_INTERVAL_MS: Sampling interval (default: 5)
+"""
+
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import hmac
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Iterator, Sequence
+
+from langchain_core.messages import BaseMessage, HumanMessage
+
+logger = logging.getLogger(__name__)
+
+PHASES = ("model", "tools", "serialization")
+
+_current: ContextVar[TurnProfile | None] = ContextVar("skideal_turn_profile", default=None)
+
+
+def record_phase(phase: str, seconds: float) -> None:
+    """Add time spent in ``phase`` to the turn being profiled (if any)."""
+    profile = _current.get()
+    if profile is not None:
+        profile.add(phase, seconds)
+
+
+def _frame_label(code: Any) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _file_name(thread_id: str) -> str:
+    # Thread ids carry phone numbers; keep them out of the file names
+    return hashlib.sha256(thread_id.encode()).hexdigest()[:16]
+
+
+def count_turns(messages: Sequence[BaseMessage]) -> int:
+    """Turn number of a conversation (customer messages so far)."""
+    return sum(isinstance(m, HumanMessage) for m in messages)
+
+
+@dataclass
+class TurnProfile:
+    """Samples and phase timings of one agent turn."""
+
+    thread_id: str
+    started: float = field(default_factory=time.perf_counter)
+    turn: int = 0
+    status: str = "ok"
+    wall: float = 0.0
+    phases: dict[str, float] = field(default_factory=lambda: dict.fromkeys(PHASES, 0.0))
+    stacks: Counter[str] = field(default_factory=Counter)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, phase: str, seconds: float) -> None:
+        """Add time spent in a phase (from any thread)."""
+        with self._lock:
+            self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def add_samples(self, stacks: Sequence[str]) -> None:
+        """Count one sample of each stack."""
+        with self._lock:
+            self.stacks.update(stacks)
+
+    def finish(self, messages: Sequence[BaseMessage]) -> None:
+        """Take the turn number from the conversation after the run."""
+        self.turn = count_turns(messages)
+
+    def summary(self) -> dict[str, Any]:
+        """Phase split in milliseconds."""
+        phases_ms = {k: round(v * 1000, 3) for k, v in self.phases.items()}
+        phases_ms["framework"] = round(max(self.wall - sum(self.phases.values()), 0.0) * 1000, 3)
+        return {
+            "thread_id": self.thread_id,
+            "turn": self.turn,
+            "status": self.status,
+            "wall_ms": round(self.wall * 1000, 3),
+            "phases_ms": phases_ms,
+            "samples": sum(self.stacks.values()),
+        }
+
+
+class StackSampler:
+    """Background thread sampling the stacks of all threads into active profiles."""
+
+    def __init__(self, interval: float) -> None:
+        """Sample every ``interval`` seconds while a profile is attached."""
+        self.interval = interval
+        self._profiles: list[TurnProfile] = []
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    def attach(self, profile: TurnProfile) -> None:
+        """Start sampling into ``profile``."""
+        with self._lock:
+            self._profiles.append(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="skideal-profiler", daemon=True
+                )
+                self._thread.start()
+
+    def detach(self, profile: TurnProfile) -> None:
+        """Stop sampling into ``profile``; the thread stops with the last one."""
+        with self._lock:
+            self._profiles.remove(profile)
+
+    def _sample(self) -> list[str]:
+        names = {t.ident: t.name for t in threading.enumerate()}
+        me = threading.get_ident()
+        stacks = []
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            labels = []
+            current: Any = frame
+            while current is not None:
+                labels.append(_frame_label(current.f_code))
+                current = current.f_back
+            labels.append(names.get(ident, str(ident)))
+            stacks.append(";".join(reversed(labels)))
+        return stacks
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                profiles = list(self._profiles)
+                if not profiles:
+                    self._thread = None
+                    return
+            stacks = self._sample()
+            for profile in profiles:
+                profile.add_samples(stacks)
+            time.sleep(self.interval)
+
+
+class TurnProfiler:
+    """Decides which turns to profile and writes their traces."""
+
+    def __init__(
+        self,
+        directory: Path | str = "profiles",
+        *,
+        enabled: bool = False,
+        min_ms: float = 0.0,
+        interval_ms: float = 5.0,
+        force_token: str | None = None,
+    ) -> None:
+        """Write the profiles to ``directory``; requests may force one with ``force_token``."""
+        self.directory = Path(directory)
+        self.enabled = enabled
+        self.min_ms = min_ms
+        self.force_token = force_token
+        self.sampler = StackSampler(interval_ms / 1000)
+
+    @classmethod
+    def from_env(cls) -> TurnProfiler:
+        """Profiler configured by the ``SKIDEAL_PROFILE*`` environment variables."""
+        return cls(
+            os.environ.get("SKIDEAL_PROFILE_DIR", "profiles"),
+            enabled=os.environ.get("SKIDEAL_PROFILE") == "1",
+            min_ms=float(os.environ.get("SKIDEAL_PROFILE_MIN_MS", "0")),
+            interval_ms=float(os.environ.get("SKIDEAL_PROFILE_INTERVAL_MS", "5")),
+            force_token=os.environ.get("SKIDEAL_PROFILE_TOKEN") or None,
+        )
+
+    def allows_force(self, token: str | None) -> bool:
+        """Whether a request presenting ``token`` may profile its turns."""
+        if not self.force_token or not token:
+            return False
+        return hmac.compare_digest(token.encode(), self.force_token.encode())
+
+    @contextlib.contextmanager
+    def profile(self, thread_id: str, *, force: bool = False) -> Iterator[TurnProfile | None]:
+        """Profile the turn run inside the block (yields None when off).
+
+        Call `TurnProfile.finish` with the resulting messages to tag the
+        files with the turn number.
+        """
+        if not (self.enabled or force):
+            yield None
+            return
+        profile = TurnProfile(thread_id)
+        token = _current.set(profile)
+        self.sampler.attach(profile)
+        try:
+            yield profile
+        except BaseException as exc:
+            profile.status = type(exc).__name__
+            raise
+        finally:
+            self.sampler.detach(profile)
+            _current.reset(token)
+            profile.wall = time.perf_counter() - profile.started
+            if profile.wall * 1000 >= self.min_ms:
+                try:
+                    self.write(profile)
+                except OSError:
+                    logger.exception("Could not write the profile of %s", thread_id)
+
+    def write(self, profile: TurnProfile) -> Path:
+        """Write the collapsed stacks and the phase summary; returns the stacks file."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        base = self.directory / f"{_file_name(profile.thread_id)}-turn{profile.turn:03d}"
+        stacks = base.with_suffix(".folded")
+        with profile._lock:
+            counts = profile.stacks.most_common()
+        stacks.write_text(
+            "".join(f"{stack} {count}\n" for stack, count in counts), encoding="utf-8"
+        )
+        summary = profile.summary()
+        base.with_suffix(".json").write_text(json.dumps(summary, ensure_ascii=False, indent=2))
+        logger.info("Profiled turn %s #%d: %s", profile.thread_id, profile.turn, summary["phases_ms"])
+        return stacks
+
+
+class TimedSerializer:
+    """Checkpoint serializer wrapper that books its time as ``serialization``."""
+
+    def __init__(self, serde: Any) -> None:
+        """Wrap the checkpointer serializer ``serde``."""
+        self.serde = serde
+
+    def dumps_typed(self, obj: Any) -> tuple[str, bytes]:
+        """Serialize a checkpoint value."""
+        start = time.perf_counter()
+        try:
+            return self.serde.dumps_typed(obj)  # type: ignore[no-any-return]
+        finally:
+            record_phase("serialization", time.perf_counter() - start)
+
+    def loads_typed(self, data: tuple[str, bytes]) -> Any:
+        """Deserialize a checkpoint value."""
+        start = time.perf_counter()
+        try:
+            return self.serde.loads_typed(data)
+        finally:
+            record_phase("serialization", time.perf_counter() - start)
+
+    def __getattr__(self, name: str) -> Any:
+        """Delegate everything else to the wrapped serializer."""
+        return getattr(self.serde, name)
+
+
+def instrument_checkpointer(checkpointer: Any) -> Any:
+    """Time the serialization of a checkpointer (once)."""
+    serde = getattr(checkpointer, "serde", None)
+    if serde is not None and not isinstance(serde, TimedSerializer):
+        checkpointer.serde = TimedSerializer(serde)
+    return checkpointer
+
+
+_profiler: TurnProfiler | None = None
+_profiler_lock = threading.Lock()
+
+
+def get_turn_profiler() -> TurnProfiler:
+    """Get the process-wide turn profiler (configured on first use)."""
+    global _profiler
+    if _profiler is None:
+        with _profiler_lock:
+            if _profiler is None:
+                _profiler = TurnProfiler.from_env()
+    return _profiler
@@ -0,0 +1,627 @@
+"""SkiDeal Bot - Async WhatsApp webhook server.
+
+Production ingress for WhatsApp traffic. Inbound message webhooks are
+acknowledged immediately and handed to a `ConversationDispatcher`, which runs
+`graph.ainvoke` per conversation thread:
+
+- messages of one thread are processed strictly in order, also across
+  workers sharing a lease store: each accepted message gets the thread's
+  next sequence number there (see `agent.lease` for how a lost message is
+  skipped),
+- different threads run concurrently, up to ``max_concurrency`` agent runs,
+- when ``max_pending`` messages are queued the webhook answers 503 with
+  ``Retry-After`` so WhatsApp redelivers later instead of us piling up work,
+- bursts of short messages ("היי", "אנחנו 4", "רוצים באוסטריה") are merged
+  into one agent turn once the thread has been quiet for the debounce
+  window; a message arriving while a run is in flight cancels that run,
+  rolls the thread back to the checkpoint taken before it and restarts with
+  the merged input, so no stale answer goes out. Only the conversation state
+  is rolled back: a lead the cancelled run already queued with
+  `handoff_to_agent` is still delivered, and the restarted run may queue an
+  updated one next to it (identical leads are delivered once),
+- every run holds the thread's lease (`agent.lease`), so workers sharing
+  a lease store never run one thread in parallel; a worker that lost the
+  lease mid-run cancels the run and drops its reply instead of sending it
+  out of order.
+
+All conversations share the process-wide `ChatAnthropic` instance and with it
+one pooled HTTP client. Conversation state lives in the graph checkpointer, a
+SQLite file by default so conversations survive restarts. Webhook deliveries
+must carry a valid ``X-Hub-Signature-256`` for the app secret; redeliveries
+are recognized by the message ids kept in the lease store.
+
+Run with (requires the ``server`` extra):
+    uvicorn --factory agent.server:create_app --host 0.0.0.0 --port 8080
+
+Configuration (environment variables):
+    WHATSAPP_VERIFY_TOKEN: Token for the webhook verification handshake
+    WHATSAPP_TOKEN: Cloud API access token for sending replies
+    WHATSAPP_PHONE_NUMBER_ID: Sender phone number id
+    WHATSAPP_APP_SECRET: App secret that signs the webhook deliveries
+    SKIDEAL_CHECKPOINT_PATH: SQLite file for conversation state (default:
+        checkpoints.db; ``:memory:`` keeps it in process memory)
+    SKIDEAL_MAX_CONCURRENCY: Concurrent agent runs (default: 32)
+    SKIDEAL_MAX_PENDING: Queued messages before shedding load (default: 1000)
+    SKIDEAL_DEBOUNCE_SECONDS: Burst merge window; 0 answers every message
+        separately (default: 1.0)
+    SKIDEAL_PROFILE*: Per-turn profiling, see `agent.profiling`; a webhook
+        request with ``X-SkiDeal-Profile: <SKIDEAL_PROFILE_TOKEN>`` profiles
+        the turns it starts
+    SKIDEAL_LEASE_*: Per-thread leases shared by several workers, see
+        `agent.lease`
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import hashlib
+import hmac
+import json
+import logging
+import os
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Protocol
+
+import httpx
+from langchain_core.messages import HumanMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.memory import InMemorySaver
+from langgraph.graph.state import CompiledStateGraph
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, PlainTextResponse, Response
+from starlette.routing import Route
+
+from agent.admission import get_admission_controller
+from agent.lease import LeaseHandle, LeaseLost, LeaseManager, lease_manager_from_env
+from agent.metrics import get_metrics_registry
+from agent.profiling import TurnProfiler, get_turn_profiler
+
+logger = logging.getLogger(__name__)
+
+FALLBACK_REPLY = "מצטערת, נתקלתי בבעיה זמנית 🙏🏻 אפשר לנסות שוב בעוד רגע?"
+
+
+class WhatsAppSender(Protocol):
+    """Sends a text reply to a WhatsApp user."""
+
+    async def send(self, to: str, text: str) -> None:
+        """Send ``text`` to the WhatsApp user ``to``."""
+        ...
+
+
+class CloudAPISender:
+    """Sends replies through the WhatsApp Cloud API with a pooled HTTP client."""
+
+    def __init__(
+        self,
+        token: str,
+        phone_number_id: str,
+        *,
+        client: httpx.AsyncClient | None = None,
+        api_url: str = "https://graph.facebook.com/v20.0",
+    ) -> None:
+        """Send as ``phone_number_id``, reusing ``client`` when given."""
+        self.url = f"{api_url}/{phone_number_id}/messages"
+        self._client = client or httpx.AsyncClient(
+            timeout=10.0,
+            headers={"Authorization": f"Bearer {token}"},
+            limits=httpx.Limits(max_connections=50, max_keepalive_connections=20),
+        )
+
+    async def send(self, to: str, text: str) -> None:
+        """Send a text message."""
+        response = await self._client.post(
+            self.url,
+            json={
+                "messaging_product": "whatsapp",
+                "to": to,
+                "type": "text",
+                "text": {"body": text},
+            },
+        )
+        response.raise_for_status()
+
+    async def aclose(self) -> None:
+        """Close the HTTP client."""
+        await self._client.aclose()
+
+
+@dataclass
+class InboundMessage:
+    """A customer text message received from WhatsApp."""
+
+    thread_id: str
+    sender: str
+    text: str
+    message_id: str = ""
+    # Profile the turn that answers this message (see `agent.profiling`)
+    profile: bool = False
+    # Position in the thread across workers (`LeaseManager.enqueue`); without
+    # it the message is only ordered within this process
+    seq: int | None = None
+
+
+@dataclass
+class _Thread:
+    queue: asyncio.Queue[InboundMessage] = field(default_factory=asyncio.Queue)
+    worker: asyncio.Task[None] | None = None
+    # Set on every submitted message; wakes the debounce and in-flight watch
+    arrived: asyncio.Event = field(default_factory=asyncio.Event)
+
+    def take_all(self) -> list[InboundMessage]:
+        # Cleared with the queue: ``arrived`` then flags exactly the messages
+        # that are not part of the batch taken here
+        self.arrived.clear()
+        messages = []
+        while not self.queue.empty():
+            messages.append(self.queue.get_nowait())
+        return messages
+
+
+class ConversationDispatcher:
+    """Runs the agent per conversation thread with ordering and backpressure.
+
+    With ``debounce`` set, messages of a thread are coalesced: a burst becomes
+    one agent turn once no new message arrived for ``debounce`` seconds, and
+    a message arriving mid-run supersedes the run. Without it every message
+    gets its own run and reply.
+    """
+
+    def __init__(
+        self,
+        graph: CompiledStateGraph[Any, Any, Any, Any],
+        sender: WhatsAppSender,
+        *,
+        max_concurrency: int = 32,
+        max_pending: int = 1000,
+        debounce: float | None = None,
+        profiler: TurnProfiler | None = None,
+        leases: LeaseManager | None = None,
+    ) -> None:
+        """Run ``graph`` per thread and reply through ``sender``."""
+        self.graph = graph
+        self.profiler = profiler or get_turn_profiler()
+        self.leases = leases or lease_manager_from_env()
+        self.sender = sender
+        self.max_pending = max_pending
+        self.debounce = debounce
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._threads: dict[str, _Thread] = {}
+        self._pending = 0
+        # Messages merged into another message's turn, cancelled runs,
+        # replies dropped because the lease moved to another worker, and
+        # messages dropped because a later one was answered first
+        self.coalesced = 0
+        self.superseded = 0
+        self.fenced = 0
+        self.out_of_order = 0
+
+    @property
+    def pending(self) -> int:
+        """Messages accepted but not yet answered."""
+        return self._pending
+
+    @property
+    def active_threads(self) -> int:
+        """Threads with queued or running messages."""
+        return len(self._threads)
+
+    def submit(self, message: InboundMessage) -> bool:
+        """Queue a message for its thread; return False when saturated."""
+        if self._pending >= self.max_pending:
+            return False
+        self._pending += 1
+        thread = self._threads.get(message.thread_id)
+        if thread is None:
+            thread = self._threads[message.thread_id] = _Thread()
+        thread.queue.put_nowait(message)
+        thread.arrived.set()
+        if thread.worker is None:
+            drain = self._drain if self.debounce is None else self._drain_coalesced
+            thread.worker = asyncio.create_task(drain(message.thread_id, thread))
+        return True
+
+    async def _drain(self, thread_id: str, thread: _Thread) -> None:
+        # One worker per thread serializes its messages; the worker exits once
+        # the queue is empty so idle conversations hold no task or memory.
+        try:
+            while not thread.queue.empty():
+                message = thread.queue.get_nowait()
+                try:
+                    await self._handle(message)
+                finally:
+                    self._pending -= 1
+        finally:
+            del self._threads[thread_id]
+
+    async def _handle(self, message: InboundMessage) -> None:
+        async with self.leases.hold(message.thread_id, message.seq) as lease:
+            answer, _ = self._in_order(lease, [message], None)
+            if not answer:
+                return
+            config = _config(message.thread_id)
+            reply = await self._run(
+                config, message.text, lease=lease, profile=message.profile
+            )
+            lease.answered = message.seq
+            await self._send_fenced(lease, message.sender, reply)
+
+    def _in_order(
+        self, lease: LeaseHandle, messages: list[InboundMessage], last: int | None
+    ) -> tuple[list[InboundMessage], list[InboundMessage]]:
+        """Split ``messages`` into the ones to answer now and the ones to keep.
+
+        A run answers consecutive sequence numbers only, after ``last`` (or
+        from the first message, which the lease was taken for); the others
+        wait for their turn. A message older than one already answered is
+        dropped.
+        """
+        answer: list[InboundMessage] = []
+        later: list[InboundMessage] = []
+        for message in sorted(messages, key=lambda m: m.seq or 0):
+            if message.seq is None:
+                answer.append(message)
+            elif message.seq <= lease.lease.answered:
+                self.out_of_order += 1
+                logger.warning(
+                    "Dropped message %d of thread %s: a later one was answered first",
+                    message.seq,
+                    message.thread_id,
+                )
+            elif last is None or message.seq == last + 1:
+                answer.append(message)
+                last = message.seq
+            else:
+                later.append(message)
+        return answer, later
+
+    async def _run(
+        self,
+        config: RunnableConfig,
+        text: str,
+        *,
+        lease: LeaseHandle,
+        profile: bool = False,
+    ) -> str:
+        thread_id = config["configurable"]["thread_id"]
+        async with self._slots:
+            try:
+                with self.profiler.profile(thread_id, force=profile) as turn:
+                    result = await lease.run(
+                        self.graph.ainvoke(
+                            {"messages": [HumanMessage(content=text)]}, config=config
+                        )
+                    )
+                    if turn is not None:
+                        turn.finish(result["messages"])
+                return result["messages"][-1].text or FALLBACK_REPLY
+            except LeaseLost:
+                # Another worker owns the thread now; _send_fenced drops this
+                logger.warning("Cancelled the run of thread %s: lease lost", thread_id)
+                return FALLBACK_REPLY
+            except Exception:
+                logger.exception("Agent run failed for thread %s", thread_id)
+                return FALLBACK_REPLY
+
+    async def _send(self, to: str, reply: str) -> None:
+        try:
+            await self.sender.send(to, reply)
+        except Exception:
+            logger.exception("Failed to send reply to %s", to)
+
+    async def _send_fenced(self, lease: LeaseHandle, to: str, reply: str) -> None:
+        """Send the reply only while the run's lease is still current."""
+        if not await self.leases.is_current(lease):
+            self.fenced += 1
+            logger.warning(
+                "Dropped reply for thread %s: lease %d is stale",
+                lease.lease.thread_id,
+                lease.token,
+            )
+            return
+        await self._send(to, reply)
+
+    # -- burst coalescing -------------------------------------------------------
+
+    async def _quiet(self, thread: _Thread) -> None:
+        """Wait until the thread had no new message for the debounce window."""
+        while True:
+            thread.arrived.clear()
+            try:
+                await asyncio.wait_for(thread.arrived.wait(), self.debounce)
+            except asyncio.TimeoutError:
+                return
+
+    async def _checkpoint_id(self, config: RunnableConfig) -> str | None:
+        if self.graph.checkpointer is None:
+            return None
+        snapshot = await self.graph.aget_state(config)
+        return snapshot.config.get("configurable", {}).get("checkpoint_id")
+
+    async def _rollback(self, thread_id: str, checkpoint_id: str | None) -> RunnableConfig:
+        """Config that restarts the thread from ``checkpoint_id``.
+
+        Running from an earlier checkpoint forks the thread there, dropping
+        what the cancelled run wrote; a thread without an earlier checkpoint
+        is deleted instead.
+        """
+        config = _config(thread_id)
+        if checkpoint_id is not None:
+            config["configurable"]["checkpoint_id"] = checkpoint_id
+        elif isinstance(self.graph.checkpointer, BaseCheckpointSaver):
+            await self.graph.checkpointer.adelete_thread(thread_id)
+        return config
+
+    async def _drain_coalesced(self, thread_id: str, thread: _Thread) -> None:
+        try:
+            while not thread.queue.empty():
+                await self._quiet(thread)
+                batch = thread.take_all()
+                try:
+                    async with self.leases.hold(thread_id, _first_seq(batch)) as lease:
+                        await self._run_batch(thread_id, thread, lease, batch)
+                finally:
+                    self._pending -= len(batch)
+        finally:
+            del self._threads[thread_id]
+
+    async def _run_batch(
+        self,
+        thread_id: str,
+        thread: _Thread,
+        lease: LeaseHandle,
+        batch: list[InboundMessage],
+    ) -> None:
+        """Answer a burst, restarting while the customer keeps adding to it.
+
+        A restart rolls back the checkpoint, not the side effects of the tools
+        the superseded run already called (see the module docstring).
+        """
+        config = _config(thread_id)
+        before = await self._checkpoint_id(config)
+        merged: list[InboundMessage] = []
+        judged = 0
+        while True:
+            # Messages that came in while waiting for the lease or rolling
+            # back join the batch (this extends the caller's list, so all
+            # merged messages are released)
+            batch += thread.take_all()
+            answer, later = self._in_order(lease, batch[judged:], _last_seq(merged))
+            # Messages past a gap wait for the ones in between (possibly on
+            # another worker) and go back to the queue for a later turn
+            for message in later:
+                batch.remove(message)
+                thread.queue.put_nowait(message)
+            judged = len(batch)
+            merged += answer
+            if not merged:
+                return
+            run = asyncio.create_task(
+                self._run(
+                    config,
+                    "\n".join(m.text for m in merged),
+                    lease=lease,
+                    profile=any(m.profile for m in merged),
+                )
+            )
+            arrived = asyncio.create_task(thread.arrived.wait())
+            await asyncio.wait({run, arrived}, return_when=asyncio.FIRST_COMPLETED)
+            if run.done():
+                arrived.cancel()
+                reply = run.result()
+                break
+            # The customer added to the burst: the answer would be stale, so
+            # restart with everything they said
+            run.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await run
+            self.superseded += 1
+            logger.info("Superseded run for thread %s", thread_id)
+            await self._quiet(thread)
+            config = await self._rollback(thread_id, before)
+        self.coalesced += len(merged) - 1
+        lease.answered = _last_seq(merged)
+        await self._send_fenced(lease, merged[-1].sender, reply)
+
+    async def join(self) -> None:
+        """Wait until every accepted message has been answered."""
+        while self._threads:
+            await asyncio.gather(
+                *(t.worker for t in list(self._threads.values()) if t.worker),
+                return_exceptions=True,
+            )
+
+
+def _config(thread_id: str) -> RunnableConfig:
+    return {"configurable": {"thread_id": thread_id}}
+
+
+def _first_seq(messages: list[InboundMessage]) -> int | None:
+    return min((m.seq for m in messages if m.seq is not None), default=None)
+
+
+def _last_seq(messages: list[InboundMessage]) -> int | None:
+    return max((m.seq for m in messages if m.seq is not None), default=None)
+
+
+def parse_webhook(payload: dict[str, Any], *, profile: bool = False) -> list[InboundMessage]:
+    """Extract customer text messages from a WhatsApp Cloud API webhook payload."""
+    messages = []
+    for entry in payload.get("entry", []):
+        for change in entry.get("changes", []):
+            value = change.get("value", {})
+            for msg in value.get("messages", []):
+                if msg.get("type") != "text":
+                    continue
+                sender = msg.get("from", "")
+                messages.append(
+                    InboundMessage(
+                        # One conversation per customer phone number
+                        thread_id=f"whatsapp:{sender}",
+                        sender=sender,
+                        text=msg.get("text", {}).get("body", ""),
+                        message_id=msg.get("id", ""),
+                        profile=profile,
+                    )
+                )
+    return messages
+
+
+def verify_signature(body: bytes, signature: str | None, app_secret: str) -> bool:
+    """Check a webhook's ``X-Hub-Signature-256`` (``sha256=<hex HMAC of the body>``)."""
+    if not signature or not signature.startswith("sha256="):
+        return False
+    expected = hmac.new(app_secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(signature.removeprefix("sha256="), expected)
+
+
+@asynccontextmanager
+async def open_checkpointer(path: str) -> AsyncIterator[BaseCheckpointSaver[Any]]:
+    """Open the conversation checkpointer stored at ``path``.
+
+    ``:memory:`` keeps the conversations in process memory; they are lost on
+    restart. A file needs ``langgraph-checkpoint-sqlite`` (the ``server``
+    extra), and the server refuses to start without it.
+    """
+    if path == ":memory:":
+        logger.warning("Conversation state is kept in memory only")
+        yield InMemorySaver()
+        return
+    try:
+        from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+    except ImportError as e:
+        raise RuntimeError(
+            "A durable checkpointer needs langgraph-checkpoint-sqlite "
+            "(pip install -e '.[server]'); set SKIDEAL_CHECKPOINT_PATH=:memory: "
+            "to keep conversations in memory instead"
+        ) from e
+    async with AsyncSqliteSaver.from_conn_string(path) as saver:
+        yield saver
+
+
+def create_app(
+    dispatcher: ConversationDispatcher | None = None,
+    *,
+    verify_token: str | None = None,
+    app_secret: str | None = None,
+) -> Starlette:
+    """Create the webhook ASGI app.
+
+    Without a dispatcher, builds one at startup around the shared model, the
+    checkpointer opened by `open_checkpointer` and the WhatsApp Cloud API
+    sender, all configured from the environment; the app secret is then
+    required. Without an app secret, webhook signatures are not checked.
+    """
+    verify_token = verify_token or os.environ.get("WHATSAPP_VERIFY_TOKEN", "")
+    if dispatcher is None:
+        app_secret = app_secret or os.environ["WHATSAPP_APP_SECRET"]
+    app_secret = app_secret or os.environ.get("WHATSAPP_APP_SECRET", "")
+    if not app_secret:
+        logger.warning("WHATSAPP_APP_SECRET is not set; webhook signatures are not checked")
+
+    async def verify(request: Request) -> Response:
+        params = request.query_params
+        if (
+            params.get("hub.mode") == "subscribe"
+            and verify_token
+            and params.get("hub.verify_token") == verify_token
+        ):
+            return PlainTextResponse(params.get("hub.challenge", ""))
+        return PlainTextResponse("forbidden", status_code=403)
+
+    async def receive(request: Request) -> Response:
+        body = await request.body()
+        signature = request.headers.get("x-hub-signature-256")
+        if app_secret and not verify_signature(body, signature, app_secret):
+            logger.warning("Rejected a webhook with a missing or bad signature")
+            return PlainTextResponse("forbidden", status_code=403)
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            logger.warning("Rejected a webhook whose body is not JSON")
+            return PlainTextResponse("bad request", status_code=400)
+        if not isinstance(payload, dict):
+            return PlainTextResponse("bad request", status_code=400)
+        dispatcher: ConversationDispatcher = request.app.state.dispatcher
+        profile = dispatcher.profiler.allows_force(request.headers.get("x-skideal-profile"))
+        leases = dispatcher.leases
+        accepted = 0
+        for message in parse_webhook(payload, profile=profile):
+            message.seq = await leases.enqueue(message.thread_id, message.message_id)
+            if message.seq is None:
+                # WhatsApp redelivers webhooks it considers unacknowledged,
+                # possibly to another worker
+                continue
+            if not dispatcher.submit(message):
+                await leases.withdraw(message.thread_id, message.message_id, message.seq)
+                logger.warning("Dispatcher saturated; shedding webhook")
+                return JSONResponse(
+                    {"status": "busy"}, status_code=503, headers={"Retry-After": "5"}
+                )
+            accepted += 1
+        return JSONResponse({"status": "accepted", "messages": accepted})
+
+    async def health(request: Request) -> Response:
+        dispatcher: ConversationDispatcher = request.app.state.dispatcher
+        body: dict[str, Any] = {
+            "status": "ok",
+            "pending": dispatcher.pending,
+            "active_threads": dispatcher.active_threads,
+            "coalesced": dispatcher.coalesced,
+            "superseded": dispatcher.superseded,
+            "fenced": dispatcher.fenced,
+            "out_of_order": dispatcher.out_of_order,
+        }
+        admission = get_admission_controller()
+        if admission is not None:
+            body["admission"] = admission.stats()
+        return JSONResponse(body)
+
+    async def metrics(request: Request) -> Response:
+        return PlainTextResponse(
+            get_metrics_registry().render_prometheus(),
+            media_type="text/plain; version=0.0.4",
+        )
+
+    @asynccontextmanager
+    async def lifespan(app: Starlette) -> AsyncIterator[None]:
+        if dispatcher is not None:
+            yield
+            await dispatcher.join()
+            return
+        from agent.graph import make_graph
+
+        path = os.environ.get("SKIDEAL_CHECKPOINT_PATH", "checkpoints.db")
+        async with open_checkpointer(path) as checkpointer:
+            cloud_sender = CloudAPISender(
+                os.environ["WHATSAPP_TOKEN"], os.environ["WHATSAPP_PHONE_NUMBER_ID"]
+            )
+            default = ConversationDispatcher(
+                make_graph(checkpointer=checkpointer),
+                cloud_sender,
+                max_concurrency=int(os.environ.get("SKIDEAL_MAX_CONCURRENCY", "32")),
+                max_pending=int(os.environ.get("SKIDEAL_MAX_PENDING", "1000")),
+                debounce=float(os.environ.get("SKIDEAL_DEBOUNCE_SECONDS", "1.0")) or None,
+            )
+            app.state.dispatcher = default
+            try:
+                yield
+                await default.join()
+            finally:
+                await cloud_sender.aclose()
+
+    app = Starlette(
+        routes=[
+            Route("/webhook", verify, methods=["GET"]),
+            Route("/webhook", receive, methods=["POST"]),
+            Route("/healthz", health, methods=["GET"]),
+            Route("/metrics", metrics, methods=["GET"]),
+        ],
+        lifespan=lifespan,
+    )
+    app.state.dispatcher = dispatcher
+    return app
@@ -0,0 +1,108 @@
+"""SkiDeal Bot - Conversation stages and the tools each stage needs.
+
+Every tool schema bound to the model is sent on every call. A greeting or a
+qualification question doesn't need the hotel search schemas, and a customer
+handing over contact details doesn't need the camp tools. The pre-model hook
+classifies each customer turn into a stage with cheap rules over the last
+customer message and the lead record, and the graph binds only that stage's
+tools:
+
+- ``discovery``: nothing concrete yet (greeting, general questions)
+- ``recommendation``: a destination, hotel or hotel feature is on the table
+- ``camps``: the customer asks about ski camps or ski school
+- ``closing``: contact details were given or the customer wants to book
+
+`handoff_to_agent` is bound in every stage. The tool node always runs every
+tool, so a call to a tool outside the stage still works.
+"""
+
+from __future__ import annotations
+
+import re
+from typing import Literal, Sequence
+
+from langchain_core.messages import BaseMessage, HumanMessage
+
+from agent.lead_state import CONTACT_FIELDS, LeadRecord, extract_lead_fields
+
+Stage = Literal["discovery", "recommendation", "camps", "closing"]
+
+STAGE_TOOLS: dict[Stage, tuple[str, ...]] = {
+    "discovery": (
+        "get_available_destinations",
+        "compare_resorts",
+        "get_kosher_info",
+        "handoff_to_agent",
+    ),
+    "recommendation": (
+        "get_available_destinations",
+        "get_hotels_list",
+        "get_hotel_info",
+        "search_hotels_by_criteria",
+        "search_knowledge",
+        "compare_resorts",
+        "get_kosher_info",
+        "get_live_quote",
+        "handoff_to_agent",
+    ),
+    "camps": (
+        "get_camp_resorts",
+        "compare_resorts",
+        "get_resort_camps_info",
+        "get_camps_info",
+        "get_hotels_list",
+        "get_hotel_info",
+        "search_knowledge",
+        "handoff_to_agent",
+    ),
+    "closing": (
+        "get_hotel_info",
+        "get_live_quote",
+        "handoff_to_agent",
+    ),
+}
+
+_CAMPS = re.compile(
+    r"קייטנ\w*|בית\s*ספר\s*(?:ל)?סקי|סקי\s*סקול|מדריכ\w*|שיעור\w*|ski\s*school|camps?\b",
+    re.IGNORECASE,
+)
+_BOOKING = re.compile(
+    r"להזמין|לסגור|נסגור|סוגרים|עירבון|מקדמה|נציג|שיחזרו|תחזרו|book(?:ing)?\b",
+    re.IGNORECASE,
+)
+_HOTELS = re.compile(
+    r"מלונ\w*|מלון|דיר(?:ה|ות)|ספא|כוכבים|רכבל|מחיר\w*|עולה|עלות|"
+    r"hotels?\b|spa\b|apartments?\b|prices?\b",
+    re.IGNORECASE,
+)
+_RECOMMENDATION_FIELDS = ("destination", "hotel_preference", "spa_preference")
+
+
+def last_customer_message(messages: Sequence[BaseMessage]) -> str:
+    """Text of the most recent customer message ("" if there is none)."""
+    for message in reversed(messages):
+        if isinstance(message, HumanMessage):
+            return message.text
+    return ""
+
+
+def detect_stage(messages: Sequence[BaseMessage], lead: LeadRecord | None) -> Stage:
+    """Classify the current customer turn.
+
+    The last customer message decides first (it may change the subject),
+    then the lead collected so far.
+    """
+    text = last_customer_message(messages)
+    found = extract_lead_fields(text)
+    if _CAMPS.search(text):
+        return "camps"
+    if any(f in found for f in CONTACT_FIELDS) or _BOOKING.search(text):
+        return "closing"
+    if any(f in found for f in _RECOMMENDATION_FIELDS) or _HOTELS.search(text):
+        return "recommendation"
+    lead = lead or LeadRecord()
+    if all(f in lead for f in CONTACT_FIELDS):
+        return "closing"
+    if any(f in lead for f in _RECOMMENDATION_FIELDS):
+        return "recommendation"
+    return "discovery"
@@ -0,0 +1,163 @@
+"""SkiDeal Bot - Thread-scoped tool result memo.
+
+Within a conversation the model often asks again for a hotel card or the
+destination list it fetched a few turns ago, and every copy used to stay in
+the context as another full ToolMessage. Two layers keep that out:
+
+- `ToolMemo`, a `ToolNode` wrapper, remembers per thread which tool call
+  answered each (tool, normalized arguments, data version). A repeated call
+  whose earlier answer is still in the model's context window gets a short
+  reference to it instead of the full payload. The data version is the
+  catalog fingerprint, so a rebuilt catalog runs the tools again. Live and
+  side-effecting tools (`UNCACHED_TOOLS`) always run.
+- `collapse_duplicate_results`, applied by the pre-model hook to the model
+  input, replaces every later ToolMessage whose content repeats an earlier
+  one of the same tool (e.g. history from before the memo, or two argument
+  spellings with the same answer) with the same short reference. Earlier
+  messages are never rewritten, so the cached prompt prefix stays stable.
+
+Failed results ("לא נמצא...") are not memoized.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Sequence
+
+from langchain_core.messages import AnyMessage, ToolMessage
+from langgraph.prebuilt.tool_node import ToolCallRequest
+from langgraph.types import Command
+
+from agent.data.catalog import get_catalog
+from agent.lead_state import trim_history
+from agent.loop_guard import call_key, is_failed_result
+
+ToolResult = ToolMessage | Command[Any]
+
+# Live data or side effects: never answered from the memo
+UNCACHED_TOOLS = frozenset({"get_live_quote", "handoff_to_agent"})
+
+
+def reference(tool: str) -> str:
+    """Short stand-in for a result already shown earlier in the conversation."""
+    return f"זהה לתוצאה הקודמת של {tool} עם אותם פרמטרים - ראו למעלה."
+
+
+def collapse_duplicate_results(messages: Sequence[AnyMessage]) -> list[AnyMessage]:
+    """Replace ToolMessages repeating an earlier result of the same tool by a reference."""
+    seen: set[tuple[str, str]] = set()
+    collapsed: list[AnyMessage] = []
+    for message in messages:
+        if isinstance(message, ToolMessage) and message.name:
+            text = message.text
+            key = (message.name, hashlib.sha1(text.encode()).hexdigest())
+            short = reference(message.name)
+            if key in seen and len(text) > len(short):
+                message = message.model_copy(update={"content": short})
+            seen.add(key)
+        collapsed.append(message)
+    return collapsed
+
+
+class ToolMemo:
+    """Per-thread memo of tool results (``wrap_tool_call`` / ``awrap_tool_call``)."""
+
+    def __init__(self, max_threads: int = 1000, max_entries: int = 64) -> None:
+        """Keep ``max_entries`` results for each of the ``max_threads`` latest threads."""
+        self.max_threads = max_threads
+        self.max_entries = max_entries
+        # thread_id -> memo key -> id of the tool call that answered it
+        self._threads: OrderedDict[str, OrderedDict[str, str]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, request: ToolCallRequest) -> tuple[str, str] | None:
+        call = request.tool_call
+        if call["name"] in UNCACHED_TOOLS:
+            return None
+        config = getattr(request.runtime, "config", None) or {}
+        thread_id = config.get("configurable", {}).get("thread_id")
+        if thread_id is None:
+            return None
+        version = get_catalog().fingerprint
+        return str(thread_id), f"{version}:{call_key(call['name'], call.get('args') or {})}"
+
+    def _lookup(self, request: ToolCallRequest, key: tuple[str, str]) -> ToolMessage | None:
+        thread_id, memo_key = key
+        with self._lock:
+            memo = self._threads.get(thread_id)
+            earlier = memo.get(memo_key) if memo else None
+        if earlier is None:
+            return None
+        # Only a reference the model can still see is useful
+        messages = (request.state or {}).get("messages", [])
+        visible = {
+            m.tool_call_id for m in trim_history(messages) if isinstance(m, ToolMessage)
+        }
+        if earlier not in visible:
+            return None
+        call = request.tool_call
+        return ToolMessage(reference(call["name"]), tool_call_id=call["id"], name=call["name"])
+
+    def _store(self, key: tuple[str, str], result: ToolResult) -> None:
+        if not isinstance(result, ToolMessage) or is_failed_result(result):
+            return
+        thread_id, memo_key = key
+        with self._lock:
+            memo = self._threads.setdefault(thread_id, OrderedDict())
+            self._threads.move_to_end(thread_id)
+            memo[memo_key] = result.tool_call_id
+            memo.move_to_end(memo_key)
+            if len(memo) > self.max_entries:
+                memo.popitem(last=False)
+            if len(self._threads) > self.max_threads:
+                self._threads.popitem(last=False)
+
+    def _count(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def wrap(
+        self,
+        request: ToolCallRequest,
+        execute: Callable[[ToolCallRequest], ToolResult],
+    ) -> ToolResult:
+        """Answer a repeated call from the memo, or run it and remember it."""
+        key = self._key(request)
+        if key is None:
+            return execute(request)
+        cached = self._lookup(request, key)
+        self._count(cached is not None)
+        if cached is not None:
+            return cached
+        result = execute(request)
+        self._store(key, result)
+        return result
+
+    async def awrap(
+        self,
+        request: ToolCallRequest,
+        execute: Callable[[ToolCallRequest], Awaitable[ToolResult]],
+    ) -> ToolResult:
+        """Async variant of `wrap`."""
+        key = self._key(request)
+        if key is None:
+            return await execute(request)
+        cached = self._lookup(request, key)
+        self._count(cached is not None)
+        if cached is not None:
+            return cached
+        result = await execute(request)
+        self._store(key, result)
+        return result
+
+    def stats(self) -> dict[str, Any]:
+        """Hit and miss counts."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "threads": len(self._threads)}
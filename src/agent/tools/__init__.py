@@ -4,10 +4,13 @@ from agent.tools.get_available_destinations import get_available_destinations
 from agent.tools.get_hotels_list import get_hotels_list
 from agent.tools.get_hotel_info import get_hotel_info
 from agent.tools.search_hotels_by_criteria import search_hotels_by_criteria
+from agent.tools.search_knowledge import search_knowledge
+from agent.tools.compare_resorts import compare_resorts
 from agent.tools.get_resort_camps_info import get_resort_camps_info
 from agent.tools.get_camp_resorts import get_camp_resorts
 from agent.tools.get_camps_info import get_camps_info
 from agent.tools.get_kosher_info import get_kosher_info
+from agent.tools.get_live_quote import get_live_quote
 from agent.tools.handoff_to_agent import handoff_to_agent
 
 __all__ = [
@@ -15,10 +18,13 @@ __all__ = [
     "get_hotels_list",
     "get_hotel_info",
     "search_hotels_by_criteria",
+    "search_knowledge",
+    "compare_resorts",
     "get_resort_camps_info",
     "get_camp_resorts",
     "get_camps_info",
     "get_kosher_info",
+    "get_live_quote",
     "handoff_to_agent",
 ]
 
@@ -0,0 +1,33 @@
+"""Tool to compare resorts side by side."""
+
+import json
+from typing import Any
+
+from langchain_core.tools import tool
+
+from agent.data.comparison import get_resort_comparison
+
+
+@tool
+def compare_resorts(resorts: list[str] | None = None, country: str | None = None) -> str:
+    """Compare ski resorts side by side in one call.
+
+    Use it for "which resort is best for us" questions instead of fetching
+    every resort: per resort it returns the number of hotels, star ratings,
+    average booking score, share of hotels with spa, camps and their ages,
+    and the holiday credits (flights, ski pass, transfers) in euros.
+
+    Args:
+        resorts: Resort names in Hebrew (e.g., ["ואל טורנס", "בנסקו"])
+        country: All resorts of a country in Hebrew (e.g., "צרפת")
+
+    Returns:
+        JSON string with one row per resort.
+    """
+    rows, missing = get_resort_comparison().compare(resorts, country)
+    if not rows:
+        return "לא נמצאו אתרים להשוואה. נסה את get_available_destinations לרשימת האתרים."
+    result: dict[str, Any] = {"השוואת_אתרים": [row.to_dict() for row in rows]}
+    if missing:
+        result["לא_נמצאו"] = missing
+    return json.dumps(result, ensure_ascii=False)
@@ -10,11 +10,10 @@ from agent.data.camps import get_all_camp_resorts, get_camp_resorts_by_country
 def get_camp_resorts(country: str = None) -> str:
     """Get a list of all resorts that offer ski camps (קייטנות).
     
-    IMPORTANT: Resort names for camps may differ from hotel resort names!
-    For example, Bulgaria has: "בנסקו", "בנסקו שבוע", "בנסקו סופש", "בנסקו א-ה"
-    Each variant may have different camps and prices.
-    
-    Use this tool first to see available camp resorts before searching for specific camps.
+    Use it when the customer hasn't picked a resort yet. Some resorts have
+    several camp variants ("בנסקו שבוע", "בנסקו סופש", "בנסקו א-ה"), each with
+    different camps and prices; get_camps_info with the resort name ("בנסקו")
+    already returns all of them.
     
     Args:
         country: Optional - filter by country in Hebrew (e.g., "צרפת", "בולגריה", "איטליה")
@@ -31,13 +30,13 @@ def get_camp_resorts(country: str = None) -> str:
         result = {
             "מדינה": country,
             "אתרים_עם_קייטנות": resorts,
-            "הערה": "שים לב - שמות האתרים עשויים להיות שונים מאתרי המלונות (למשל: בנסקו שבוע, בנסקו סופש)"
+            "הערה": "get_camps_info עם שם האתר (למשל בנסקו) מחזיר את כל הווריאנטים שלו"
         }
     else:
         all_resorts = get_all_camp_resorts()
         result = {
             "אתרים_עם_קייטנות_לפי_מדינה": all_resorts,
-            "הערה": "שים לב - שמות האתרים עשויים להיות שונים מאתרי המלונות (למשל: בנסקו שבוע, בנסקו סופש)"
+            "הערה": "get_camps_info עם שם האתר (למשל בנסקו) מחזיר את כל הווריאנטים שלו"
         }
     
     return json.dumps(result, ensure_ascii=False, indent=2)
@@ -1,38 +1,90 @@
 """Tool to get detailed hotel information."""
 
 import json
+from typing import Any, Callable, Literal
+
 from langchain_core.tools import tool
 
 from agent.data.resorts import get_hotel_by_name
 
+HotelSection = Literal["location", "spa", "rooms", "services", "checkin"]
 
-@tool
-def get_hotel_info(hotel_name: str) -> str:
-    """Get detailed information about a specific ski hotel.
-    
-    Args:
-        hotel_name: The hotel name in English (e.g., "Sporting", "Lucky", "Gudauri Lodge")
-    
-    Returns:
-        Complete details about the hotel including rooms, amenities, spa, dining, and agent notes.
-    """
-    if not hotel_name:
-        return "שגיאה: חייב לספק שם מלון"
-    
-    hotel = get_hotel_by_name(hotel_name)
-    
-    if not hotel:
-        return f"לא נמצא מלון בשם '{hotel_name}'. השתמש ב-get_hotels_list כדי לראות את רשימת המלונות."
-    
-    # Format the hotel data for the agent
-    dry_data = hotel.get("נתונים יבשים", {})
+
+def _location(hotel: dict[str, Any]) -> dict[str, Any]:
     location = hotel.get("מיקום", {})
+    return {
+        "תיאור": location.get("תיאור מיקום המלון", ""),
+        "מרחק_מהרכבל": location.get("מרחק מהרכבל", ""),
+        "מסלול_לרכבל": location.get("מסלול הליכה לרכבל", ""),
+        "מסלול_למרכז_העיירה": location.get("מסלול הליכה למרכז העיירה", ""),
+    }
+
+
+def _spa(hotel: dict[str, Any]) -> dict[str, Any]:
     spa_info = hotel.get("ספא", {})
+    return {
+        "עלות_כניסה": spa_info.get("עלות כניסה לספא", ""),
+        "תכולה": spa_info.get("תכולת ספא", ""),
+        "מגבלות": spa_info.get("מגבלות בשימוש הספא", ""),
+        "שירותים_בתשלום": spa_info.get("שרותי ספא בתשלום", ""),
+        "לבוש": spa_info.get("לבוש ספא", ""),
+    }
+
+
+def _rooms(hotel: dict[str, Any]) -> dict[str, Any]:
     rooms = hotel.get("חדרים", {})
+    return {
+        "מיטות_נפרדות": rooms.get("מיטות נפרדות", ""),
+        "דלת_מקשרת": rooms.get("חדרים עם דלת מקשרת", ""),
+        "אמבטיה_מקלחת": rooms.get("אמבטיה / מקלחת בחדר", ""),
+        "מספר_חדרים": rooms.get("מספר חדרים במלון", ""),
+        "סוגי_חדרים": rooms.get("שם החדרים בעברית", ""),
+        "מפרט_חדרים": rooms.get("מפרט חדרים", ""),
+        "גודל_חדרים": rooms.get("גודל חדרים (הערכה)", ""),
+        "מרפסת": rooms.get("האם יש מרפסת בחדרים", ""),
+        "מטבח": rooms.get("תכולת מטבח", ""),
+        "הערות_חשובות": rooms.get("הערות חשובות", ""),
+    }
+
+
+def _services(hotel: dict[str, Any]) -> dict[str, Any]:
     services = hotel.get("שירותי מלון", {})
+    return {
+        "שאטלים": services.get("שאטלים מהמלון", ""),
+        "חדר_כושר": services.get("חדר כושר", ""),
+        "מתקנים_נוספים": services.get("מתקנים נוספים במלון", ""),
+        "סקי_רום": services.get("סקי רום", ""),
+        "חניה": services.get("חניה", ""),
+        "קבלה": services.get("קבלה", ""),
+        "ארוחות": services.get("ארוחות", ""),
+    }
+
+
+def _checkin(hotel: dict[str, Any]) -> str:
     checkin = hotel.get("צק אין מתחת ל-18", {})
-    
-    formatted = {
+    return str(checkin.get("חובה מבוגר בצק אין/ אין חובה במבוגר אך יש צורך באישור כתוב מהורה", ""))
+
+
+# Detail sections: output key, what the card says they hold, and their builder
+SECTIONS: dict[str, tuple[str, str, Callable[[dict[str, Any]], Any]]] = {
+    "location": ("מיקום", "תיאור מיקום ומסלולי הליכה לרכבל ולמרכז", _location),
+    "spa": ("ספא", "תכולה, עלות, מגבלות ולבוש", _spa),
+    "rooms": ("חדרים", "סוגי חדרים, מיטות, גודל, מרפסת ומטבח", _rooms),
+    "services": ("שירותי_מלון", "שאטלים, ארוחות, חניה, סקי רום ומתקנים", _services),
+    "checkin": ("צק_אין_קטינים", "כללי צ'ק אין לקטינים", _checkin),
+}
+
+
+def _has_content(value: Any) -> bool:
+    if isinstance(value, dict):
+        return any(_has_content(v) for v in value.values())
+    return value not in ("", None, "חסר מידע")
+
+
+def hotel_card(hotel: dict[str, Any]) -> dict[str, Any]:
+    """Compact hotel summary listing the detail sections that have data."""
+    dry_data = hotel.get("נתונים יבשים", {})
+    card = {
         "פרטים_בסיסיים": {
             "שם_אנגלית": hotel.get("שם מלון באנגלית", ""),
             "שם_עברית": dry_data.get("שם מלון בעברית", ""),
@@ -43,42 +95,53 @@ def get_hotel_info(hotel_name: str) -> str:
             "ציון_בוקינג": dry_data.get("ציון בוקינג", ""),
             "לינק_לאתר": dry_data.get("לינק לאתר", ""),
         },
-        "מיקום": {
-            "תיאור": location.get("תיאור מיקום המלון", ""),
-            "מרחק_מהרכבל": location.get("מרחק מהרכבל", ""),
-            "מסלול_לרכבל": location.get("מסלול הליכה לרכבל", ""),
-            "מסלול_למרכז_העיירה": location.get("מסלול הליכה למרכז העיירה", ""),
-        },
-        "ספא": {
-            "עלות_כניסה": spa_info.get("עלות כניסה לספא", ""),
-            "תכולה": spa_info.get("תכולת ספא", ""),
-            "מגבלות": spa_info.get("מגבלות בשימוש הספא", ""),
-            "שירותים_בתשלום": spa_info.get("שרותי ספא בתשלום", ""),
-            "לבוש": spa_info.get("לבוש ספא", ""),
-        },
-        "חדרים": {
-            "מיטות_נפרדות": rooms.get("מיטות נפרדות", ""),
-            "דלת_מקשרת": rooms.get("חדרים עם דלת מקשרת", ""),
-            "אמבטיה_מקלחת": rooms.get("אמבטיה / מקלחת בחדר", ""),
-            "מספר_חדרים": rooms.get("מספר חדרים במלון", ""),
-            "סוגי_חדרים": rooms.get("שם החדרים בעברית", ""),
-            "מפרט_חדרים": rooms.get("מפרט חדרים", ""),
-            "גודל_חדרים": rooms.get("גודל חדרים (הערכה)", ""),
-            "מרפסת": rooms.get("האם יש מרפסת בחדרים", ""),
-            "מטבח": rooms.get("תכולת מטבח", ""),
-            "הערות_חשובות": rooms.get("הערות חשובות", ""),
-        },
-        "שירותי_מלון": {
-            "שאטלים": services.get("שאטלים מהמלון", ""),
-            "חדר_כושר": services.get("חדר כושר", ""),
-            "מתקנים_נוספים": services.get("מתקנים נוספים במלון", ""),
-            "סקי_רום": services.get("סקי רום", ""),
-            "חניה": services.get("חניה", ""),
-            "קבלה": services.get("קבלה", ""),
-            "ארוחות": services.get("ארוחות", ""),
-        },
-        "צק_אין_קטינים": checkin.get("חובה מבוגר בצק אין/ אין חובה במבוגר אך יש צורך באישור כתוב מהורה", ""),
+        "מרחק_מהרכבל": hotel.get("מיקום", {}).get("מרחק מהרכבל", ""),
+        "כניסה_לספא": hotel.get("ספא", {}).get("עלות כניסה לספא", ""),
     }
-    
-    return json.dumps(formatted, ensure_ascii=False, indent=2)
+    notes = hotel.get("חדרים", {}).get("הערות חשובות", "")
+    if _has_content(notes):
+        card["הערות_חשובות"] = notes
+    card["מקטעים_זמינים"] = {
+        name: description
+        for name, (_, description, build) in SECTIONS.items()
+        if _has_content(build(hotel))
+    }
+    return card
+
+
+@tool
+def get_hotel_info(hotel_name: str, sections: list[HotelSection] | None = None) -> str:
+    """Get information about a specific ski hotel.
 
+    Without sections, returns a compact card: basics, distance to the lifts,
+    spa entry, important notes and the list of available detail sections.
+    Ask for detail sections only when the customer asks about them.
+
+    Args:
+        hotel_name: The hotel name in English (e.g., "Sporting", "Lucky", "Gudauri Lodge")
+        sections: Optional - detail sections to add to the card:
+                  "location" (walking directions), "spa", "rooms", "services"
+                  (shuttles, meals, parking, ski room), "checkin" (minors check-in).
+                  Example: ["rooms", "spa"]
+
+    Returns:
+        JSON string with the hotel card and any requested sections.
+    """
+    if not hotel_name:
+        return "שגיאה: חייב לספק שם מלון"
+
+    hotel = get_hotel_by_name(hotel_name)
+
+    if not hotel:
+        return f"לא נמצא מלון בשם '{hotel_name}'. השתמש ב-get_hotels_list כדי לראות את רשימת המלונות."
+
+    unknown = [s for s in sections or [] if s not in SECTIONS]
+    if unknown:
+        return f"שגיאה: מקטעים לא מוכרים {unknown}. מקטעים אפשריים: {list(SECTIONS)}"
+
+    formatted = hotel_card(hotel)
+    for name in dict.fromkeys(sections or []):
+        key, _, build = SECTIONS[name]
+        formatted[key] = build(hotel)
+
+    return json.dumps(formatted, ensure_ascii=False, indent=2)
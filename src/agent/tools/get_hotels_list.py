@@ -1,6 +1,8 @@
 """Tool to get list of hotels."""
 
 import json
+from typing import Any, Sequence
+
 from langchain_core.tools import tool
 
 from agent.data.resorts import (
@@ -21,6 +23,7 @@ def get_hotels_list(country: str = None, resort: str = None) -> str:
     Returns:
         JSON string with list of hotels including name, location, star rating, and who it's suitable for.
     """
+    hotels: Sequence[dict[str, Any]]
     if resort:
         hotels = get_hotels_by_resort(resort)
     elif country:
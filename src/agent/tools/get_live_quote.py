@@ -0,0 +1,93 @@
+"""Tool to get a live price and availability quote for a hotel."""
+
+import json
+from datetime import date
+
+from langchain_core.tools import tool
+
+from agent.data.resorts import get_hotels
+from agent.pricing import PricingError, QuoteRequest, get_pricing_client
+
+UNAVAILABLE = "אין כרגע חיבור למערכת המחירים. אל תמציאי מחיר - העבירי לנציג שיחזור עם הצעת מחיר."
+
+
+@tool
+def get_live_quote(
+    hotel_name: str,
+    check_in: str,
+    check_out: str,
+    adults: int,
+    children: int = 0,
+    resort: str | None = None,
+) -> str:
+    """Get a live price and availability quote for a hotel from the booking system.
+
+    Use it when the customer asks what a hotel costs for their dates. Quote
+    only the returned price; if there is no quote, hand off to an agent.
+
+    Args:
+        hotel_name: The hotel name in English (e.g., "Lucky")
+        check_in: Arrival date, YYYY-MM-DD
+        check_out: Departure date, YYYY-MM-DD
+        adults: Number of adults
+        children: Number of children
+        resort: Optional - the resort, when the hotel name exists in several resorts
+
+    Returns:
+        JSON string with availability and the total price, or an explanation.
+    """
+    try:
+        nights = (date.fromisoformat(check_out) - date.fromisoformat(check_in)).days
+    except ValueError:
+        return "שגיאה: תאריכים בפורמט YYYY-MM-DD בלבד"
+    if nights <= 0:
+        return "שגיאה: תאריך העזיבה חייב להיות אחרי תאריך ההגעה"
+    if adults < 1 or children < 0:
+        return "שגיאה: צריך לפחות מבוגר אחד"
+
+    hotels = get_hotels().where(name=hotel_name, resort=resort)
+    if not hotels:
+        return f"לא נמצא מלון בשם '{hotel_name}'. השתמש ב-get_hotels_list כדי לראות את רשימת המלונות."
+    resorts = sorted({h.get("אתר", "") for h in hotels})
+    if len(resorts) > 1:
+        return f"יש מלון בשם '{hotel_name}' בכמה אתרים: {resorts}. ציין resort."
+    hotel = hotels[0]
+
+    client = get_pricing_client()
+    if client is None:
+        return UNAVAILABLE
+    request = QuoteRequest(
+        hotel=hotel.get("שם מלון באנגלית", hotel_name),
+        resort=hotel.get("אתר", ""),
+        check_in=check_in,
+        check_out=check_out,
+        adults=adults,
+        children=children,
+    )
+    try:
+        quote = client.quote(request)
+    except PricingError:
+        return UNAVAILABLE
+
+    result = {
+        "מלון": request.hotel,
+        "אתר": request.resort,
+        "תאריכים": f"{check_in} - {check_out}",
+        "לילות": nights,
+        "מבוגרים": adults,
+        "ילדים": children,
+        "זמין": bool(quote.get("available")),
+    }
+    if result["זמין"]:
+        result.update(
+            {
+                "מחיר_כולל": quote.get("total"),
+                "מטבע": quote.get("currency", ""),
+                "פנסיון": quote.get("board", ""),
+                "חדר": quote.get("room", ""),
+                "מקור": "מחיר חי ממערכת ההזמנות - המחיר הסופי נסגר מול הנציג",
+            }
+        )
+    else:
+        result["הערה"] = "אין זמינות לתאריכים ולהרכב האלה - הציעי תאריכים או מלון אחר"
+    return json.dumps(result, ensure_ascii=False, indent=2)
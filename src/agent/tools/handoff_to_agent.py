@@ -1,8 +1,16 @@
 """Tool for handing off conversation to a human agent."""
 
 import json
+import logging
 import re
+from typing import Annotated, Any
+
 from langchain_core.tools import tool
+from langgraph.prebuilt import InjectedState
+
+from agent.outbox import get_outbox
+
+logger = logging.getLogger(__name__)
 
 
 def validate_phone(phone: str) -> tuple[bool, str]:
@@ -76,12 +84,17 @@ def handoff_to_agent(
     spa_preference: bool = None,
     insurance_interest: bool = None,
     additional_notes: str = None,
+    state: Annotated[dict[str, Any] | None, InjectedState] = None,
 ) -> str:
     """Hand off the conversation to a human sales agent with all collected details.
     
     IMPORTANT: This tool validates inputs! If validation fails, you must collect
     the correct information from the customer before calling again.
     
+    The customer's name, phone and email already collected in the conversation
+    state are filled in automatically. Pass every other detail explicitly, and
+    only once the customer confirmed it.
+    
     Use this tool when:
     - Customer is ready to book/close the deal
     - Payment details need to be collected
@@ -108,6 +121,14 @@ def handoff_to_agent(
     Returns:
         Confirmation message with handoff summary, or validation errors if inputs are invalid.
     """
+    # Fill in contact details the model didn't pass from the lead in state.
+    # They passed the validators below when extracted; the rest of the lead is
+    # a keyword heuristic, so it only reaches the CRM through the model.
+    lead: dict[str, Any] = (state or {}).get("lead") or {}
+    customer_name = customer_name or lead.get("customer_name", "")
+    phone = phone or lead.get("phone", "")
+    email = email or lead.get("email", "")
+    
     # Validate inputs
     validation_errors = []
     
@@ -176,15 +197,13 @@ def handoff_to_agent(
     if insurance_interest is not None:
         summary["העדפות"]["ביטוח_Trip_Guaranty"] = "כן" if insurance_interest else "לא"
     
-    # Print the handoff summary
-    print("\n" + "=" * 60)
-    print("🔔 העברה לנציג אנושי - סיכום שיחה")
-    print("=" * 60)
-    print(json.dumps(summary, ensure_ascii=False, indent=2))
-    print("=" * 60 + "\n")
+    # Queue the lead for the CRM; delivery happens in the background
+    reference = get_outbox().enqueue(summary)
+    logger.info("Handoff queued (%s): %s", reference[:8], json.dumps(summary, ensure_ascii=False))
     
     return json.dumps({
         "סטטוס": "הועבר לנציג",
         "הודעה": "פרטי הלקוח הועברו לנציג אנושי שייצור קשר בהקדם.",
+        "מספר_פנייה": reference[:8],
         "סיכום": summary,
     }, ensure_ascii=False, indent=2)
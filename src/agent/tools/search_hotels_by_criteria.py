@@ -1,42 +1,119 @@
 """Tool to search hotels by criteria."""
 
 import json
+from typing import Any
+
 from langchain_core.tools import tool
 
-from agent.data.resorts import search_hotels
+from agent.data.resorts import (
+    get_distance_between,
+    get_distance_to_lift,
+    get_facet_counts,
+    get_hotel_location,
+    search_hotels,
+)
+
+
+def _unknown_lift_distance(**criteria: Any) -> int:
+    """Count the hotels matching ``criteria`` whose distance to the lift is unknown."""
+    return sum(get_distance_to_lift(hotel) is None for hotel in search_hotels(**criteria))
 
 
 @tool
 def search_hotels_by_criteria(
-    country: str = None,
-    resort: str = None,
-    min_stars: int = None,
-    has_spa: bool = None,
-    suitable_for: str = None
+    country: str | None = None,
+    resort: str | None = None,
+    min_stars: int | None = None,
+    has_spa: bool | None = None,
+    suitable_for: str | None = None,
+    needs_separate_beds: bool | None = None,
+    needs_connecting_rooms: bool | None = None,
+    needs_balcony: bool | None = None,
+    needs_kitchen: bool | None = None,
+    needs_ski_room: bool | None = None,
+    needs_shuttle: bool | None = None,
+    needs_parking: bool | None = None,
+    max_distance_to_lift_m: int | None = None,
+    near_hotel: str | None = None,
 ) -> str:
     """Search for ski hotels matching specific criteria.
     
+    The needs_* filters answer family-logistics questions in one call. Set
+    only the ones the customer needs; they match hotels that definitely have
+    the feature (not "on request" or missing info).
+    
     Args:
         country: Filter by country in Hebrew (e.g., "אוסטריה", "צרפת", "איטליה")
         resort: Filter by resort in Hebrew (e.g., "ואל טורנס", "אישגיל")
         min_stars: Minimum star rating (3, 4, or 5)
         has_spa: If True, only show hotels with spa facilities
         suitable_for: Target audience in Hebrew (e.g., "זוגות", "משפחה", "שלשות")
+        needs_separate_beds: Separate beds
+        needs_connecting_rooms: Connecting rooms
+        needs_balcony: A balcony in every room
+        needs_kitchen: A kitchen in the room
+        needs_ski_room: A ski room
+        needs_shuttle: A shuttle from the hotel
+        needs_parking: Parking
+        max_distance_to_lift_m: Max meters to the main lift (e.g. 300 for ski-in);
+            hotels without a known distance are left out and counted
+        near_hotel: English hotel name; returns the hotels closest to it
     
     Returns:
         List of matching hotels with key details.
     """
-    hotels = search_hotels(
+    needs = {
+        "separate_beds": needs_separate_beds,
+        "connecting_rooms": needs_connecting_rooms,
+        "balcony": needs_balcony,
+        "kitchen": needs_kitchen,
+        "ski_room": needs_ski_room,
+        "shuttle": needs_shuttle,
+        "parking": needs_parking,
+    }
+    facets = [name for name, needed in needs.items() if needed]
+    criteria: dict[str, Any] = dict(
         country=country,
         resort=resort,
         min_stars=min_stars,
         has_spa=has_spa,
-        suitable_for=suitable_for
+        suitable_for=suitable_for,
+    )
+    hotels = search_hotels(
+        **criteria,
+        facets=facets,
+        max_distance_to_lift_m=max_distance_to_lift_m,
+        near_hotel=near_hotel,
     )
+    # Most hotels have no pinned location; say how many the distance filter
+    # could not judge instead of silently dropping them
+    unknown_distance = 0
+    if max_distance_to_lift_m is not None:
+        unknown_distance = _unknown_lift_distance(
+            **criteria, facets=facets, near_hotel=near_hotel
+        )
     
     if not hotels:
+        if near_hotel and get_hotel_location(near_hotel, resort) is None:
+            return f"אין מיקום מדויק למלון {near_hotel}. נסה לחפש לפי אתר."
+        if facets:
+            # Hotels that may still qualify: the answer is missing or "on request"
+            counts = get_facet_counts(search_hotels(**criteria))
+            unknown = ", ".join(f"{name}: {counts[name]['unknown']}" for name in facets)
+            return (
+                "לא נמצאו מלונות שבוודאות עונים על הקריטריונים. "
+                f"מלונות שחסר עליהם מידע או שזה בבקשה מיוחדת ({unknown}) - "
+                "אפשר לבדוק מול נציג או להרחיב את החיפוש."
+            )
+        if unknown_distance:
+            return (
+                f"לא נמצאו מלונות במרחק של עד {max_distance_to_lift_m} מטר מהרכבל. "
+                f"ל-{unknown_distance} מלונות נוספים שעונים על שאר הקריטריונים אין "
+                "מרחק ידוע מהרכבל - אפשר לחפש בלי מגבלת מרחק או לבדוק מול נציג."
+            )
         return "לא נמצאו מלונות התואמים לקריטריונים. נסה להרחיב את החיפוש."
     
+    anchor = get_hotel_location(near_hotel, resort) if near_hotel else None
     results = []
     for hotel in hotels:
         dry_data = hotel.get("נתונים יבשים", {})
@@ -56,6 +133,21 @@ def search_hotels_by_criteria(
             "ספא": spa_info.get("עלות כניסה לספא", ""),
             "הערות_לסוכנים": rooms.get("הערות חשובות", ""),
         })
+        lift_m = get_distance_to_lift(hotel)
+        if lift_m is not None:
+            results[-1]["מרחק_מהרכבל_מטר"] = lift_m
+        if anchor is not None:
+            results[-1]["מרחק_מהמלון_מטר"] = get_distance_between(hotel, anchor[1])
     
+    if unknown_distance:
+        return json.dumps(
+            {
+                "מלונות": results,
+                "מלונות_ללא_מרחק_ידוע_מהרכבל": unknown_distance,
+                "הערה": "מלונות ללא מרחק ידוע לא נבדקו - ייתכן שגם הם קרובים לרכבל",
+            },
+            ensure_ascii=False,
+            indent=2,
+        )
     return json.dumps(results, ensure_ascii=False, indent=2)
 
@@ -0,0 +1,45 @@
+"""Tool to search the free-text notes of hotels and resorts."""
+
+import json
+
+from langchain_core.tools import tool
+
+from agent.knowledge import get_knowledge_index
+
+
+@tool
+def search_knowledge(query: str, country: str | None = None, resort: str | None = None) -> str:
+    """Search agent notes, room specs, spa, shuttle and resort notes by free text.
+
+    Use this for questions no structured field answers, e.g. "which hotel has
+    connecting rooms", "where is the apres-ski", "flight credit", instead of
+    fetching hotels one by one.
+
+    Args:
+        query: Search words in Hebrew (e.g., "דלת מקשרת", "אפרה סקי", "זיכוי טיסות")
+        country: Optional - limit to a country in Hebrew (e.g., "אוסטריה")
+        resort: Optional - limit to a resort in Hebrew (e.g., "ואל טורנס")
+
+    Returns:
+        JSON list of the best matching snippets with the hotel (or "כללי" for
+        resort-level notes), resort and field they come from.
+    """
+    if not query or not query.strip():
+        return "שגיאה: חייב לספק מילות חיפוש"
+
+    hits = get_knowledge_index().search(query, country=country, resort=resort)
+
+    if not hits:
+        return "לא נמצא מידע מתאים. נסה מילים אחרות או השתמש ב-get_hotel_info למלון ספציפי."
+
+    results = [
+        {
+            "מלון": hit.doc.hotel,
+            "אתר": hit.doc.resort,
+            "מדינה": hit.doc.country,
+            "שדה": hit.doc.field,
+            "קטע": hit.snippet,
+        }
+        for hit in hits
+    ]
+    return json.dumps(results, ensure_ascii=False, indent=2)
@@ -0,0 +1,318 @@
+"""SkiDeal Bot - Token, cost and latency accounting per conversation.
+
+`TimedModel` wraps every model call in the graph and stamps the response
+metadata with the model latency (``latency_ms``) and the wall time of the
+whole ReAct step (``step_ms``: since the previous model call of the turn
+ended, so tool execution and graph overhead are included). Together with the
+``usage_metadata`` Anthropic reports, each response in the conversation state
+yields a `StepUsage` record:
+
+- uncached input, cache read, cache write and output tokens, priced with
+  `MODEL_PRICING`,
+- model and step latency,
+- the tools the step called, which shows the stage of the sales flow.
+
+Records are derived from the messages (`usage_records`), so the graph state
+needs no extra keys. `summarize_usage` aggregates them per turn and per
+action, and the process-wide `UsageLedger` keeps per-thread totals to find
+the most expensive conversations.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Literal, Mapping, Sequence, get_args
+
+from langchain_core.language_models import LanguageModelInput
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.runnables import Runnable, RunnableConfig
+from typing_extensions import TypedDict
+
+from agent.profiling import record_phase
+
+# USD per million tokens: (input, output, cache write, cache read), matched by
+# model name prefix
+MODEL_PRICING: dict[str, tuple[float, float, float, float]] = {
+    "claude-opus-4": (15.00, 75.00, 18.75, 1.50),
+    "claude-sonnet-4": (3.00, 15.00, 3.75, 0.30),
+    "claude-3-7-sonnet": (3.00, 15.00, 3.75, 0.30),
+    "claude-haiku-4": (1.00, 5.00, 1.25, 0.10),
+    "claude-3-5-haiku": (0.80, 4.00, 1.00, 0.08),
+}
+
+# Action of a step that answers the customer without calling tools
+REPLY_ACTION = "reply"
+
+
+class StepUsage(TypedDict):
+    """Usage of one ReAct step (one model call)."""
+
+    turn: int
+    step: int
+    model: str
+    # Tool names called by the step, or "reply"
+    action: str
+    input_tokens: int
+    cache_read_tokens: int
+    cache_write_tokens: int
+    output_tokens: int
+    cost_usd: float
+    model_ms: float
+    step_ms: float
+
+
+def model_price(model: str) -> tuple[float, float, float, float] | None:
+    """Per-million-token prices for ``model`` (None when unknown)."""
+    for prefix in sorted(MODEL_PRICING, key=len, reverse=True):
+        if model.startswith(prefix):
+            return MODEL_PRICING[prefix]
+    return None
+
+
+def step_cost(
+    model: str, input_tokens: int, output_tokens: int, cache_write: int, cache_read: int
+) -> float:
+    """Cost of a model call in USD (0 for unknown models)."""
+    price = model_price(model)
+    if price is None:
+        return 0.0
+    tokens = (input_tokens, output_tokens, cache_write, cache_read)
+    return sum(t * p for t, p in zip(tokens, price)) / 1_000_000
+
+
+def message_action(message: BaseMessage) -> str:
+    """Name the tools a model response calls, or ``reply``."""
+    tool_calls = getattr(message, "tool_calls", None)
+    if not tool_calls:
+        return REPLY_ACTION
+    return ",".join(sorted({call["name"] for call in tool_calls}))
+
+
+def step_usage(message: BaseMessage, *, turn: int, step: int) -> StepUsage:
+    """Build the usage record of a stamped model response."""
+    usage: dict[str, Any] = getattr(message, "usage_metadata", None) or {}
+    details = usage.get("input_token_details") or {}
+    cache_read = details.get("cache_read", 0) or 0
+    cache_write = details.get("cache_creation", 0) or 0
+    # Anthropic's input count includes cached tokens; keep them apart
+    input_tokens = max(0, usage.get("input_tokens", 0) - cache_read - cache_write)
+    output_tokens = usage.get("output_tokens", 0)
+    metadata = message.response_metadata
+    model = metadata.get("model_name") or metadata.get("model") or ""
+    return StepUsage(
+        turn=turn,
+        step=step,
+        model=model,
+        action=message_action(message),
+        input_tokens=input_tokens,
+        cache_read_tokens=cache_read,
+        cache_write_tokens=cache_write,
+        output_tokens=output_tokens,
+        cost_usd=step_cost(model, input_tokens, output_tokens, cache_write, cache_read),
+        model_ms=float(metadata.get("latency_ms", 0.0)),
+        step_ms=float(metadata.get("step_ms", 0.0)),
+    )
+
+
+def usage_records(messages: Sequence[BaseMessage]) -> list[StepUsage]:
+    """Usage records of the model responses in a conversation.
+
+    Only responses stamped by `TimedModel` count; history replayed from
+    elsewhere (e.g. resent by a UI) carries no usage.
+    """
+    records: list[StepUsage] = []
+    turn = step = 0
+    for message in messages:
+        if isinstance(message, HumanMessage):
+            turn, step = turn + 1, 0
+        elif isinstance(message, AIMessage) and "latency_ms" in message.response_metadata:
+            records.append(step_usage(message, turn=turn, step=step))
+            step += 1
+    return records
+
+
+class TimedModel(Runnable[LanguageModelInput, BaseMessage]):
+    """Stamps timings into the response metadata and books the step's usage.
+
+    ``latency_ms`` is the model call (including admission wait and hedging),
+    ``step_ms`` the whole ReAct step since ``step_started_at``.
+    """
+
+    def __init__(
+        self,
+        bound: Runnable[LanguageModelInput, BaseMessage],
+        *,
+        turn: int = 0,
+        step: int = 0,
+        step_started_at: float | None = None,
+    ) -> None:
+        """Wrap ``bound`` for step ``step`` of customer turn ``turn``."""
+        self.bound = bound
+        self.turn = turn
+        self.step = step
+        self.step_started_at = step_started_at
+
+    @classmethod
+    def for_state(
+        cls, bound: Runnable[LanguageModelInput, BaseMessage], state: Mapping[str, Any]
+    ) -> TimedModel:
+        """Wrap ``bound`` for the next step of the conversation in ``state``.
+
+        The step starts when the previous model call of the turn ended, or
+        when the turn started.
+        """
+        started = state.get("turn_started_at") or time.time()
+        step = 0
+        for message in reversed(state["messages"]):
+            if isinstance(message, HumanMessage):
+                break
+            if isinstance(message, AIMessage):
+                if not step:
+                    finished = message.response_metadata.get("finished_at")
+                    started = max(started, finished or started)
+                step += 1
+        return cls(bound, turn=state.get("turn", 0), step=step, step_started_at=started)
+
+    def _stamp(
+        self, response: BaseMessage, start: float, config: RunnableConfig | None
+    ) -> BaseMessage:
+        now = time.time()
+        latency = time.perf_counter() - start
+        record_phase("model", latency)
+        metadata = response.response_metadata
+        metadata["latency_ms"] = round(latency * 1000, 3)
+        metadata["step_ms"] = round((now - (self.step_started_at or now)) * 1000, 3)
+        metadata["finished_at"] = now
+        thread_id = ((config or {}).get("configurable") or {}).get("thread_id")
+        if thread_id is not None:
+            get_usage_ledger().record(
+                str(thread_id), step_usage(response, turn=self.turn, step=self.step)
+            )
+        return response
+
+    def invoke(
+        self,
+        input: LanguageModelInput,
+        config: RunnableConfig | None = None,
+        **kwargs: Any,
+    ) -> BaseMessage:
+        """Call the model and stamp its timings."""
+        start = time.perf_counter()
+        return self._stamp(self.bound.invoke(input, config, **kwargs), start, config)
+
+    async def ainvoke(
+        self,
+        input: LanguageModelInput,
+        config: RunnableConfig | None = None,
+        **kwargs: Any,
+    ) -> BaseMessage:
+        """Call the model and stamp its timings."""
+        start = time.perf_counter()
+        return self._stamp(
+            await self.bound.ainvoke(input, config, **kwargs), start, config
+        )
+
+
+# ============================================================================
+# AGGREGATION
+# ============================================================================
+
+_Summed = Literal[
+    "input_tokens",
+    "cache_read_tokens",
+    "cache_write_tokens",
+    "output_tokens",
+    "cost_usd",
+    "model_ms",
+    "step_ms",
+]
+_SUMMED: tuple[_Summed, ...] = get_args(_Summed)
+
+
+def _totals(records: Sequence[StepUsage]) -> dict[str, Any]:
+    totals: dict[str, Any] = {"steps": len(records)}
+    for key in _SUMMED:
+        totals[key] = round(sum(r[key] for r in records), 6)
+    return totals
+
+
+def summarize_usage(records: Sequence[StepUsage]) -> dict[str, Any]:
+    """Totals for a conversation, per turn and per action."""
+    turns: dict[int, list[StepUsage]] = {}
+    actions: dict[str, list[StepUsage]] = {}
+    for record in records:
+        turns.setdefault(record["turn"], []).append(record)
+        actions.setdefault(record["action"], []).append(record)
+    return {
+        "total": _totals(records),
+        "turns": {turn: _totals(rs) for turn, rs in sorted(turns.items())},
+        "actions": {
+            action: _totals(rs)
+            for action, rs in sorted(
+                actions.items(), key=lambda item: -sum(r["cost_usd"] for r in item[1])
+            )
+        },
+    }
+
+
+def format_usage(records: Sequence[StepUsage]) -> str:
+    """Render a usage summary as plain text (for conversation exports)."""
+    summary = summarize_usage(records)
+    total = summary["total"]
+    lines = [
+        f"סה\"כ: {total['steps']} קריאות למודל | ${total['cost_usd']:.4f} | "
+        f"קלט {total['input_tokens']} (מטמון: {total['cache_read_tokens']} קריאה, "
+        f"{total['cache_write_tokens']} כתיבה) | פלט {total['output_tokens']} | "
+        f"{total['step_ms'] / 1000:.2f} שניות",
+    ]
+    for turn, t in summary["turns"].items():
+        lines.append(
+            f"תור {turn}: {t['steps']} קריאות | ${t['cost_usd']:.4f} | "
+            f"קלט {t['input_tokens'] + t['cache_read_tokens'] + t['cache_write_tokens']} | "
+            f"פלט {t['output_tokens']} | {t['step_ms'] / 1000:.2f} שניות"
+        )
+    return "\n".join(lines)
+
+
+class UsageLedger:
+    """Process-wide usage totals per (recent) conversation thread."""
+
+    def __init__(self, max_threads: int = 1000) -> None:
+        """Keep the steps of the ``max_threads`` most recent threads."""
+        self.max_threads = max_threads
+        self._lock = threading.Lock()
+        self._threads: OrderedDict[str, list[StepUsage]] = OrderedDict()
+
+    def record(self, thread_id: str, record: StepUsage) -> None:
+        """Add a step to its thread."""
+        with self._lock:
+            records = self._threads.get(thread_id)
+            if records is None:
+                records = self._threads[thread_id] = []
+                if len(self._threads) > self.max_threads:
+                    self._threads.popitem(last=False)
+            else:
+                self._threads.move_to_end(thread_id)
+            records.append(record)
+
+    def thread(self, thread_id: str) -> dict[str, Any]:
+        """Usage summary of one thread."""
+        with self._lock:
+            records = list(self._threads.get(thread_id, []))
+        return summarize_usage(records)
+
+    def top(self, n: int = 10, key: str = "cost_usd") -> list[tuple[str, dict[str, Any]]]:
+        """Return the ``n`` threads with the highest total ``key``."""
+        with self._lock:
+            threads = [(t, _totals(rs)) for t, rs in self._threads.items()]
+        return sorted(threads, key=lambda item: -item[1][key])[:n]
+
+
+_ledger = UsageLedger()
+
+
+def get_usage_ledger() -> UsageLedger:
+    """Get the process-wide usage ledger."""
+    return _ledger
@@ -0,0 +1,23 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from agent.benchmark import (
+    SCENARIOS,
+    compare,
+    format_report,
+    load_baselines,
+    run_scenario,
+)
+
+BASELINES = load_baselines(Path(__file__).with_name("baselines.json"))
+# Wall-clock gates flake on shared CI runners; opt in with SKIDEAL_BENCH_TIMING=1
+CHECK_TIMES = os.environ.get("SKIDEAL_BENCH_TIMING") == "1"
+
+
+@pytest.mark.parametrize("scenario", SCENARIOS, ids=lambda s: s.name)
+def test_scenario_has_no_regressions(scenario) -> None:
+    result = {scenario.name: run_scenario(scenario)}
+    assert scenario.name in BASELINES, "run `make benchmarks_update` to add a baseline"
+    assert compare(result, BASELINES, times=CHECK_TIMES) == [], format_report(result)
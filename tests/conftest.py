@@ -1,6 +1,19 @@
 import pytest
 
 
+class FakeWhatsAppSender:
+    def __init__(self):
+        self.sent = []
+
+    async def send(self, to, text):
+        self.sent.append((to, text))
+
+
 @pytest.fixture(scope="session")
 def anyio_backend():
     return "asyncio"
+
+
+@pytest.fixture
+def sender():
+    return FakeWhatsAppSender()
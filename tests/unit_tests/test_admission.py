@@ -0,0 +1,111 @@
+import asyncio
+import threading
+import time
+
+import pytest
+from langchain_core.messages import AIMessage
+
+from agent.admission import AdmissionController, AdmittedModel, TokenBucket
+from agent.fakes import FakeChatModel
+from agent.graph import make_graph
+from agent.latency import LatencyGuard, LatencyPolicy
+from agent.metrics import MetricsRegistry
+
+pytestmark = pytest.mark.anyio
+
+
+def test_token_bucket_refills_over_time() -> None:
+    bucket = TokenBucket(per_minute=60)
+    now = bucket.updated
+    assert bucket.delay_for(60, now) == 0
+    bucket.take(60, now)
+    assert bucket.delay_for(1, now) == pytest.approx(1.0)
+    assert bucket.delay_for(1, now + 1.0) == 0
+
+
+async def test_hot_leads_are_admitted_before_cold_greetings() -> None:
+    # 600 rpm with a burst of 1: one call every 100ms once saturated
+    controller = AdmissionController(requests_per_minute=600)
+    controller.requests.capacity = controller.requests.level = 1
+    await controller.aacquire(0)
+
+    order = []
+
+    async def call(name, priority):
+        await controller.aacquire(0, priority)
+        order.append(name)
+
+    tasks = [asyncio.create_task(call(f"cold{i}", 0.0)) for i in range(3)]
+    await asyncio.sleep(0.01)
+    tasks.append(asyncio.create_task(call("hot", 0.9)))
+    await asyncio.gather(*tasks)
+
+    assert order[0] == "hot"
+    stats = controller.stats()
+    assert stats["admitted"] == 5
+    assert stats["queue_depth"] == 0
+    assert stats["wait_seconds"]["max"] > 0.1
+
+
+def test_sync_callers_respect_token_budget() -> None:
+    controller = AdmissionController(tokens_per_minute=6000)
+    controller.acquire(6000)
+    start = time.monotonic()
+    threads = [threading.Thread(target=controller.acquire, args=(5,)) for _ in range(3)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(2)
+    assert time.monotonic() - start >= 0.1
+    assert controller.stats()["admitted"] == 4
+
+
+def test_settle_returns_unused_reservation() -> None:
+    controller = AdmissionController(tokens_per_minute=1000)
+    controller.acquire(1000)
+    controller.settle(1000, 200)
+    assert controller.tokens.level == pytest.approx(800, abs=1)
+
+
+async def test_model_calls_go_through_admission() -> None:
+    controller = AdmissionController(requests_per_minute=1000, tokens_per_minute=100_000)
+    reply = AIMessage(
+        "שלום",
+        usage_metadata={"input_tokens": 100, "output_tokens": 10, "total_tokens": 110},
+    )
+    graph = make_graph(FakeChatModel(responses=[reply]), admission=controller)
+
+    result = await graph.ainvoke({"messages": [{"role": "user", "content": "היי"}]})
+
+    assert result["messages"][-1].text == "שלום"
+    assert controller.stats()["admitted"] == 1
+    assert controller.tokens.level == pytest.approx(100_000 - 110, abs=5)
+
+
+def test_admitted_model_passes_priority() -> None:
+    seen = []
+    controller = AdmissionController(requests_per_minute=1000)
+    controller.acquire = lambda tokens, priority=0.0: seen.append(priority) or 0.0
+    model = AdmittedModel(FakeChatModel(), controller, priority=0.5)
+    model.invoke("היי")
+    assert seen == [0.5]
+
+
+async def test_hedged_calls_are_admitted_and_waits_exported() -> None:
+    registry = MetricsRegistry()
+    controller = AdmissionController(
+        requests_per_minute=1000, on_admit=registry.observe_admission
+    )
+    graph = make_graph(
+        FakeChatModel(latency=0.05),
+        admission=controller,
+        latency=LatencyGuard(LatencyPolicy(hedge_after=0.01)),
+    )
+
+    await graph.ainvoke({"messages": [{"role": "user", "content": "היי"}]})
+
+    # The primary call and its hedged duplicate each took a request
+    assert controller.stats()["admitted"] == 2
+    text = registry.render_prometheus()
+    assert "skideal_model_admission_wait_seconds_count 2" in text
+    assert "skideal_model_admission_queue_depth 0" in text
@@ -0,0 +1,66 @@
+import copy
+
+from agent.benchmark import SCENARIOS, compare, run_scenario, update_baselines
+
+
+def test_scripted_scenario_runs_its_tool_calls() -> None:
+    scenario = next(s for s in SCENARIOS if s.name == "full_handoff")
+    result = run_scenario(scenario, repeats=1)
+
+    assert result["tool_calls"] == 3
+    assert set(result["tools"]) == {
+        "get_hotels_list",
+        "get_resort_camps_info",
+        "handoff_to_agent",
+    }
+    # One model call per tool step plus the final reply of every turn
+    assert result["model_calls"] == 6
+    assert result["input_tokens_est"] > result["output_tokens_est"] > 0
+
+
+def test_compare_flags_growth_but_not_improvements() -> None:
+    baseline = {
+        "s": {
+            "model_calls": 4,
+            "tool_calls": 2,
+            "tool_payload_bytes": 1000,
+            "input_tokens_est": 5000,
+            "output_tokens_est": 100,
+            "graph_overhead_ms": 20.0,
+            "tools": {"get_hotel_info": {"payload_bytes": 1000}},
+        }
+    }
+    improved = copy.deepcopy(baseline)
+    improved["s"]["tool_payload_bytes"] = 400
+    improved["s"]["tools"]["get_hotel_info"]["payload_bytes"] = 400
+    improved["s"]["graph_overhead_ms"] = 22.0  # within noise
+    assert compare(improved, baseline) == []
+
+    regressed = copy.deepcopy(baseline)
+    regressed["s"]["input_tokens_est"] = 6000
+    regressed["s"]["graph_overhead_ms"] = 40.0
+    assert compare(regressed, baseline) == [
+        "s: input_tokens_est 5000 -> 6000",
+        "s: graph_overhead_ms 20.0 -> 40.0",
+    ]
+
+
+def test_update_keeps_recorded_timings() -> None:
+    baselines = {"s": {"model_calls": 4, "graph_overhead_ms": 20.0}}
+    result = {
+        "model_calls": 3,
+        "tool_calls": 1,
+        "tool_payload_bytes": 200,
+        "input_tokens_est": 900,
+        "output_tokens_est": 50,
+        "graph_overhead_ms": 35.0,
+        "tools": {"get_hotel_info": {"calls": 1, "payload_bytes": 200, "ms": 1.5}},
+    }
+
+    kept = update_baselines(baselines, {"s": result})
+    assert kept["s"]["model_calls"] == 3
+    assert kept["s"]["graph_overhead_ms"] == 20.0
+    assert kept["s"]["tools"] == {"get_hotel_info": {"calls": 1, "payload_bytes": 200}}
+
+    timed = update_baselines(baselines, {"s": result}, times=True)
+    assert timed["s"]["graph_overhead_ms"] == 35.0
@@ -0,0 +1,46 @@
+import json
+
+from agent.data.aliases import ResortAliases, get_resort_aliases, resort_key
+from agent.data.camps import search_camps
+from agent.tools import get_camps_info
+
+
+def test_resort_key_ignores_spelling_drift() -> None:
+    assert resort_key("מאיירהופן") == resort_key("מאירהופן")
+    assert resort_key("לז-ארק") == resort_key("לז ארק")
+    assert resort_key("אבוריאז'") == resort_key("אבוריאז")
+
+
+def test_camp_variants_join_their_resort() -> None:
+    aliases = ResortAliases(
+        hotel_keys=[("בולגריה", "בנסקו", "Lucky")],
+        section_keys=[("בולגריה", "בנסקו", "כללי")],
+        camp_keys=[
+            ("בולגריה", "בנסקו סופש", "A"),
+            ("בולגריה", "בנסקו", "B"),
+            ("גאורגיה", "גודאורי", "C"),
+        ],
+    )
+    bansko = aliases.resolve("בנסקו סופש")
+    assert bansko is not None and bansko.name == "בנסקו"
+    assert bansko.info_sections == ["כללי"]
+    assert aliases.camp_variants("בנסקו") == ["בנסקו", "בנסקו סופש"]
+    assert aliases.camp_variants("בנסקו סופש") == ["בנסקו סופש"]
+    assert aliases.camp_variants("גודאורי") == ["גודאורי"]
+    assert aliases.camp_variants("אישגיל") == []
+
+
+def test_one_camps_call_covers_all_variants() -> None:
+    result = json.loads(get_camps_info.invoke({"resorts": ["בנסקו"]}))
+    assert set(result["אתרים_שנמצאו"]) == set(get_resort_aliases().camp_variants("בנסקו"))
+    assert len(result["אתרים_שנמצאו"]) > 1
+    assert result["סה״כ_קייטנות"] == sum(len(c) for c in result["קייטנות_לפי_אתר"].values())
+
+    only = json.loads(get_camps_info.invoke({"resorts": ["בנסקו סופש"]}))
+    assert only["אתרים_שנמצאו"] == ["בנסקו סופש"]
+
+
+def test_search_camps_expands_hotel_spelling() -> None:
+    camps = search_camps(resort="מאיירהופן")
+    assert camps and {c["אתר"] for c in camps} == {"מאירהופן"}
+    assert {c["אתר"] for c in search_camps(resort="בנסקו ש")} == {"בנסקו שבוע"}
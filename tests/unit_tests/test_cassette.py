@@ -0,0 +1,132 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langgraph.checkpoint.memory import InMemorySaver
+
+from agent.cassette import (
+    CassetteChatModel,
+    CassetteMiss,
+    cassette_from_env,
+    request_key,
+)
+from agent.fakes import FakeChatModel
+from agent.graph import make_graph
+
+pytestmark = pytest.mark.anyio
+
+KOSHER_CALL = {"name": "get_kosher_info", "args": {}, "id": "toolu_1", "type": "tool_call"}
+
+
+def recording_model():
+    return FakeChatModel(
+        responses=[
+            AIMessage(content="", tool_calls=[KOSHER_CALL]),
+            AIMessage("יש לנו מחלקת סקי כשר 🙏🏻"),
+        ],
+        latency=0.05,
+    )
+
+
+def broken_model():
+    def fail(messages):
+        raise AssertionError("replay must not call the model")
+
+    return FakeChatModel(responder=fail)
+
+
+def conversation(model, thread_id="t1"):
+    graph = make_graph(model, checkpointer=InMemorySaver())
+    result = graph.invoke(
+        {"messages": [HumanMessage("יש לכם חופשות כשרות?")]},
+        {"configurable": {"thread_id": thread_id}},
+    )
+    return [m.text for m in result["messages"]]
+
+
+def test_recorded_conversation_replays_offline(tmp_path) -> None:
+    recorder = CassetteChatModel(inner=recording_model(), cassette_dir=tmp_path, mode="record")
+    recorded = conversation(recorder)
+    assert len(list(tmp_path.glob("*.json"))) == 2
+
+    player = CassetteChatModel(inner=broken_model(), cassette_dir=tmp_path, mode="replay")
+    assert conversation(player, thread_id="t2") == recorded
+
+
+async def test_replay_simulates_recorded_latency(tmp_path) -> None:
+    messages = [HumanMessage("היי")]
+    recorder = CassetteChatModel(inner=recording_model(), cassette_dir=tmp_path, mode="record")
+    await recorder.ainvoke(messages)
+
+    player = CassetteChatModel(
+        inner=broken_model(), cassette_dir=tmp_path, mode="replay", latency_scale=1.0
+    )
+    start = time.perf_counter()
+    response = await player.ainvoke(messages)
+    assert time.perf_counter() - start >= 0.05
+    assert response.tool_calls[0]["name"] == "get_kosher_info"
+
+
+def test_replay_miss_raises(tmp_path) -> None:
+    player = CassetteChatModel(inner=broken_model(), cassette_dir=tmp_path, mode="replay")
+    with pytest.raises(CassetteMiss):
+        player.invoke([HumanMessage("היי")])
+
+
+def test_auto_mode_records_once(tmp_path) -> None:
+    inner = FakeChatModel(responses=[AIMessage("ראשון"), AIMessage("שני")])
+    model = CassetteChatModel(inner=inner, cassette_dir=tmp_path, mode="auto")
+    assert model.invoke([HumanMessage("היי")]).text == "ראשון"
+    assert model.invoke([HumanMessage("היי")]).text == "ראשון"
+    assert model.invoke([HumanMessage("שלום")]).text == "שני"
+
+
+def test_request_key_ignores_volatile_details() -> None:
+    def request(call_id, cache_control):
+        system = {"type": "text", "text": "prompt"}
+        if cache_control:
+            system["cache_control"] = {"type": "ephemeral"}
+        ai = AIMessage(
+            content="",
+            tool_calls=[{**KOSHER_CALL, "id": call_id}],
+            response_metadata={"latency_ms": 12.3},
+            id=call_id,
+        )
+        return [SystemMessage(content=[system]), HumanMessage("היי"), ai]
+
+    params = {"model": "claude-sonnet-4-20250514"}
+    assert request_key(request("a", False), params, {}) == request_key(
+        request("b", True), params, {}
+    )
+    assert request_key(request("a", False), params, {}) != request_key(
+        request("a", False), {"model": "claude-3-5-haiku-20241022"}, {}
+    )
+
+
+def test_cassette_from_env(tmp_path, monkeypatch) -> None:
+    inner = FakeChatModel()
+    monkeypatch.delenv("SKIDEAL_CASSETTE_MODE", raising=False)
+    assert cassette_from_env(inner) is inner
+
+    monkeypatch.setenv("SKIDEAL_CASSETTE_MODE", "replay")
+    monkeypatch.setenv("SKIDEAL_CASSETTE_DIR", str(tmp_path))
+    model = cassette_from_env(inner)
+    assert isinstance(model, CassetteChatModel)
+    assert model.cassette_dir == tmp_path
+
+
+def test_concurrent_recorders_never_tear_a_cassette(tmp_path) -> None:
+    recorder = CassetteChatModel(inner=broken_model(), cassette_dir=tmp_path, mode="record")
+    messages = [HumanMessage("היי")]
+
+    def save(i):
+        recorder._save("k", messages, AIMessage(f"תשובה {i}"), 0.01)
+
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(save, range(32)))
+
+    assert [p.name for p in tmp_path.iterdir()] == ["k.json"]
+    entry = json.loads((tmp_path / "k.json").read_text(encoding="utf-8"))
+    assert entry["response"]["data"]["content"].startswith("תשובה")
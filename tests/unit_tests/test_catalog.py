@@ -0,0 +1,34 @@
+import json
+
+from agent.data import catalog
+from agent.data.catalog import Catalog, build_snapshot, open_catalog
+
+
+def test_snapshot_round_trips_the_source_records() -> None:
+    snapshot = Catalog(build_snapshot())
+    with open(catalog.SOURCES["camps"], encoding="utf-8") as f:
+        camps = [json.loads(line) for line in f if line.strip()]
+    assert list(snapshot["camps"]) == camps
+    assert snapshot["camps"][-1] == camps[-1]
+    assert len(snapshot["hotels"]) == len(snapshot["hotels"].keys)
+
+    hotel = snapshot["hotels"][0]
+    country, resort, name = snapshot["hotels"].keys[0]
+    assert snapshot["hotels"].where(resort=resort.upper(), name=name) == [hotel]
+    # Decoded records are copies of the shared data
+    hotel["מדינה"] = "שונה"
+    assert snapshot["hotels"][0]["מדינה"] == country
+
+
+def test_snapshot_file_is_attached_and_rebuilt_when_sources_change(
+    tmp_path, monkeypatch
+) -> None:
+    path = tmp_path / "catalog.bin"
+    first = open_catalog(str(path))
+    assert first.path == path and path.exists()
+    assert open_catalog(str(path)).fingerprint == first.fingerprint
+
+    monkeypatch.setattr(catalog, "source_fingerprint", lambda: "changed")
+    rebuilt = open_catalog(str(path))
+    assert rebuilt.fingerprint == "changed"
+    assert rebuilt.facets.counts() == first.facets.counts()
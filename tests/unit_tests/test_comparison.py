@@ -0,0 +1,43 @@
+import json
+
+from agent.data import get_camps_for_resort, get_hotels_by_resort
+from agent.data.comparison import Credits, get_resort_comparison, parse_credits
+from agent.tools import compare_resorts
+
+
+def test_credits_text_is_parsed_into_amounts() -> None:
+    text = (
+        "זיכוי טיסות - 300 יורו ל-2 הכיוונים ו50 יורו לכיוון\n"
+        "זיכוי סקיפס - 200 יורו\n"
+        "זיכוי נסיעות - 20 יורו\n"
+        "הרחבת סקיפס- ללא הרחבה"
+    )
+    assert parse_credits(text) == Credits(
+        flight_round_trip=300, flight_one_way=50, ski_pass=200, transfers=20, ski_pass_extension=0
+    )
+    assert parse_credits("זיכוי סקיפס - לא רלוונטי") == Credits()
+
+
+def test_comparison_rows_aggregate_every_spelling_of_a_resort() -> None:
+    rows, missing = get_resort_comparison().compare(["מאירהופן", "בנסקו סופש", "אין כזה"])
+    assert [row.name for row in rows] == ["מאיירהופן", "בנסקו"]
+    assert missing == ["אין כזה"]
+
+    bansko = rows[1]
+    assert bansko.hotels == len(get_hotels_by_resort("בנסקו"))
+    assert sum(bansko.stars.values()) == bansko.hotels
+    assert bansko.camps == sum(len(c) for c in get_camps_for_resort("בנסקו").values())
+    assert bansko.credits is not None and bansko.credits.ski_pass == 180
+
+    # Country spellings drift between sheets
+    georgia, _ = get_resort_comparison().compare(country="גאורגיה")
+    assert [row.name for row in georgia] == ["גודאורי"]
+
+
+def test_compare_resorts_tool_returns_one_row_per_resort() -> None:
+    result = json.loads(compare_resorts.invoke({"country": "צרפת"}))
+    rows = result["השוואת_אתרים"]
+    assert "ואל טורנס" in {row["אתר"] for row in rows}
+    assert all(row["מדינה"] == "צרפת" for row in rows)
+    assert rows[0]["זיכויים_ביורו"]["טיסות_הלוך_ושוב"] == 300
+    assert "לא נמצאו" in compare_resorts.invoke({"resorts": ["אין כזה"]})
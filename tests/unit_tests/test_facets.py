@@ -0,0 +1,36 @@
+from agent.data import get_facet_counts, search_hotels
+from agent.data.facets import FacetIndex, classify, facet_mask
+
+
+def test_free_text_answers_map_to_facets() -> None:
+    assert classify("יש. ניתן לבקש מראש") == "yes"
+    assert classify("אין. יש מיטות קומותיים") == "no"
+    assert classify("רק בRQ") == "unknown"
+    assert classify("RQ") == "unknown"
+    assert classify("יש. parquet floors") == "yes"
+    assert classify("בחלק מהחדרים - לא להתחייב") == "unknown"
+    assert classify("יש\nאין") == "unknown"
+    assert classify("חסר מידע") == "unknown"
+    assert classify("27 יורו ליום") == "unknown"
+    assert classify("27 יורו ליום", other_means_yes=True) == "yes"
+
+
+def test_facet_bitsets_filter_hotels() -> None:
+    hotels = [
+        {"שם מלון באנגלית": "A", "חדרים": {"חדרים עם דלת מקשרת": "יש", "תכולת מטבח": "מיקרו"}},
+        {"שם מלון באנגלית": "B", "חדרים": {"חדרים עם דלת מקשרת": "ברקווסט"}},
+        {"שם מלון באנגלית": "C", "חדרים": {"חדרים עם דלת מקשרת": "אין"}},
+    ]
+    index = FacetIndex(hotels)
+    counts = index.counts()["connecting_rooms"]
+    assert counts == {"yes": 1, "no": 1, "unknown": 1}
+
+    mask = facet_mask(["connecting_rooms", "kitchen"])
+    assert [h["שם מלון באנגלית"] for h in hotels if index.has_all(h, mask)] == ["A"]
+
+
+def test_search_hotels_by_facets() -> None:
+    hotels = search_hotels(facets=["connecting_rooms"])
+    assert hotels
+    assert len(hotels) == get_facet_counts()["connecting_rooms"]["yes"]
+    assert all(h["חדרים"]["חדרים עם דלת מקשרת"].startswith("יש") for h in hotels)
@@ -0,0 +1,69 @@
+import json
+import random
+
+from agent.data import get_distance_to_lift, search_hotels
+from agent.data.geo import SpatialGrid, distance_m, geo_columns, parse_maps_coordinates
+from agent.tools.search_hotels_by_criteria import search_hotels_by_criteria
+
+SPORTING = (
+    "https://www.google.com/maps/place/Hotel+Sporting/@42.5419015,1.7337833,516m"
+    "/data=!3m1!1e3!4m9!3m8!1s0x12af7d8b46572ffd:0x300edfd91229db!5m2!4m1!1i2"
+    "!8m2!3d42.5416053!4d1.7335929!16s%2Fg%2F1tj3n3j2?authuser=0"
+)
+
+
+def test_maps_links_resolve_to_the_pinned_place() -> None:
+    assert parse_maps_coordinates(SPORTING) == (42.5416053, 1.7335929)
+    assert parse_maps_coordinates("https://maps.google.com/@45.3,6.58,15z") == (45.3, 6.58)
+    assert parse_maps_coordinates("אין רכבל אחד ראשי") is None
+    assert parse_maps_coordinates(None) is None
+
+    hotels = [
+        {"אתר": "א", "מיקום": {"מיקום בגוגל": "@45.0,6.0", "מיקום רכבל מרכזי": "@45.001,6.0"}},
+        {"אתר": "א", "מיקום": {"מיקום בגוגל": "@45.003,6.0", "מיקום רכבל מרכזי": "אין"}},
+        # Lift link of another resort
+        {"אתר": "ב", "מיקום": {"מיקום בגוגל": "@46.0,7.0", "מיקום רכבל מרכזי": "@45.0,6.0"}},
+        {"אתר": "ב", "מיקום": {"מיקום בגוגל": "אין"}},
+    ]
+    assert geo_columns(hotels) == [[45.0, 6.0, 111], [45.003, 6.0, 222], [46.0, 7.0, -1], None]
+
+
+def test_grid_finds_the_same_points_as_a_full_scan() -> None:
+    rng = random.Random(7)
+    points = [(45 + rng.uniform(0, 0.05), 6.5 + rng.uniform(0, 0.05)) for _ in range(300)]
+    grid = SpatialGrid()
+    for i, point in enumerate(points):
+        grid.add((str(i), "r"), point)
+
+    center = points[0]
+    found = grid.near(center, 1500)
+    expected = sorted(
+        (str(i), distance_m(center, p)) for i, p in enumerate(points) if distance_m(center, p) <= 1500
+    )
+    assert sorted((key[0], d) for key, d in found) == expected
+    assert [d for _, d in found] == sorted(d for _, d in found)
+
+
+def test_search_hotels_by_lift_distance_and_proximity() -> None:
+    close = search_hotels(max_distance_to_lift_m=300)
+    distances = [get_distance_to_lift(h) for h in close]
+    assert close and all(d is not None and d <= 300 for d in distances)
+    assert distances == sorted(distances)
+
+    near = search_hotels(near_hotel="villa kofler", radius_m=500)
+    names = [h["שם מלון באנגלית"] for h in near]
+    assert names and "Villa Kofler" not in names and "Caminneto" not in names
+    assert {h["אתר"] for h in near} == {"סלה רונדה"}
+    assert search_hotels(near_hotel="Taos hotel") == []
+
+
+def test_lift_distance_search_counts_hotels_it_cannot_judge() -> None:
+    found = json.loads(search_hotels_by_criteria.invoke({"max_distance_to_lift_m": 300}))
+    unknown = sum(get_distance_to_lift(h) is None for h in search_hotels())
+    assert found["מלונות"] and found["מלונות_ללא_מרחק_ידוע_מהרכבל"] == unknown > 0
+
+    # No hotel in Val Thorens has a pinned location
+    reply = search_hotels_by_criteria.invoke(
+        {"resort": "ואל טורנס", "max_distance_to_lift_m": 300}
+    )
+    assert "ל-11 מלונות נוספים" in reply
@@ -0,0 +1,20 @@
+import json
+
+from agent.tools import get_hotel_info
+
+
+def test_default_is_a_compact_card() -> None:
+    card = json.loads(get_hotel_info.invoke({"hotel_name": "Les Balcons"}))
+    assert card["פרטים_בסיסיים"]["שם_אנגלית"] == "Les Balcons"
+    assert "חדרים" not in card and "ספא" not in card
+    assert set(card["מקטעים_זמינים"]) == {"location", "spa", "rooms", "services", "checkin"}
+
+
+def test_sections_are_added_on_demand() -> None:
+    info = json.loads(
+        get_hotel_info.invoke({"hotel_name": "Les Balcons", "sections": ["rooms", "spa"]})
+    )
+    assert info["חדרים"]["מיטות_נפרדות"] == "יש"
+    assert info["ספא"]["לבוש"] == "בגד ים"
+    assert "מיקום" not in info
+    assert "שגיאה" in get_hotel_info.func("Les Balcons", ["pool"])
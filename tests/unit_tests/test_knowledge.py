@@ -0,0 +1,49 @@
+from agent.knowledge import (
+    KnowledgeDoc,
+    KnowledgeIndex,
+    get_knowledge_index,
+    index_terms,
+    normalize,
+)
+
+
+def doc(hotel, text, resort="בנסקו"):
+    return KnowledgeDoc(
+        country="בולגריה", resort=resort, hotel=hotel, field="חדרים - הערות", text=text
+    )
+
+
+def test_hebrew_tokenization_handles_prefixes_finals_and_geresh() -> None:
+    assert normalize("צ'ק אין") == "צק אינ"
+    assert {"ובמלונ", "במלונ", "מלונ"} <= set(index_terms("ובמלון"))
+
+
+def test_bm25_ranks_matches_and_filters_by_resort() -> None:
+    index = KnowledgeIndex(
+        [
+            doc("A", "אין דלת מקשרת"),
+            doc("B", "דלתות מקשרות בחדרי המשפחה, ספא גדול"),
+            doc("C", "בר אפרה סקי ליד הרכבל", resort="גודאורי"),
+            doc("D", "חניה בתשלום"),
+        ]
+    )
+    hits = index.search("חדר עם דלת מקשרת")
+    assert [h.doc.hotel for h in hits] == ["A", "B"]
+    assert index.search("אפרה", resort="בנסקו") == []
+    [hit] = index.search("והאפרה")
+    assert hit.doc.hotel == "C" and "אפרה" in hit.snippet
+
+
+def test_catalog_index_covers_section_notes() -> None:
+    hits = get_knowledge_index().search("זיכוי טיסות", resort="בנסקו")
+    assert hits[0].doc.hotel == "כללי"
+    assert "זיכוי טיסות" in hits[0].snippet
+
+
+def test_links_are_not_indexed() -> None:
+    index = KnowledgeIndex(
+        [doc("A", "בריכה, סאונה\nhttps://www.google.com/maps/@46.19,6.77,18z?entry=ttu")]
+    )
+    assert index.search("maps google") == []
+    assert index.search("סאונה")[0].doc.hotel == "A"
+    assert not any(t in get_knowledge_index().postings for t in ("https", "www", "maps"))
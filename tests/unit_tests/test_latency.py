@@ -0,0 +1,158 @@
+import asyncio
+import time
+
+import pytest
+from langchain_core.messages import AIMessage
+
+from agent.fakes import FakeChatModel
+from agent.graph import make_graph
+from agent.latency import (
+    CircuitBreaker,
+    LatencyGuard,
+    LatencyPolicy,
+    ModelDeadlineExceeded,
+    ResilientModel,
+)
+
+pytestmark = pytest.mark.anyio
+
+
+class Overloaded(Exception):
+    status_code = 529
+
+
+def fake(text, latency=0.0):
+    return FakeChatModel(responses=[AIMessage(text)], latency=latency)
+
+
+def delays(*values):
+    return iter(values).__next__
+
+
+async def test_hedged_request_wins_over_slow_primary() -> None:
+    guard = LatencyGuard(LatencyPolicy(hedge_after=0.05))
+    model = ResilientModel(fake("primary", latency=delays(1.0, 0.01)), guard)
+
+    start = time.perf_counter()
+    response = await model.ainvoke("היי")
+
+    assert response.text == "primary"
+    assert time.perf_counter() - start < 0.5
+
+
+def test_sync_hedged_request_wins_over_slow_primary() -> None:
+    guard = LatencyGuard(LatencyPolicy(hedge_after=0.05))
+    model = ResilientModel(fake("primary", latency=delays(1.0, 0.01)), guard)
+
+    start = time.perf_counter()
+    assert model.invoke("היי").text == "primary"
+    assert time.perf_counter() - start < 0.5
+
+
+async def test_hedge_delay_follows_observed_p95() -> None:
+    guard = LatencyGuard(LatencyPolicy(min_samples=10))
+    assert guard.hedge_delay() is None
+    for i in range(20):
+        guard.tracker.observe(i / 100)
+    assert guard.hedge_delay() == pytest.approx(0.19)
+
+
+async def test_timeout_falls_back_to_secondary_model() -> None:
+    guard = LatencyGuard(LatencyPolicy(call_timeout=0.05))
+    model = ResilientModel(
+        fake("primary", latency=1.0), guard, fallback=fake("fallback")
+    )
+    assert (await model.ainvoke("היי")).text == "fallback"
+    assert guard.breaker.failures == 1
+
+
+async def test_overload_error_falls_back_and_opens_breaker() -> None:
+    calls = []
+
+    def overloaded(messages):
+        calls.append(1)
+        raise Overloaded()
+
+    guard = LatencyGuard(LatencyPolicy(breaker_failures=2))
+    primary = FakeChatModel(responder=overloaded)
+    model = ResilientModel(primary, guard, fallback=fake("fallback"))
+
+    for _ in range(4):
+        assert (await model.ainvoke("היי")).text == "fallback"
+
+    assert guard.breaker.state == "open"
+    assert len(calls) == 2
+
+
+async def test_non_overload_errors_are_not_hidden() -> None:
+    def broken(messages):
+        raise ValueError("bad request")
+
+    model = ResilientModel(
+        FakeChatModel(responder=broken), LatencyGuard(), fallback=fake("fallback")
+    )
+    with pytest.raises(ValueError):
+        await model.ainvoke("היי")
+
+
+async def test_turn_deadline_caps_the_call() -> None:
+    guard = LatencyGuard(LatencyPolicy(call_timeout=10))
+    model = ResilientModel(fake("primary"), guard, deadline=time.time() - 1)
+    with pytest.raises(ModelDeadlineExceeded):
+        await model.ainvoke("היי")
+
+
+def test_breaker_half_opens_after_reset() -> None:
+    breaker = CircuitBreaker(failure_threshold=1, reset_after=0.01)
+    breaker.record_failure()
+    assert not breaker.allow()
+    time.sleep(0.02)
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def half_open_breaker(guard):
+    guard.breaker.opened_at = time.monotonic() - guard.breaker.reset_after
+    assert guard.breaker.state == "half-open"
+
+
+async def test_failed_probe_does_not_wedge_the_breaker() -> None:
+    def broken(messages):
+        raise ValueError("bad request")
+
+    guard = LatencyGuard()
+    half_open_breaker(guard)
+    model = ResilientModel(FakeChatModel(responder=broken), guard, fallback=fake("fallback"))
+    with pytest.raises(ValueError):
+        await model.ainvoke("היי")
+
+    # The next call probes the primary again instead of skipping it for good
+    assert guard.breaker.admit() == "probe"
+
+
+async def test_cancelled_probe_frees_the_probe_slot() -> None:
+    guard = LatencyGuard()
+    half_open_breaker(guard)
+    model = ResilientModel(fake("primary", latency=1.0), guard, fallback=fake("fallback"))
+    probe = asyncio.create_task(model.ainvoke("היי"))
+    await asyncio.sleep(0.01)
+    probe.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await probe
+
+    model = ResilientModel(fake("primary"), guard, fallback=fake("fallback"))
+    assert (await model.ainvoke("היי")).text == "primary"
+    assert guard.breaker.state == "closed"
+
+
+async def test_graph_uses_fallback_when_primary_is_slow() -> None:
+    graph = make_graph(
+        fake("primary", latency=1.0),
+        fallback=fake("fallback"),
+        latency=LatencyGuard(LatencyPolicy(call_timeout=0.05)),
+    )
+    result = await graph.ainvoke({"messages": [{"role": "user", "content": "היי"}]})
+    assert result["messages"][-1].text == "fallback"
+    assert result["turn"] == 1
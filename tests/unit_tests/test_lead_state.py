@@ -0,0 +1,122 @@
+import json
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from agent import outbox as outbox_module
+from agent.lead_state import (
+    extract_lead_fields,
+    merge_lead,
+    render_lead_block,
+    trim_history,
+    update_lead_state,
+)
+from agent.outbox import HandoffOutbox
+from agent.tools import handoff_to_agent
+
+
+def test_extracts_fields_from_customer_messages() -> None:
+    lead = extract_lead_fields("2 מבוגרים ו-2 ילדים בני 5 ו-8, רוצים לואל טורנס בפסח")
+    assert lead == {
+        "num_people": 4,
+        "ages": "5, 8",
+        "destination": "ואל טורנס",
+        "dates": "פסח",
+    }
+
+    lead = extract_lead_fields("קוראים לי יונתן שלוש, 050-123-4567, yoni@example.com")
+    assert lead == {
+        "customer_name": "יונתן שלוש",
+        "phone": "0501234567",
+        "email": "yoni@example.com",
+    }
+
+    assert extract_lead_fields("בלי ספא, אבל עם בית ספר לסקי") == {
+        "spa_preference": False,
+        "needs_ski_school": True,
+    }
+
+
+def test_numeric_dates_need_a_date_context() -> None:
+    assert extract_lead_fields("רוצים לטוס ב-12.1")["dates"] == "12.1"
+    assert extract_lead_fields("מתאריך 12/1/26 לשבוע")["dates"] == "12/1/26"
+    assert extract_lead_fields("נוח לנו 12.1-19.1 או בפברואר")["dates"] == "12.1-19.1, פברואר"
+
+    for text in ["ילד בן 8.5", "מלון 3.5 כוכבים", "תקציב 2.5 אלף יורו", "ב-35.14", "ב-1.2.3.4"]:
+        assert "dates" not in extract_lead_fields(text), text
+
+
+def test_questions_and_negations_are_not_lead_facts() -> None:
+    for text in ["מתי מתחילה העונה?", "יש ספא במלון?", "יש ביטוח?", "כמה עולה השכרת ציוד?"]:
+        assert extract_lead_fields(text) == {}, text
+
+    assert extract_lead_fields("אני לא מתחיל, אני מתקדם") == {"ski_level": "advanced"}
+    assert extract_lead_fields("מה עם ספא? אנחנו צריכים ציוד") == {"needs_equipment": True}
+
+
+def test_budget_and_ages_read_the_numbers() -> None:
+    assert extract_lead_fields("התקציב שלנו 5000 יורו") == {"budget": "5000 יורו"}
+    assert extract_lead_fields("תקציב של 15000") == {"budget": "15000"}
+    assert extract_lead_fields("הילד בן 12 והבת בת 9") == {"ages": "12, 9"}
+
+
+def test_extraction_reuses_handoff_validators() -> None:
+    assert "customer_name" not in extract_lead_fields("קוראים לי יוסי")
+    assert "phone" not in extract_lead_fields("הטלפון שלי 0123")
+
+
+def test_update_lead_state_only_scans_new_messages() -> None:
+    messages = [
+        HumanMessage("אנחנו 4", id="1"),
+        AIMessage("מעולה, לאן?", id="2"),
+        HumanMessage("רוצים באוסטריה", id="3"),
+    ]
+    update = update_lead_state({"messages": messages})
+    assert update["lead"] == {"num_people": 4, "destination": "אוסטריה"}
+    assert update["lead_cursor"] == 3
+
+    messages.append(HumanMessage("אנחנו 5", id="4"))
+    update = update_lead_state({"messages": messages, "lead_cursor": 3})
+    assert update["lead"] == {"num_people": 5}
+    assert merge_lead({"num_people": 4, "destination": "אוסטריה"}, update["lead"]) == {
+        "num_people": 5,
+        "destination": "אוסטריה",
+    }
+
+
+def test_trim_history_starts_on_a_customer_turn() -> None:
+    messages = []
+    for i in range(10):
+        messages += [HumanMessage(f"q{i}"), AIMessage(f"a{i}")]
+    trimmed = trim_history(messages, max_turns=3)
+    assert len(trimmed) == 6
+    assert isinstance(trimmed[0], HumanMessage)
+    assert trimmed[0].content == "q7"
+
+
+def test_render_lead_block_lists_collected_and_missing() -> None:
+    block = render_lead_block({"destination": "אוסטריה", "spa_preference": True})
+    assert "יעד: אוסטריה" in block
+    assert "ספא: כן" in block
+    assert "טלפון" in block.splitlines()[-1]
+
+
+def test_handoff_fills_in_collected_contact_details_only(tmp_path, monkeypatch) -> None:
+    box = HandoffOutbox(tmp_path / "outbox.db")
+    monkeypatch.setattr(outbox_module, "_outbox", box)
+    state = {
+        "lead": {
+            "customer_name": "יונתן שלוש",
+            "phone": "0501234567",
+            "destination": "ואל טורנס",
+            "spa_preference": False,
+        }
+    }
+
+    result = json.loads(handoff_to_agent.func(budget="20 אלף", state=state))
+
+    summary = result["סיכום"]
+    assert summary["פרטי_לקוח"] == {"שם": "יונתן שלוש", "טלפון": "0501234567"}
+    # Heuristic trip details reach the CRM only when the model passes them
+    assert summary["פרטי_חופשה"] == {}
+    assert summary["העדפות"] == {"תקציב": "20 אלף"}
+    box.close()
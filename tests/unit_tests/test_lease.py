@@ -0,0 +1,199 @@
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+from langgraph.checkpoint.memory import InMemorySaver
+
+pytest.importorskip("starlette")
+
+from agent.fakes import FakeChatModel  # noqa: E402
+from agent.graph import make_graph  # noqa: E402
+from agent.lease import InProcessLeases, SQLiteLeases  # noqa: E402
+from agent.server import ConversationDispatcher, InboundMessage, create_app  # noqa: E402
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_lease_is_exclusive_and_handed_over_on_release() -> None:
+    leases = InProcessLeases()
+    order = []
+
+    async def worker(name):
+        async with leases.hold("t1") as lease:
+            order.append((name, "in", lease.token))
+            await asyncio.sleep(0.02)
+            order.append((name, "out", lease.token))
+
+    start = time.perf_counter()
+    await asyncio.gather(worker("a"), worker("b"))
+    assert [step for _, step, _ in order] == ["in", "out", "in", "out"]
+    assert order[0][2] < order[2][2]
+    # The waiter is woken by the release, not by polling
+    assert time.perf_counter() - start < 0.1
+
+
+async def test_expired_lease_is_taken_over_and_fenced() -> None:
+    leases = InProcessLeases(ttl=0.05)
+    stale = leases.try_acquire("t1")
+    assert stale is not None and leases.try_acquire("t1") is None
+    await asyncio.sleep(0.06)
+
+    fresh = leases.try_acquire("t1")
+    assert fresh is not None and fresh.token > stale.token
+    assert leases.renew(stale) is None
+    leases.release(stale)
+    assert leases.current_token("t1") == fresh.token
+
+
+async def test_sqlite_leases_are_shared_between_managers(tmp_path) -> None:
+    path = tmp_path / "leases.db"
+    first, second = SQLiteLeases(path, ttl=0.2), SQLiteLeases(path, ttl=0.2)
+    lease = first.try_acquire("t1")
+    assert lease is not None and second.try_acquire("t1") is None
+
+    waiter = asyncio.create_task(second.acquire("t1"))
+    await asyncio.sleep(0.02)
+    assert not waiter.done()
+    first.release(lease)
+    handed_over = await asyncio.wait_for(waiter, 1.0)
+    assert handed_over.token == lease.token + 1
+    assert first.renew(lease) is None
+    first.close()
+    second.close()
+
+
+async def test_messages_take_the_lease_in_sequence() -> None:
+    leases = InProcessLeases()
+    assert [leases.admit("t1", f"m{i}") for i in range(3)] == [1, 2, 3]
+    assert leases.admit("t1", "m0") is None
+
+    assert leases.try_acquire("t1", 2) is None
+    first = leases.try_acquire("t1", 1)
+    assert first is not None and first.answered == 0
+    leases.release(first, 1)
+    assert leases.try_acquire("t1", 3) is None
+    second = leases.try_acquire("t1", 2)
+    assert second is not None and second.answered == 1
+
+
+async def test_thread_moves_past_a_message_that_never_comes() -> None:
+    leases = InProcessLeases(ttl=0.05)
+    lost, seq = leases.admit("t1", "m1"), leases.admit("t1", "m2")
+    assert leases.try_acquire("t1", seq) is None
+    await asyncio.sleep(0.06)
+
+    lease = leases.try_acquire("t1", seq)
+    assert lease is not None
+    leases.release(lease, seq)
+    # The lost message is older than one answered: the dispatcher drops it
+    late = leases.try_acquire("t1", lost)
+    assert late is not None and late.answered == seq
+
+
+async def test_sqlite_leases_share_sequences_and_seen_ids(tmp_path) -> None:
+    path = tmp_path / "leases.db"
+    first, second = SQLiteLeases(path), SQLiteLeases(path)
+    assert first.admit("t1", "m1") == 1
+    assert second.admit("t1", "m1") is None
+    assert second.admit("t1", "m2") == 2
+
+    # A shed message is forgotten, so its redelivery is accepted again
+    second.forget("t1", "m2", 2)
+    assert first.admit("t1", "m2") == 2
+    assert second.try_acquire("t1", 2) is None
+    first.close()
+    second.close()
+
+
+def _payload(text, message_id):
+    message = {"from": "972500000001", "id": message_id, "type": "text", "text": {"body": text}}
+    return {"entry": [{"changes": [{"value": {"messages": [message]}}]}]}
+
+
+async def test_workers_answer_a_thread_in_arrival_order(tmp_path, sender) -> None:
+    # Message 3 reaches worker A, which answered message 1, before worker B
+    # got the lease for message 2
+    graph = make_graph(FakeChatModel(latency=0.1), checkpointer=InMemorySaver())
+    workers = [
+        ConversationDispatcher(graph, sender, leases=SQLiteLeases(tmp_path / "leases.db"))
+        for _ in range(2)
+    ]
+    clients = [
+        httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=create_app(worker, verify_token="secret")),
+            base_url="http://test",
+        )
+        for worker in workers
+    ]
+    a, b = clients
+    for client, text, delay in [(a, "1", 0.0), (b, "2", 0.02), (a, "3", 0.02)]:
+        await asyncio.sleep(delay)
+        await client.post("/webhook", content=json.dumps(_payload(text, f"m{text}")))
+    redelivered = await b.post("/webhook", content=json.dumps(_payload("1", "m1")))
+    await asyncio.gather(*(worker.join() for worker in workers))
+    for client in clients:
+        await client.aclose()
+
+    assert redelivered.json()["messages"] == 0
+    assert len(sender.sent) == 3
+    state = await graph.aget_state({"configurable": {"thread_id": "whatsapp:972500000001"}})
+    texts = [m.text for m in state.values["messages"] if m.type == "human"]
+    assert texts == ["1", "2", "3"]
+
+
+async def test_burst_split_across_workers_keeps_its_order(tmp_path, sender) -> None:
+    graph = make_graph(FakeChatModel(latency=0.05), checkpointer=InMemorySaver())
+    path = tmp_path / "leases.db"
+    a, b = (
+        ConversationDispatcher(graph, sender, debounce=0.01, leases=SQLiteLeases(path))
+        for _ in range(2)
+    )
+    seqs = [a.leases.admit("t1", f"m{i}") for i in range(1, 4)]
+    # Worker A got messages 1 and 3; message 2 reaches worker B later
+    a.submit(InboundMessage("t1", "972500000001", "1", seq=seqs[0]))
+    a.submit(InboundMessage("t1", "972500000001", "3", seq=seqs[2]))
+    await asyncio.sleep(0.03)
+    b.submit(InboundMessage("t1", "972500000001", "2", seq=seqs[1]))
+    await asyncio.gather(a.join(), b.join())
+
+    state = await graph.aget_state({"configurable": {"thread_id": "t1"}})
+    texts = [m.text for m in state.values["messages"] if m.type == "human"]
+    assert texts == ["1", "2", "3"]
+    assert a.out_of_order == b.out_of_order == 0
+
+
+async def test_workers_sharing_leases_run_a_thread_in_order(tmp_path, sender) -> None:
+    # Two workers with a shared checkpointer, as behind one WhatsApp number
+    graph = make_graph(FakeChatModel(latency=0.05), checkpointer=InMemorySaver())
+    workers = [
+        ConversationDispatcher(graph, sender, leases=SQLiteLeases(tmp_path / "leases.db"))
+        for _ in range(2)
+    ]
+    for worker, text in zip(workers, ["היי", "אנחנו 4"]):
+        assert worker.submit(InboundMessage("t1", "972500000001", text))
+    await asyncio.gather(*(worker.join() for worker in workers))
+
+    assert len(sender.sent) == 2
+    state = await graph.aget_state({"configurable": {"thread_id": "t1"}})
+    kinds = [m.type for m in state.values["messages"]]
+    assert kinds == ["human", "ai", "human", "ai"]
+
+
+class ExpiringLeases(InProcessLeases):
+    # Every renewal finds the lease taken over by another worker
+    def renew(self, lease):
+        return None
+
+
+async def test_run_is_cancelled_when_its_lease_is_lost(sender) -> None:
+    graph = make_graph(FakeChatModel(latency=0.5), checkpointer=InMemorySaver())
+    dispatcher = ConversationDispatcher(graph, sender, leases=ExpiringLeases(ttl=0.06))
+    start = time.perf_counter()
+    assert dispatcher.submit(InboundMessage("t1", "972500000001", "היי"))
+    await dispatcher.join()
+
+    assert time.perf_counter() - start < 0.3
+    assert sender.sent == []
+    assert dispatcher.fenced == 1
@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+pytest.importorskip("starlette")
+
+from agent.loadgen import (  # noqa: E402
+    LoadProfile,
+    default_conversations,
+    load_conversations,
+    run_load,
+)
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_all_customer_turns_are_answered() -> None:
+    profile = LoadProfile(
+        customers=8,
+        ramp_up=0.0,
+        think_time=0.0,
+        model_latency=0.01,
+        max_concurrency=3,
+        seed=7,
+    )
+    report = await run_load(profile)
+
+    expected = sum(len(c) for c in (default_conversations() * 2)[:8])
+    assert report.turns == expected
+    assert report.errors == 0
+    assert report.max_running <= 3
+    assert 0 < report.latency["p50"] <= report.latency["p95"] <= report.latency["max"]
+    # 8 customers share 3 slots, so some turns queue
+    assert report.queue_wait["max"] > 0
+    assert report.throughput > 0
+    assert set(report.memory) == {"growth_kb", "per_thread_kb"}
+
+
+async def test_recorded_conversations_and_heap_tracing(tmp_path) -> None:
+    path = tmp_path / "recorded.jsonl"
+    path.write_text(
+        json.dumps(["היי", "אנחנו 4"], ensure_ascii=False)
+        + "\n"
+        + json.dumps({"messages": ["רוצים באוסטריה"]}, ensure_ascii=False)
+        + "\n",
+        encoding="utf-8",
+    )
+    conversations = load_conversations(path)
+    assert conversations == [["היי", "אנחנו 4"], ["רוצים באוסטריה"]]
+
+    profile = LoadProfile(
+        customers=2, ramp_up=0.0, think_time=0.0, model_latency=0.0, trace_memory=True
+    )
+    report = await run_load(profile, conversations)
+    assert report.turns == 3
+    assert report.memory["peak_kb"] >= report.memory["growth_kb"]
@@ -0,0 +1,80 @@
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langgraph.checkpoint.memory import InMemorySaver
+
+from agent.fakes import FakeChatModel
+from agent.graph import make_graph
+from agent.loop_guard import (
+    FINAL_REPLY,
+    REPEATED_RESULT,
+    LoopGuard,
+    LoopLimits,
+    call_key,
+)
+
+
+def call(name, args, call_id):
+    return AIMessage(content="", tool_calls=[{"name": name, "args": args, "id": call_id}])
+
+
+def run_turn(responses, limits=LoopLimits()):
+    guard = LoopGuard(limits)
+    model = FakeChatModel(responses=responses)
+    graph = make_graph(model, checkpointer=InMemorySaver(), loop_guard=guard)
+    config = {"configurable": {"thread_id": "loop"}}
+    result = graph.invoke({"messages": [HumanMessage("יש לכם את מלון נופש?")]}, config)
+    return result["messages"], guard
+
+
+def test_call_key_normalizes_arguments() -> None:
+    assert call_key("get_hotel_info", {"hotel_name": " Alaska", "resort": None}) == call_key(
+        "get_hotel_info", {"hotel_name": "alaska"}
+    )
+    assert call_key("get_hotel_info", {"hotel_name": "Alaska"}) != call_key(
+        "get_hotel_info", {"hotel_name": "Alaska", "sections": ["spa"]}
+    )
+
+
+def test_repeated_failing_call_ends_the_turn() -> None:
+    bad = call("get_hotel_info", {"hotel_name": "Nofesh"}, "c1")
+    messages, guard = run_turn([bad])
+
+    tool_results = [m for m in messages if isinstance(m, ToolMessage)]
+    assert len(tool_results) == 1 and tool_results[0].text.startswith("לא נמצא")
+    assert messages[-1].text == FINAL_REPLY and not messages[-1].tool_calls
+    assert messages[-1].response_metadata["loop_guard"] == "repeated_failure"
+    assert guard.trips == {"repeated_failure": 1}
+
+
+def test_repeated_successful_call_is_not_run_again() -> None:
+    destinations = call("get_available_destinations", {}, "c1")
+    messages, guard = run_turn([destinations, destinations, AIMessage(content="יש לנו 6 מדינות")])
+
+    tool_results = [m for m in messages if isinstance(m, ToolMessage)]
+    assert [m.text == REPEATED_RESULT for m in tool_results] == [False, True]
+    assert messages[-1].text == "יש לנו 6 מדינות"
+    assert guard.trips == {"repeated_call": 1}
+
+
+def test_step_budget_caps_a_tool_cycle() -> None:
+    # Cycles between the two camp tools with new arguments every time
+    cycle = []
+    for i, country in enumerate(["צרפת", "איטליה", "בולגריה", "אוסטריה"]):
+        cycle.append(call("get_camp_resorts", {"country": country}, f"r{i}"))
+        cycle.append(call("get_camps_info", {"resorts": ["בנסקו"], "child_age": 4 + i}, f"c{i}"))
+    messages, guard = run_turn(cycle, LoopLimits(max_tool_steps=3))
+
+    assert sum(isinstance(m, ToolMessage) for m in messages) == 3
+    assert messages[-1].text == FINAL_REPLY
+    assert guard.trips == {"step_budget": 1}
+
+
+def test_repeated_call_without_an_id_is_left_to_the_tool_node() -> None:
+    destinations = call("get_available_destinations", {}, "c1")
+    result = ToolMessage("אוסטריה, צרפת", tool_call_id="c1", name="get_available_destinations")
+    no_id = call("get_available_destinations", {}, None)
+
+    # A canned result needs the id of the call it answers
+    assert LoopGuard(LoopLimits()).check([HumanMessage("היי"), destinations, result, no_id]) == (
+        None,
+        [],
+    )
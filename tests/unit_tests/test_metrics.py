@@ -0,0 +1,91 @@
+import json
+import logging
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from agent.fakes import FakeChatModel
+from agent.graph import make_graph
+from agent.metrics import (
+    JsonLogSink,
+    MetricsRegistry,
+    ToolInstrumentation,
+    arg_shape,
+)
+
+
+def tool_call(name, args, call_id):
+    return {"name": name, "args": args, "id": call_id, "type": "tool_call"}
+
+
+def run_with_tools(registry, thread_id, *calls, sinks=()):
+    model = FakeChatModel(
+        responses=[AIMessage(content="", tool_calls=list(calls)), AIMessage("סיימתי")]
+    )
+    graph = make_graph(
+        model, instrumentation=ToolInstrumentation([registry, *sinks])
+    )
+    graph.invoke(
+        {"messages": [HumanMessage("היי")]},
+        {"configurable": {"thread_id": thread_id}},
+    )
+
+
+def test_records_tool_calls_per_tool_and_thread() -> None:
+    registry = MetricsRegistry()
+    run_with_tools(
+        registry,
+        "t1",
+        tool_call("get_hotels_list", {"resort": "בנסקו"}, "c1"),
+        tool_call("get_kosher_info", {}, "c2"),
+    )
+    run_with_tools(registry, "t2", tool_call("get_hotels_list", {"country": "אוסטריה"}, "c3"))
+
+    hotels = registry.snapshot()["get_hotels_list"]
+    assert hotels["calls"] == 2
+    assert hotels["errors"] == 0
+    assert hotels["output_bytes"] > hotels["output_tokens"] > 0
+    assert hotels["arg_shapes"] == {"resort:str": 1, "country:str": 1}
+    assert set(registry.thread_snapshot("t1")) == {"get_hotels_list", "get_kosher_info"}
+    assert registry.thread_snapshot("t2")["get_hotels_list"]["calls"] == 1
+
+
+def test_failed_tool_calls_count_as_errors() -> None:
+    registry = MetricsRegistry()
+    # Missing required argument: ToolNode answers with an error ToolMessage
+    run_with_tools(registry, "t1", tool_call("get_hotel_info", {}, "c1"))
+    assert registry.snapshot()["get_hotel_info"]["errors"] == 1
+
+
+def test_prometheus_and_json_log_output(caplog) -> None:
+    registry = MetricsRegistry()
+    with caplog.at_level(logging.INFO, logger="agent.metrics.tools"):
+        run_with_tools(
+            registry,
+            "t1",
+            tool_call("get_kosher_info", {}, "c1"),
+            sinks=[JsonLogSink()],
+        )
+
+    text = registry.render_prometheus()
+    assert 'skideal_tool_calls_total{tool="get_kosher_info"} 1' in text
+    assert 'skideal_tool_latency_seconds_bucket{tool="get_kosher_info",le="+Inf"} 1' in text
+
+    [line] = [r.getMessage() for r in caplog.records if r.name == "agent.metrics.tools"]
+    event = json.loads(line)
+    assert event["tool"] == "get_kosher_info"
+    assert event["thread_id"] == "t1"
+    assert event["output_bytes"] > 0
+
+
+def test_arg_shape_never_includes_values() -> None:
+    assert arg_shape({"resorts": ["ואל טורנס"], "child_age": 6.0}) == (
+        "child_age:float,resorts:list"
+    )
+
+
+def test_thread_stats_are_bounded() -> None:
+    registry = MetricsRegistry(max_threads=2)
+    for thread_id in ["a", "b", "c"]:
+        run_with_tools(registry, thread_id, tool_call("get_kosher_info", {}, "c1"))
+    assert registry.thread_snapshot("a") == {}
+    assert registry.snapshot()["get_kosher_info"]["calls"] == 3
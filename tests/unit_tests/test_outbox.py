@@ -0,0 +1,159 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from agent import outbox as outbox_module
+from agent.outbox import (
+    STATUS_DEAD,
+    STATUS_DELIVERED,
+    STATUS_PENDING,
+    HandoffOutbox,
+    OutboxDispatcher,
+)
+from agent.tools import handoff_to_agent
+
+
+class CRMStub:
+    """Local HTTP stub that answers with a scripted list of status codes."""
+
+    def __init__(self, statuses):
+        self.statuses = list(statuses)
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+                stub.requests.append(
+                    {"headers": dict(self.headers), "body": json.loads(body)}
+                )
+                status = stub.statuses.pop(0) if stub.statuses else 200
+                self.send_response(status)
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/leads"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def outbox(tmp_path):
+    box = HandoffOutbox(tmp_path / "outbox.db")
+    yield box
+    box.close()
+
+
+def test_enqueue_is_idempotent(outbox) -> None:
+    lead = {"פרטי_לקוח": {"שם": "יונתן שלוש"}}
+    assert outbox.enqueue(lead) == outbox.enqueue(dict(lead))
+    assert len(outbox.entries(STATUS_PENDING)) == 1
+
+
+def test_dispatcher_delivers_batch_with_idempotency_keys(outbox) -> None:
+    crm = CRMStub([200])
+    try:
+        keys = [outbox.enqueue({"n": i}) for i in range(3)]
+        dispatcher = OutboxDispatcher(outbox, crm.url)
+        assert dispatcher.dispatch_once() == 3
+    finally:
+        crm.close()
+
+    assert len(crm.requests) == 1
+    request = crm.requests[0]
+    assert request["headers"]["Idempotency-Key"]
+    assert [lead["idempotency_key"] for lead in request["body"]["leads"]] == keys
+    assert len(outbox.entries(STATUS_DELIVERED)) == 3
+
+
+def test_dispatcher_retries_then_dead_letters(outbox) -> None:
+    crm = CRMStub([503, 503])
+    try:
+        outbox.enqueue({"n": 1})
+        dispatcher = OutboxDispatcher(outbox, crm.url, max_attempts=2, base_backoff=0)
+        dispatcher.dispatch_once()
+        [entry] = outbox.entries(STATUS_PENDING)
+        assert entry.attempts == 1
+        assert entry.last_error == "HTTP 503"
+
+        dispatcher.dispatch_once()
+    finally:
+        crm.close()
+
+    [dead] = outbox.entries(STATUS_DEAD)
+    assert dead.attempts == 2
+    assert outbox.requeue_dead() == 1
+
+
+def test_dispatcher_dead_letters_rejected_batch(outbox) -> None:
+    crm = CRMStub([400])
+    try:
+        outbox.enqueue({"n": 1})
+        OutboxDispatcher(outbox, crm.url).dispatch_once()
+    finally:
+        crm.close()
+    assert len(outbox.entries(STATUS_DEAD)) == 1
+
+
+def test_rejected_batch_is_retried_lead_by_lead(outbox) -> None:
+    crm = CRMStub([400, 200, 400, 200])
+    try:
+        keys = [outbox.enqueue({"n": i}) for i in range(3)]
+        assert OutboxDispatcher(outbox, crm.url).dispatch_once() == 3
+    finally:
+        crm.close()
+
+    assert [len(r["body"]["leads"]) for r in crm.requests] == [3, 1, 1, 1]
+    [dead] = outbox.entries(STATUS_DEAD)
+    assert dead.idempotency_key == keys[1]
+    assert len(outbox.entries(STATUS_DELIVERED)) == 2
+
+
+def test_claimed_entries_are_skipped_by_other_dispatchers(outbox, tmp_path) -> None:
+    other = HandoffOutbox(tmp_path / "outbox.db")
+    try:
+        outbox.enqueue({"n": 1})
+        assert len(outbox.claim_due(10)) == 1
+        assert other.claim_due(10) == []
+        assert other.next_due_in() > 0
+    finally:
+        other.close()
+
+
+def test_background_dispatcher_delivers(outbox) -> None:
+    crm = CRMStub([])
+    dispatcher = OutboxDispatcher(outbox, crm.url)
+    dispatcher.start()
+    try:
+        outbox.enqueue({"n": 1})
+        deadline = time.time() + 5
+        while not outbox.entries(STATUS_DELIVERED) and time.time() < deadline:
+            time.sleep(0.01)
+    finally:
+        dispatcher.stop()
+        crm.close()
+    assert len(outbox.entries(STATUS_DELIVERED)) == 1
+
+
+def test_handoff_tool_enqueues_without_blocking(outbox, monkeypatch) -> None:
+    monkeypatch.setattr(outbox_module, "_outbox", outbox)
+    args = {"customer_name": "יונתן שלוש", "phone": "0501234567"}
+
+    start = time.perf_counter()
+    result = json.loads(handoff_to_agent.invoke(args))
+    elapsed = time.perf_counter() - start
+
+    assert result["סטטוס"] == "הועבר לנציג"
+    [entry] = outbox.entries(STATUS_PENDING)
+    assert entry.idempotency_key.startswith(result["מספר_פנייה"])
+    assert entry.lead["פרטי_לקוח"]["טלפון"] == "0501234567"
+    assert elapsed < 0.5
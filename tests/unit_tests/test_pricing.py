@@ -0,0 +1,86 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from agent import pricing as pricing_module
+from agent.fakes import StubPricingServer
+from agent.pricing import PricingClient, PricingError, QuoteRequest
+from agent.tools import get_live_quote
+
+pytestmark = pytest.mark.anyio
+
+REQUEST = QuoteRequest("Lucky", "בנסקו", "2027-02-07", "2027-02-14", adults=2, children=2)
+
+
+@pytest.fixture
+def stub():
+    server = StubPricingServer(latency=0.1, sold_out=["Platinum Hotel&Casino"])
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def client(stub):
+    pricing = PricingClient(stub.url, ttl=60)
+    yield pricing
+    pricing.close()
+
+
+async def test_concurrent_identical_quotes_share_one_upstream_call(stub, client) -> None:
+    quotes = await asyncio.gather(*(client.aquote(REQUEST) for _ in range(10)))
+    assert all(q == quotes[0] for q in quotes) and quotes[0]["available"]
+    assert len(stub.requests) == 1
+    assert stub.requests[0]["hotel"] == "Lucky" and stub.requests[0]["children"] == "2"
+
+    # Cached for the same query, fetched again for other pax
+    assert client.quote(REQUEST) == quotes[0]
+    client.quote(QuoteRequest("Lucky", "בנסקו", "2027-02-07", "2027-02-14", adults=2))
+    assert len(stub.requests) == 2
+    assert client.stats() == {"upstream_calls": 2, "cache_hits": 1, "coalesced": 9, "cached": 2}
+
+
+async def test_expired_and_failed_quotes_are_fetched_again(stub) -> None:
+    client = PricingClient(stub.url, ttl=0)
+    try:
+        client.quote(REQUEST)
+        client.quote(REQUEST)
+        assert len(stub.requests) == 2
+        stub.close()
+        with pytest.raises(PricingError):
+            client.quote(REQUEST)
+        assert client.stats()["upstream_calls"] == 3
+    finally:
+        client.close()
+
+
+def test_live_quote_tool(stub, client, monkeypatch) -> None:
+    monkeypatch.setattr(pricing_module, "_client", client)
+    args = {"hotel_name": "lucky", "check_in": "2027-02-07", "check_out": "2027-02-14"}
+
+    result = json.loads(get_live_quote.invoke({**args, "adults": 2, "children": 2}))
+    assert result["זמין"] is True and result["לילות"] == 7 and result["מחיר_כולל"] > 0
+    assert result["מלון"] == "Lucky"
+
+    platinum = {**args, "hotel_name": "Platinum Hotel&Casino", "adults": 2}
+    sold_out = json.loads(get_live_quote.invoke(platinum))
+    assert sold_out["זמין"] is False
+    assert "שגיאה" in get_live_quote.invoke({**args, "check_out": "2027-02-01", "adults": 2})
+
+    monkeypatch.setattr(pricing_module, "_client", None)
+    monkeypatch.delenv("SKIDEAL_PRICING_URL", raising=False)
+    assert "נציג" in get_live_quote.invoke({**args, "adults": 2})
+
+
+async def test_non_json_answer_is_a_pricing_error() -> None:
+    transport = httpx.MockTransport(
+        lambda request: httpx.Response(200, text="<html>Bad gateway</html>")
+    )
+    client = PricingClient("http://pricing.test", transport=transport)
+    try:
+        with pytest.raises(PricingError, match="not JSON"):
+            await client.aquote(REQUEST)
+        assert client.stats()["cached"] == 0
+    finally:
+        client.close()
@@ -0,0 +1,62 @@
+import json
+
+from langchain_core.messages import AIMessage
+from langgraph.checkpoint.memory import InMemorySaver
+
+from agent.fakes import FakeChatModel
+from agent.graph import make_graph
+from agent.profiling import TurnProfiler
+
+
+def test_profiled_turn_writes_stacks_and_phase_split(tmp_path) -> None:
+    model = FakeChatModel(
+        latency=0.05,
+        responses=[
+            AIMessage(
+                content="",
+                tool_calls=[{"name": "get_available_destinations", "args": {}, "id": "c1"}],
+            ),
+            AIMessage(content="יש לנו אוסטריה, צרפת ואיטליה"),
+        ],
+    )
+    graph = make_graph(model, checkpointer=InMemorySaver())
+    profiler = TurnProfiler(tmp_path, interval_ms=1)
+    config = {"configurable": {"thread_id": "whatsapp:972500000001"}}
+
+    with profiler.profile("whatsapp:972500000001") as off:
+        graph.invoke({"messages": [("user", "היי")]}, config)
+    assert off is None and not list(tmp_path.iterdir())
+
+    with profiler.profile("whatsapp:972500000001", force=True) as turn:
+        result = graph.invoke({"messages": [("user", "איפה אפשר לעשות סקי?")]}, config)
+        turn.finish(result["messages"])
+
+    [summary_file] = tmp_path.glob("*-turn002.json")
+    assert "972500000001" not in summary_file.name
+    summary = json.loads(summary_file.read_text())
+    phases = summary["phases_ms"]
+    assert summary["turn"] == 2 and summary["status"] == "ok"
+    assert phases["model"] >= 100
+    assert phases["tools"] > 0 and phases["serialization"] > 0
+    assert sum(phases.values()) >= summary["wall_ms"] * 0.99
+
+    stacks = summary_file.with_suffix(".folded").read_text().splitlines()
+    assert summary["samples"] == sum(int(line.rsplit(" ", 1)[1]) for line in stacks)
+    assert any("MainThread;" in line and "invoke (" in line for line in stacks)
+
+
+def test_slow_turn_threshold_skips_fast_turns(tmp_path) -> None:
+    profiler = TurnProfiler(tmp_path, enabled=True, min_ms=60_000)
+    with profiler.profile("t1") as turn:
+        assert turn is not None
+    with profiler.profile("t1", force=True) as turn:
+        assert turn is not None
+    assert not list(tmp_path.iterdir())
+
+
+def test_requests_force_profiling_only_with_the_token(tmp_path) -> None:
+    assert not TurnProfiler(tmp_path).allows_force("1")
+    profiler = TurnProfiler(tmp_path, force_token="s3cret")
+    assert profiler.allows_force("s3cret")
+    assert not profiler.allows_force("1")
+    assert not profiler.allows_force(None)
@@ -0,0 +1,47 @@
+from langchain_core.messages import HumanMessage
+
+from agent.graph import build_prompt, tools
+from agent.prompt import (
+    CORE_FRAGMENTS,
+    CORE_PROMPT,
+    STAGE_FRAGMENTS,
+    SYSTEM_PROMPT,
+    TOOL_NOTES,
+    prompt_token_counts,
+    stage_prompt,
+)
+from agent.stages import STAGE_TOOLS
+
+
+def test_stage_prompt_notes_only_the_bound_tools() -> None:
+    assert set(TOOL_NOTES) == {t.name for t in tools}
+    for stage, names in STAGE_TOOLS.items():
+        text = stage_prompt(stage)
+        noted = {name for name in TOOL_NOTES if f"- {name} — " in text}
+        assert noted == set(names), stage
+
+
+def test_full_prompt_keeps_every_fragment() -> None:
+    for fragment in (*CORE_FRAGMENTS, *STAGE_FRAGMENTS):
+        assert fragment.text in SYSTEM_PROMPT
+    assert "קייטנות סקי:" in stage_prompt("camps")
+    assert "קייטנות סקי:" not in stage_prompt("closing")
+    assert "Closing Script" in stage_prompt("closing")
+
+
+def test_core_block_is_cached_and_shared_by_all_stages() -> None:
+    blocks = [
+        build_prompt({"messages": [HumanMessage("היי")], "stage": stage})[0].content
+        for stage in STAGE_TOOLS
+    ]
+    for content in blocks:
+        assert content[0] == {
+            "type": "text",
+            "text": CORE_PROMPT,
+            "cache_control": {"type": "ephemeral"},
+        }
+        assert content[-1]["text"].startswith("📌 מצב איסוף פרטים")
+
+    counts = prompt_token_counts()
+    for stage in STAGE_TOOLS:
+        assert counts[stage]["total"] < counts["all"]["total"]
@@ -0,0 +1,252 @@
+import asyncio
+import hashlib
+import hmac
+import json
+import time
+
+import httpx
+import pytest
+from langgraph.checkpoint.memory import InMemorySaver
+
+pytest.importorskip("starlette")
+
+from agent.fakes import FakeChatModel  # noqa: E402
+from agent.graph import make_graph  # noqa: E402
+from agent.profiling import TurnProfiler  # noqa: E402
+from agent.server import (  # noqa: E402
+    ConversationDispatcher,
+    InboundMessage,
+    create_app,
+    parse_webhook,
+)
+
+pytestmark = pytest.mark.anyio
+
+
+def make_dispatcher(sender, latency=0.0, **kwargs):
+    graph = make_graph(FakeChatModel(latency=latency), checkpointer=InMemorySaver())
+    return ConversationDispatcher(graph, sender, **kwargs)
+
+
+def webhook_payload(sender, text, message_id):
+    return {
+        "entry": [
+            {
+                "changes": [
+                    {
+                        "value": {
+                            "messages": [
+                                {
+                                    "from": sender,
+                                    "id": message_id,
+                                    "type": "text",
+                                    "text": {"body": text},
+                                }
+                            ]
+                        }
+                    }
+                ]
+            }
+        ]
+    }
+
+
+def test_parse_webhook_ignores_non_text_messages() -> None:
+    payload = webhook_payload("972501234567", "היי", "wamid.1")
+    payload["entry"][0]["changes"][0]["value"]["messages"].append(
+        {"from": "972501234567", "id": "wamid.2", "type": "image"}
+    )
+    [message] = parse_webhook(payload)
+    assert message.thread_id == "whatsapp:972501234567"
+    assert message.text == "היי"
+
+
+async def test_messages_in_a_thread_are_processed_in_order(sender) -> None:
+    dispatcher = make_dispatcher(sender, latency=0.01)
+    for text in ["היי", "אנחנו 4", "רוצים באוסטריה"]:
+        assert dispatcher.submit(InboundMessage("t1", "972500000001", text))
+    await dispatcher.join()
+
+    assert [text for _, text in sender.sent] == [
+        "קיבלתי: היי",
+        "קיבלתי: אנחנו 4",
+        "קיבלתי: רוצים באוסטריה",
+    ]
+    state = await dispatcher.graph.aget_state({"configurable": {"thread_id": "t1"}})
+    assert len(state.values["messages"]) == 6
+    assert state.values["lead"] == {"num_people": 4, "destination": "אוסטריה"}
+    assert dispatcher.active_threads == 0
+
+
+async def test_threads_run_concurrently(sender) -> None:
+    dispatcher = make_dispatcher(sender, latency=0.2)
+    start = time.perf_counter()
+    for i in range(20):
+        dispatcher.submit(InboundMessage(f"t{i}", f"97250000{i:04d}", "היי"))
+    await dispatcher.join()
+    assert len(sender.sent) == 20
+    assert time.perf_counter() - start < 2.0
+
+
+async def test_webhook_sheds_load_when_saturated(sender) -> None:
+    dispatcher = make_dispatcher(sender, latency=0.2, max_pending=1)
+    app = create_app(dispatcher, verify_token="secret")
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.get(
+            "/webhook",
+            params={
+                "hub.mode": "subscribe",
+                "hub.verify_token": "secret",
+                "hub.challenge": "42",
+            },
+        )
+        assert response.text == "42"
+
+        first = await client.post("/webhook", json=webhook_payload("1", "היי", "m1"))
+        duplicate = await client.post("/webhook", json=webhook_payload("1", "היי", "m1"))
+        busy = await client.post("/webhook", json=webhook_payload("2", "היי", "m2"))
+
+        assert first.status_code == 200
+        assert duplicate.json()["messages"] == 0
+        assert busy.status_code == 503
+        assert busy.headers["Retry-After"]
+
+        await dispatcher.join()
+        retried = await client.post("/webhook", json=webhook_payload("2", "היי", "m2"))
+        assert retried.status_code == 200
+        await dispatcher.join()
+
+    assert sorted(to for to, _ in sender.sent) == ["1", "2"]
+
+
+async def test_webhook_rejects_unsigned_deliveries(sender) -> None:
+    dispatcher = make_dispatcher(sender)
+    app = create_app(dispatcher, verify_token="secret", app_secret="app-secret")
+    body = json.dumps(webhook_payload("1", "היי", "m1")).encode()
+    signature = "sha256=" + hmac.new(b"app-secret", body, hashlib.sha256).hexdigest()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        unsigned = await client.post("/webhook", content=body)
+        forged = await client.post(
+            "/webhook", content=body, headers={"X-Hub-Signature-256": "sha256=00"}
+        )
+        signed = await client.post(
+            "/webhook", content=body, headers={"X-Hub-Signature-256": signature}
+        )
+    await dispatcher.join()
+
+    assert unsigned.status_code == forged.status_code == 403
+    assert signed.status_code == 200
+    assert len(sender.sent) == 1
+
+
+async def test_webhook_rejects_malformed_bodies(sender) -> None:
+    dispatcher = make_dispatcher(sender)
+    app = create_app(dispatcher, verify_token="secret")
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        responses = [
+            await client.post("/webhook", content=body) for body in [b"", b"{not json", b"[]"]
+        ]
+
+    assert [r.status_code for r in responses] == [400, 400, 400]
+    assert dispatcher.pending == 0
+
+
+async def test_failed_run_sends_fallback_reply(sender) -> None:
+    dispatcher = make_dispatcher(sender)
+
+    async def broken(*args, **kwargs):
+        raise RuntimeError("boom")
+
+    dispatcher.graph = type("Broken", (), {"ainvoke": staticmethod(broken)})()
+    dispatcher.submit(InboundMessage("t1", "1", "היי"))
+    await asyncio.wait_for(dispatcher.join(), 1)
+    assert sender.sent[0][1].startswith("מצטערת")
+
+
+async def test_metrics_endpoint_serves_prometheus_text(sender) -> None:
+    dispatcher = make_dispatcher(sender)
+    transport = httpx.ASGITransport(app=create_app(dispatcher, verify_token="secret"))
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        response = await client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "# TYPE skideal_tool_latency_seconds histogram" in response.text
+
+
+async def test_profile_header_profiles_the_turn(tmp_path, sender) -> None:
+    profiler = TurnProfiler(tmp_path, force_token="s3cret")
+    dispatcher = make_dispatcher(sender, profiler=profiler)
+    transport = httpx.ASGITransport(app=create_app(dispatcher, verify_token="secret"))
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        for i, (text, header) in enumerate([("היי", "1"), ("אנחנו 4", "s3cret")]):
+            await client.post(
+                "/webhook",
+                json=webhook_payload("972500000001", text, f"wamid.{i}"),
+                headers={"X-SkiDeal-Profile": header},
+            )
+            await dispatcher.join()
+
+    # Only the request with the token was profiled
+    assert len(sender.sent) == 2
+    assert sorted(p.suffix for p in tmp_path.iterdir()) == [".folded", ".json"]
+    [summary] = tmp_path.glob("*-turn002.json")
+    assert json.loads(summary.read_text())["thread_id"] == "whatsapp:972500000001"
+
+
+async def test_burst_is_merged_into_one_turn(sender) -> None:
+    dispatcher = make_dispatcher(sender, debounce=0.05)
+    for text in ["היי", "אנחנו 4", "רוצים באוסטריה"]:
+        assert dispatcher.submit(InboundMessage("t1", "972500000001", text))
+    await asyncio.wait_for(dispatcher.join(), 2)
+
+    assert sender.sent == [("972500000001", "קיבלתי: היי\nאנחנו 4\nרוצים באוסטריה")]
+    state = await dispatcher.graph.aget_state({"configurable": {"thread_id": "t1"}})
+    assert len(state.values["messages"]) == 2
+    assert dispatcher.coalesced == 2
+    assert dispatcher.pending == 0
+
+
+async def test_message_during_run_supersedes_it(sender) -> None:
+    dispatcher = make_dispatcher(sender, latency=0.3, debounce=0.01)
+    config = {"configurable": {"thread_id": "t1"}}
+
+    # A fresh thread: the cancelled run's checkpoints are dropped entirely
+    dispatcher.submit(InboundMessage("t1", "1", "היי"))
+    await asyncio.sleep(0.1)
+    dispatcher.submit(InboundMessage("t1", "1", "אנחנו 4"))
+    await asyncio.wait_for(dispatcher.join(), 3)
+    assert sender.sent == [("1", "קיבלתי: היי\nאנחנו 4")]
+
+    # A thread with history: restarts from the checkpoint before the run
+    dispatcher.submit(InboundMessage("t1", "1", "רוצים"))
+    await asyncio.sleep(0.1)
+    dispatcher.submit(InboundMessage("t1", "1", "באוסטריה"))
+    await asyncio.wait_for(dispatcher.join(), 3)
+    assert sender.sent[1:] == [("1", "קיבלתי: רוצים\nבאוסטריה")]
+
+    state = await dispatcher.graph.aget_state(config)
+    assert [m.text for m in state.values["messages"]] == [
+        "היי\nאנחנו 4",
+        "קיבלתי: היי\nאנחנו 4",
+        "רוצים\nבאוסטריה",
+        "קיבלתי: רוצים\nבאוסטריה",
+    ]
+    assert dispatcher.superseded == 2
+
+
+async def test_message_during_lease_wait_joins_the_batch(sender) -> None:
+    dispatcher = make_dispatcher(sender, debounce=0.01)
+
+    # Another worker holds the thread while the burst is taken
+    async with dispatcher.leases.hold("t1"):
+        dispatcher.submit(InboundMessage("t1", "1", "היי"))
+        await asyncio.sleep(0.1)
+        dispatcher.submit(InboundMessage("t1", "1", "אנחנו 4"))
+    await asyncio.wait_for(dispatcher.join(), 3)
+
+    assert sender.sent == [("1", "קיבלתי: היי\nאנחנו 4")]
+    assert dispatcher.superseded == 0
+    assert dispatcher.pending == 0
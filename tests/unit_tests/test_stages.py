@@ -0,0 +1,48 @@
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+from agent.benchmark import SCENARIOS
+from agent.graph import tools_for_stage
+from agent.lead_state import extract_lead_fields, merge_lead
+from agent.stages import STAGE_TOOLS, detect_stage
+
+
+@pytest.mark.parametrize(
+    ("text", "stage"),
+    [
+        ("היי, מה שלומך?", "discovery"),
+        ("אנחנו 4 אנשים", "discovery"),
+        ("מחפשים מלון עם ספא", "recommendation"),
+        ("רוצים לבנסקו", "recommendation"),
+        ("יש קייטנה לילדים?", "camps"),
+        ("אני רוצה להזמין", "closing"),
+        ("יונתן שלוש, 0501234567", "closing"),
+    ],
+)
+def test_detect_stage_from_last_customer_message(text, stage) -> None:
+    messages = [HumanMessage("היי"), AIMessage("שלום!"), HumanMessage(text)]
+    assert detect_stage(messages, None) == stage
+
+
+def test_lead_keeps_stage_when_message_is_neutral() -> None:
+    messages = [HumanMessage("כן, תודה")]
+    assert detect_stage(messages, {"destination": "בנסקו"}) == "recommendation"
+    contact = {"customer_name": "יונתן שלוש", "phone": "0501234567", "email": "y@x.com"}
+    assert detect_stage(messages, contact) == "closing"
+
+
+def test_benchmark_tool_calls_are_bound_in_their_stage() -> None:
+    for scenario in SCENARIOS:
+        lead = None
+        for turn in scenario.turns:
+            lead = merge_lead(lead, extract_lead_fields(turn.customer))
+            stage = detect_stage([HumanMessage(turn.customer)], lead)
+            for step in turn.steps:
+                for name, _ in step:
+                    assert name in STAGE_TOOLS[stage], (scenario.name, turn.customer)
+
+
+def test_every_stage_can_hand_off_and_unknown_stage_binds_all() -> None:
+    for stage in STAGE_TOOLS:
+        assert "handoff_to_agent" in {t.name for t in tools_for_stage(stage)}
+    assert len(tools_for_stage(None)) > len(tools_for_stage("recommendation"))
@@ -0,0 +1,52 @@
+from types import SimpleNamespace
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langgraph.checkpoint.memory import InMemorySaver
+
+from agent import tool_memo as tool_memo_module
+from agent.fakes import FakeChatModel
+from agent.graph import make_graph
+from agent.tool_memo import ToolMemo, collapse_duplicate_results, reference
+
+ALASKA = {"name": "get_hotel_info", "args": {"hotel_name": "Alaska"}, "id": "c1"}
+
+
+def test_duplicate_tool_messages_are_collapsed_after_the_first() -> None:
+    destinations = "רשימה ארוכה של יעדים: " + ", ".join(["אוסטריה", "צרפת", "איטליה"] * 10)
+    messages = [
+        HumanMessage("היי"),
+        ToolMessage(destinations, tool_call_id="a", name="get_available_destinations"),
+        ToolMessage(destinations, tool_call_id="b", name="get_available_destinations"),
+        ToolMessage(destinations, tool_call_id="c", name="search_knowledge"),
+    ]
+    collapsed = collapse_duplicate_results(messages)
+    assert [m.content for m in collapsed[1:]] == [
+        destinations,
+        reference("get_available_destinations"),
+        destinations,
+    ]
+    assert collapsed[2].tool_call_id == "b"
+    assert messages[2].content == destinations
+
+
+def test_repeated_call_in_a_later_turn_gets_a_reference(monkeypatch) -> None:
+    memo = ToolMemo()
+    model = FakeChatModel(responses=[AIMessage(content="", tool_calls=[ALASKA]), AIMessage("הנה")])
+    graph = make_graph(model, checkpointer=InMemorySaver(), tool_memo=memo)
+    config = {"configurable": {"thread_id": "memo-1"}}
+    graph.invoke({"messages": [HumanMessage("ספרי על אלסקה")]}, config)
+    result = graph.invoke({"messages": [HumanMessage("ושוב על אלסקה?")]}, config)
+
+    first, second = [m for m in result["messages"] if isinstance(m, ToolMessage)]
+    assert "Alaska" in first.text
+    assert second.text == reference("get_hotel_info")
+    assert memo.stats() == {"hits": 1, "misses": 1, "threads": 1}
+
+    # Another thread, or new catalog data, runs the tool again
+    graph.invoke({"messages": [HumanMessage("ספרי על אלסקה")]}, {"configurable": {"thread_id": "2"}})
+    monkeypatch.setattr(
+        tool_memo_module, "get_catalog", lambda: SimpleNamespace(fingerprint="rebuilt")
+    )
+    result = graph.invoke({"messages": [HumanMessage("ושוב?")]}, config)
+    assert "Alaska" in [m for m in result["messages"] if isinstance(m, ToolMessage)][-1].text
+    assert memo.stats()["hits"] == 1
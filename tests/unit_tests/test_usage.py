@@ -0,0 +1,83 @@
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.memory import InMemorySaver
+
+from agent.fakes import FakeChatModel
+from agent.graph import make_graph
+from agent.usage import (
+    UsageLedger,
+    format_usage,
+    get_usage_ledger,
+    step_cost,
+    summarize_usage,
+    usage_records,
+)
+
+SONNET = "claude-sonnet-4-20250514"
+
+
+def response(content="", tool_calls=(), input_tokens=0, cache_read=0, cache_write=0):
+    return AIMessage(
+        content=content,
+        tool_calls=list(tool_calls),
+        usage_metadata={
+            "input_tokens": input_tokens,
+            "output_tokens": 100,
+            "total_tokens": input_tokens + 100,
+            "input_token_details": {"cache_read": cache_read, "cache_creation": cache_write},
+        },
+        response_metadata={"model_name": SONNET},
+    )
+
+
+def test_usage_is_recorded_per_step_and_turn() -> None:
+    kosher = {"name": "get_kosher_info", "args": {}, "id": "c1", "type": "tool_call"}
+    model = FakeChatModel(
+        responses=[
+            response(tool_calls=[kosher], input_tokens=5000, cache_write=4000),
+            response("יש לנו סקיפה", input_tokens=5200, cache_read=4000),
+        ]
+    )
+    graph = make_graph(model, checkpointer=InMemorySaver())
+    config = {"configurable": {"thread_id": "usage-1"}}
+    graph.invoke({"messages": [HumanMessage("כשר?")]}, config)
+    result = graph.invoke({"messages": [HumanMessage("ועוד?")]}, config)
+
+    records = usage_records(result["messages"])
+    assert [(r["turn"], r["step"], r["action"]) for r in records] == [
+        (1, 0, "get_kosher_info"),
+        (1, 1, "reply"),
+        (2, 0, "get_kosher_info"),
+        (2, 1, "reply"),
+    ]
+    first = records[0]
+    assert (first["input_tokens"], first["cache_write_tokens"]) == (1000, 4000)
+    assert first["cost_usd"] == pytest.approx((1000 * 3 + 100 * 15 + 4000 * 3.75) / 1e6)
+    assert all(r["step_ms"] >= r["model_ms"] > 0 for r in records)
+
+    summary = summarize_usage(records)
+    assert summary["turns"][2]["steps"] == 2
+    assert summary["total"]["cache_read_tokens"] == 8000
+    assert get_usage_ledger().thread("usage-1")["total"]["steps"] == 4
+    assert "תור 2" in format_usage(records)
+
+
+def test_replayed_history_carries_no_usage() -> None:
+    messages = [HumanMessage("היי"), AIMessage("שלום"), HumanMessage("מה נשמע")]
+    assert usage_records(messages) == []
+
+
+def test_unknown_models_cost_nothing() -> None:
+    assert step_cost("skideal-fake", 1000, 1000, 0, 0) == 0.0
+    assert step_cost("claude-3-5-haiku-20241022", 1_000_000, 0, 0, 0) == 0.80
+
+
+def test_ledger_ranks_threads_by_cost() -> None:
+    ledger = UsageLedger(max_threads=2)
+    reply = response("שלום")
+    reply.response_metadata["latency_ms"] = 1.0
+    [record] = usage_records([HumanMessage("היי"), reply])
+    for thread, cost in [("a", 0.01), ("b", 0.05), ("c", 0.02)]:
+        ledger.record(thread, {**record, "cost_usd": cost})
+    # "a" was evicted; the rest are ranked by cost
+    assert [thread for thread, _ in ledger.top()] == ["b", "c"]